@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""Cached login-state checks for the accounts in cookies/.
+
+An account is checked with one small authenticated request (the passport
+account info endpoint) instead of loading a full page: redirects are not
+followed, since a redirect to the login page already means the session is
+gone, and at most a few KB of the JSON body are read. Cookies the server
+rotates during the check are written back to that account's own file.
+
+Every result is kept per cookies file, with a TTL, in .account_health.json,
+so the index page and the account picker can show validity without waiting
+on the network. Results are tied to the file's mtime, so replacing a cookies
+file discards its old status. Stale entries are refreshed in the background
+on a small worker pool, each probe delayed by a random amount and each TTL
+jittered, so accounts don't all get checked at once.
+
+Creating a room for an account known to be logged out fails right away
+instead of after a full createStream round trip.
+"""
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import session_pool
+import journal
+import storage
+
+STATUS_FILE = ".account_health.json"
+PROBE_URL = "https://www.tiktok.com/passport/web/account/info/"
+PROBE_PARAMS = {"aid": "1459", "app_language": "en", "device_platform": "web_pc"}
+PROBE_TIMEOUT = (5, 10)
+# The account info JSON is well under this; anything bigger isn't it
+MAX_PROBE_BYTES = 32 * 1024
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+)
+
+VALID, INVALID, UNKNOWN = "valid", "invalid", "unknown"
+# Seconds a result stays fresh, per state
+TTL = {VALID: 1800, INVALID: 3600, UNKNOWN: 300}
+# TTLs are spread by up to this fraction either way
+TTL_JITTER = 0.2
+# Background probes wait up to this long before starting
+MAX_START_DELAY = 10.0
+WORKERS = 2
+CHECK_INTERVAL = 60
+
+
+def probe(session):
+    """Return (state, details) for the account logged in on session.
+
+    details holds 'username' for a valid account, otherwise 'reason'.
+    """
+    try:
+        response = session.get(
+            PROBE_URL, params=PROBE_PARAMS, headers={"user-agent": USER_AGENT},
+            allow_redirects=False, stream=True, timeout=PROBE_TIMEOUT
+        )
+    except Exception as e:
+        return UNKNOWN, {"reason": f"request failed: {e}"}
+
+    with response:
+        if response.is_redirect:
+            location = response.headers.get("location", "")
+            if "login" in location:
+                return INVALID, {"reason": "redirected to login"}
+            return UNKNOWN, {"reason": f"unexpected redirect to {location}"}
+        if response.status_code in (401, 403):
+            return INVALID, {"reason": f"HTTP {response.status_code}"}
+        if response.status_code != 200:
+            return UNKNOWN, {"reason": f"HTTP {response.status_code}"}
+        try:
+            body = response.raw.read(MAX_PROBE_BYTES + 1, decode_content=True)
+        except Exception as e:
+            return UNKNOWN, {"reason": f"read failed: {e}"}
+
+    if len(body) > MAX_PROBE_BYTES:
+        return UNKNOWN, {"reason": "unexpected response"}
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return UNKNOWN, {"reason": "response is not JSON"}
+    info = data.get("data") if isinstance(data, dict) else None
+    if not isinstance(info, dict):
+        return UNKNOWN, {"reason": "unexpected response"}
+    if data.get("message") == "success" and info.get("user_id"):
+        return VALID, {"username": info.get("username") or info.get("screen_name")}
+    if data.get("message") == "error":
+        return INVALID, {"reason": info.get("description") or f"error {info.get('error_code')}"}
+    return UNKNOWN, {"reason": "unexpected response"}
+
+
+def save_rotated_cookies(cookies_file, jar):
+    """Write cookie values the server changed back into cookies_file.
+
+    Returns True if the file changed. Other fields of each cookie (domain,
+    expiry, ...) are kept; cookies the file didn't have are appended.
+    """
+    latest = {}
+    for cookie in jar:
+        latest[cookie.name] = cookie
+    current = storage.read_json(cookies_file)
+    if not isinstance(current, list):
+        return False
+    known = {entry.get("name"): entry.get("value") for entry in current}
+    if all(known.get(name) == cookie.value for name, cookie in latest.items()):
+        return False
+
+    def apply(cookies):
+        if not isinstance(cookies, list):
+            return cookies
+        seen = set()
+        for entry in cookies:
+            seen.add(entry.get("name"))
+            cookie = latest.get(entry.get("name"))
+            if cookie is not None:
+                entry["value"] = cookie.value
+        for name, cookie in latest.items():
+            if name not in seen:
+                cookies.append({"name": name, "value": cookie.value, "domain": cookie.domain})
+        return cookies
+
+    storage.update_json(cookies_file, apply, default=[])
+    return True
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+class AccountHealth:
+    """Per-account login state with TTLs and background revalidation."""
+
+    def __init__(self, status_file=STATUS_FILE, workers=WORKERS,
+                 max_start_delay=MAX_START_DELAY, interval=CHECK_INTERVAL):
+        self.status_file = status_file
+        self.workers = workers
+        self.max_start_delay = max_start_delay
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._executor = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _entries(self):
+        try:
+            entries = storage.read_json(self.status_file)
+        except (FileNotFoundError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def status(self, cookies_file):
+        """Return the last result for cookies_file, or None if there is none.
+
+        The result has state, checked_at, expires_at, stale and username or
+        reason. Results from before the file last changed don't count.
+        """
+        path = os.path.abspath(cookies_file)
+        entry = self._entries().get(path)
+        if entry is None or entry.get("mtime") != _mtime(path):
+            return None
+        return dict(entry, stale=entry.get("expires_at", 0) <= time.time())
+
+    def statuses(self, cookies_files):
+        return {f: self.status(f) for f in cookies_files}
+
+    def known_invalid(self, cookies_file):
+        """True if cookies_file was recently found logged out."""
+        status = self.status(cookies_file)
+        return bool(status and status["state"] == INVALID and not status["stale"])
+
+    def _record(self, path, state, details):
+        now = time.time()
+        previous = self._entries().get(path)
+        mtime = _mtime(path)
+        if state == UNKNOWN and previous and previous.get("mtime") == mtime:
+            # A failed check says nothing about the login: keep the last
+            # verdict and try again soon
+            entry = dict(previous, reason=details.get("reason"))
+        else:
+            entry = {"state": state, "username": details.get("username"), "reason": details.get("reason")}
+        ttl = TTL[state] * random.uniform(1 - TTL_JITTER, 1 + TTL_JITTER)
+        entry.update(checked_at=now, expires_at=now + ttl, mtime=mtime)
+
+        def apply(stored):
+            if not isinstance(stored, dict):
+                stored = {}
+            stored[path] = entry
+            return stored
+
+        try:
+            storage.update_json(self.status_file, apply, default={})
+        except OSError as e:
+            print(f"Warning: could not save account status: {e}")
+        return dict(entry, stale=False)
+
+    def check(self, cookies_file, session=None):
+        """Probe cookies_file now and return its status.
+
+        With session, that session's cookies are probed (and any rotated
+        ones saved); otherwise a pooled session for the account is used.
+        """
+        path = os.path.abspath(cookies_file)
+        started = time.monotonic()
+        pooled = None
+        if session is None:
+            cookies = {c["name"]: c["value"] for c in storage.read_json(cookies_file)}
+            session, key = session_pool.acquire(cookies_file, cookies)
+            pooled = key
+        try:
+            state, details = probe(session)
+            if state == VALID:
+                try:
+                    save_rotated_cookies(cookies_file, session.cookies)
+                except (OSError, ValueError) as e:
+                    print(f"Warning: could not save refreshed cookies to {cookies_file}: {e}")
+        finally:
+            if pooled is not None:
+                session_pool.release(session, pooled)
+        journal.record(
+            "check_account", state == VALID, {"file": cookies_file}, started,
+            account=os.path.splitext(os.path.basename(cookies_file))[0],
+            error=details.get("reason"),
+            error_class="logged_out" if state == INVALID else "probe_failed",
+        )
+        return self._record(path, state, details)
+
+    def _background_check(self, cookies_file, delay):
+        try:
+            if self._stop.wait(delay):
+                return
+            self.check(cookies_file)
+        except Exception as e:
+            print(f"Account check for {cookies_file} failed: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(os.path.abspath(cookies_file))
+
+    def revalidate(self, cookies_files):
+        """Queue background checks for accounts without a fresh result."""
+        for cookies_file in cookies_files:
+            status = self.status(cookies_file)
+            if status is not None and not status["stale"]:
+                continue
+            path = os.path.abspath(cookies_file)
+            with self._lock:
+                if path in self._pending:
+                    continue
+                self._pending.add(path)
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="account-check")
+                executor = self._executor
+            executor.submit(self._background_check, cookies_file, random.uniform(0, self.max_start_delay))
+
+    def _run(self, list_accounts):
+        while True:
+            try:
+                self.revalidate(list_accounts())
+            except Exception as e:
+                print(f"Account revalidation failed: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self, list_accounts):
+        """Keep the accounts returned by list_accounts() checked in the background."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(list_accounts,), name="account-health", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+# Process-wide instance
+checker = AccountHealth()
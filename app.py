@@ -3,76 +3,125 @@ import hashlib
 import json
 import os
 import argparse
-import requests
 import time
-import random
-from urllib.parse import urlencode
-import urllib.parse
 import glob
+import sys
 from datetime import datetime
 
-# Import the required libraries (assuming they're in the Libs directory)
-try:
-    from Libs.device import Device
-    from Libs.device_gen import Applog, Xlog
-    from Libs.xgorgon import Gorgon
-    from Libs.signature import ladon_encrypt, get_x_ss_stub
-    LIBS_AVAILABLE = True
-except ImportError:
-    print("Warning: Libs modules not found. Some features may not work.")
-    LIBS_AVAILABLE = False
-
-# Import Flask with error handling
-try:
-    from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
-    FLASK_AVAILABLE = True
-except ImportError:
-    print("Error: Flask not installed. Please install it with: pip install flask")
-    FLASK_AVAILABLE = False
-
-# Initialize Flask app only if Flask is available
-if FLASK_AVAILABLE:
-    app = Flask(__name__)
-    app.secret_key = "tiktok_stream_key_generator_secret_key"
-else:
-    app = None
+import functools
+
+from cache import metadata_cache, session_pool
+import idempotency
+import ratelimit
+import rooms
+import storage
+import titles
+import webcast
+
+# Heavy dependencies are imported lazily so that quick CLI commands such as
+# --list-cookies or --end-stream don't pay for Flask or the Libs signing
+# modules (Libs/ttencrypt.py alone is ~95 KB of literal tables).
+#   - requests: imported by Stream and fetch_game_tags
+#   - Libs.*:   imported by generate_device
+#   - flask:    imported by create_app (only used by --web)
+#   - journal, account_health: by their callers (importtime.py checks this)
+
+SECRET_KEY = "tiktok_stream_key_generator_secret_key"
+
+# How long warm metadata stays valid (mostly matters inside the daemon)
+VERSION_CACHE_TTL = 3600
+SERVER_URL_CACHE_TTL = 600
+# Connect timeout per webcast host before failing over to the next one
+WEBCAST_CONNECT_TIMEOUT = 5
+GAME_TAGS_CACHE_TTL = 3600
+
+def _journaled(op, context=None):
+    """journal.journaled, applied on the first call so importing app doesn't load journal."""
+    def decorate(func):
+        journaled = []
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not journaled:
+                import journal
+                journaled.append(journal.journaled(op, context=context)(func))
+            return journaled[0](*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _journal_context(stream, ok):
+    """Journal fields for a Stream operation (see journal.journaled)."""
+    fields = {
+        'account': account_name(stream.cookies_file),
+        'upstream_ms': stream.lastUpstreamMs,
+        'host': stream.lastHost,
+    }
+    if not ok and stream.lastError:
+        fields['error'] = stream.lastError
+    return fields
+
+
+def _connect_failed(error):
+    """Whether a requests ConnectionError happened before anything was sent."""
+    import requests
+    from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+    if isinstance(error, (requests.ConnectTimeout, requests.exceptions.SSLError)):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
 
 class Stream:
     def __init__(self, cookies_file):
-        self.s = requests.session()
         if not os.path.exists(cookies_file):
             raise FileNotFoundError(f"Cookies file not found: {cookies_file}")
             
-        with open(cookies_file, "r") as file:
-            cookies_data = json.load(file)
+        cookies_data = storage.read_json(cookies_file)
         cookies = {}
         for cookie in cookies_data:
             cookies[cookie["name"]] = cookie["value"]
-        self.s.cookies.update(cookies)
+        self.cookies_file = cookies_file
+        # Upstream error prompt of the last failed call, if any
+        self.lastError = None
+        # Latency and host of the last webcast API call, for the journal
+        self.lastUpstreamMs = None
+        self.lastHost = None
+        # Identifiers of the room created by createStream
+        self.roomId = None
+        self.upstreamStreamId = None
+        # Sessions come from a pool so the daemon and web app reuse warm
+        # connections per account; a cold CLI run just creates one.
+        self.s, self._pool_key = session_pool.acquire(cookies_file, cookies)
         # self.renewCookies()
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self.s.close()
+        if exc_type is None:
+            session_pool.release(self.s, self._pool_key)
+        else:
+            self.s.close()
     
     def getLiveStudioLatestVersion(self):
-        url = "https://tron-sg.bytelemon.com/api/sdk/check_update"
-        params = {
-            "pid": "7393277106664249610",
-            "uid": "7464643088460875280",
-            "branch": "studio/release/stable",
-            "buildId": "0"
-        }
+        return metadata_cache.get_or_load(
+            "live_studio_version",
+            self._fetchLiveStudioLatestVersion,
+            VERSION_CACHE_TTL
+        ) or webcast.DEFAULT_VERSION
+
+    def _fetchLiveStudioLatestVersion(self):
         try:
-            with self.s.get(url, params=params) as response:
-                return response.json()["data"]["manifest"]["win32"]["version"]
+            with self.s.get(webcast.VERSION_URL, params=webcast.VERSION_PARAMS) as response:
+                return webcast.parse_version(response.json())
         except Exception as e:
             print(f"Failed to fetch latest version: {e}")
-            return "0.99.0"
+            return None
         
 
+    @_journaled("create_stream", context=_journal_context)
     def createStream(
         self,
         title,
@@ -88,271 +137,17 @@ class Stream:
         iid = "",
         thumbnail_path = ""
     ):
-        base_url = self.getServerUrl()
-        if spoof_plat == 1:
-            self.s.headers = {
-                "user-agent": "com.zhiliaoapp.musically/2023508030 (Linux; U; Android 14; en_US_#u-mu-celsius; M2102J20SG; Build/AP2A.240905.003; Cronet/TTNetVersion:f58efab5 2024-06-13 QuicVersion:5d23606e 2024-05-23)",
-            }
-            params = {
-                # App ID for Tiktok Mobile App
-                "aid": "1233",
-                # App name for Tiktok Mobile App
-                "app_name": "musical_ly",
-                # Channel for Tiktok Mobile App
-                "channel": "googleplay",
-                "device_platform": "android",
-                "iid": iid,
-                "device_id": device_id,
-                "openudid": openudid,
-                "os": "android",
-                "ssmix": "a",
-                "_rticket": "1730304478660",
-                "cdid": "1fb4eb4c-99f5-4534-a637-e3ac7d52fddb",
-                "version_code": "370104",
-                "version_name": "37.1.4",
-                "manifest_version_code": "2024701040",
-                "update_version_code": "2024701040",
-                "ab_version": "37.1.4",
-                "resolution": "1080*2309",
-                "dpi": "410",
-                "device_type": "M2102J20SG",
-                "device_brand": "POCO",
-                "language": "en",
-                "os_api": "34",
-                "os_version": "14",
-                "ac": "wifi",
-                "is_pad": "0",
-                "current_region": "TN",
-                "app_type": "normal",
-                "sys_region": "US",
-                "last_install_time": "1717207722",
-                "mcc_mnc": "60501",
-                "timezone_name": "Africa/Tunis",
-                "carrier_region_v2": "605",
-                "residence": "TN",
-                "app_language": "en",
-                "carrier_region": "TN",
-                "ac2": "wifi5g",
-                "uoo": "0",
-                "op_region": "TN",
-                "timezone_offset": "3600",
-                "build_number": "37.1.4",
-                "host_abi": "arm64-v8a",
-                "locale": "en",
-                "region": "US",
-                "ts": "1730304477",
-                "webcast_sdk_version": "3590",
-                "webcast_language": "en",
-                "webcast_locale": "en_US_#u-mu-celsius",
-                "es_version": "2",
-                "effect_sdk_version": "17.0.0",
-                "current_network_quality_info": '{"tcp_rtt":64,"quic_rtt":64,"http_rtt":198,"downstream_throughput_kbps":31920,"quic_send_loss_rate":-1,"quic_receive_loss_rate":-1,"net_effective_connection_type":4,"video_download_speed":787}'
-            }
-            data = {
-                "hashtag_id": hashtag_id,
-                "hold_living_room": "1",
-                "chat_sub_only_auth": "2",
-                "community_flagged_chat_auth": "2",
-                "ecom_bc_toggle": "3",
-                "live_sub_only": "0",
-                "overwrite_push_base_parameter": "false",
-                "chat_l_2": "1",
-                "caption": "0",
-                "overwrite_push_base_min_bit_rate": "-1",
-                "title": title,
-                "live_sub_only_use_music": "0",
-                "mobile_binded": "0",
-                "create_source": "0",
-                "spam_comments": "1",
-                "commercial_content_promote_third_party": "false",
-                "grant_level": "0",
-                "screenshot_cover_status": "0",
-                "overwrite_push_base_max_bit_rate": "-1",
-                "enable_http_dns": "0",
-                "mobile_validated": "0",
-                "live_agreement": "0",
-                "commercial_content_promote_myself": "false",
-                "allow_preview_duration_exp": "0",
-                "is_user_select": "0",
-                "transaction_history": "1",
-                "probe_recommend_resolution": "1",
-                "chat_auth": "1",
-                "disable_preview_sub_only": "0",
-                "comment_tray_switch": "1",
-                "overwrite_push_base_default_bit_rate": "-1",
-                "overwrite_push_base_resolution": "1",
-                "grant_group": "1",
-                "gift_auth": "1",
-                "star_comment_switch": "true",
-                "has_commerce_goods": "false",
-                "open_commercial_content_toggle": "false",
-                "event_id": "-1",
-                "star_comment_qualification": "false",
-                "game_tag_id": game_tag_id,
-                "community_flagged_chat_review_auth": "2",
-                "age_restricted": "0",
-                "group_chat_id": "0",
-                "optout_gift_gallery": "false",
-                "gen_replay": str(gen_replay).lower(),
-                "shopping_ranking": "0"
-            }
-
-        elif spoof_plat == 2:
-            self.s.headers = {
-                "user-agent": "com.zhiliaoapp.musically/2023508030 (Linux; U; Android 14; en_US_#u-mu-celsius; M2102J20SG; Build/AP2A.240905.003; Cronet/TTNetVersion:f58efab5 2024-06-13 QuicVersion:5d23606e 2024-05-23)",
-            }
-            params = {
-                # App ID for Tiktok Mobile App
-                "aid": "1233",
-                # App name for Tiktok Mobile App
-                "app_name": "musical_ly",
-                # Channel for Tiktok Mobile App
-                "channel": "googleplay",
-                "device_platform": "android",
-                "iid": iid,
-                "device_id": device_id,
-                "openudid": openudid,
-                "screen_shot": "1",
-                "ac": "wifi",
-                "version_code": "370104",
-                "version_name": "37.1.4",
-                "os": "android",
-                "ab_version": "37.1.4",
-                "ssmix": "a",
-                "device_type": "M2102J20SG",
-                "device_brand": "POCO",
-                "language": "en",
-                "os_api": "34",
-                "os_version": "14",
-                "manifest_version_code": "2023701040",
-                "resolution": "1080*2309",
-                "dpi": "410",
-                "update_version_code": "2023701040",
-                "_rticket": "1730306440278",
-                "is_pad": "0",
-                "current_region": "TN",
-                "app_type": "normal",
-                "sys_region": "US",
-                "last_install_time": "1730305998",
-                "mcc_mnc": "60501",
-                "timezone_name": "Africa/Tunis",
-                "carrier_region_v2": "605",
-                "residence": "TN",
-                "app_language": "en",
-                "carrier_region": "TN",
-                "ac2": "wifi5g",
-                "uoo": "0",
-                "op_region": "TN",
-                "timezone_offset": "3600",
-                "build_number": "37.1.4",
-                "host_abi": "arm64-v8a",
-                "locale": "en",
-                "region": "US",
-                "ts": "1730306440",
-                "cdid": "bfe31618-558b-4e0d-a4e5-c4221be305a1",
-                "webcast_sdk_version": "3490",
-                "webcast_language": "en",
-                "webcast_locale": "en_US_#u-mu-celsius",
-                "es_version": "2",
-                "effect_sdk_version": "17.0.0",
-                "current_network_quality_info": '{"tcp_rtt":99,"quic_rtt":99,"http_rtt":203,"downstream_throughput_kbps":2734,"quic_send_loss_rate":-1,"quic_receive_loss_rate":-1,"net_effective_connection_type":4,"video_download_speed":7}'
-            }
-            data = {
-                "hashtag_id": hashtag_id,
-                "hold_living_room": "1",
-                "chat_sub_only_auth": "2",
-                "screen_shot": "1",
-                "mute_duration": "1",
-                "community_flagged_chat_auth": "2",
-                "ecom_bc_toggle": "3",
-                "live_sub_only": "0",
-                "chat_l_2": "1",
-                "caption": "0",
-                "live_sub_only_use_music": "0",
-                "mobile_binded": "0",
-                "create_source": "0",
-                "spam_comments": "1",
-                "commercial_content_promote_third_party": "false",
-                "grant_level": "0",
-                "screenshot_cover_status": "1",
-                "enable_http_dns": "0",
-                "mobile_validated": "0",
-                "live_agreement": "0",
-                "orientation": "2",
-                "commercial_content_promote_myself": "false",
-                "allow_preview_duration_exp": "0",
-                "transaction_history": "1",
-                "chat_auth": "1",
-                "disable_preview_sub_only": "0",
-                "comment_tray_switch": "1",
-                "grant_group": "1",
-                "gift_auth": "1",
-                "star_comment_switch": "true",
-                "has_commerce_goods": "false",
-                "open_commercial_content_toggle": "false",
-                "event_id": "-1",
-                "star_comment_qualification": "true",
-                "game_tag_id": game_tag_id,
-                "community_flagged_chat_review_auth": "2",
-                "age_restricted": "0",
-                "sdk_key": "hd",
-                "live_room_mode": "4",
-                "gen_replay": str(gen_replay).lower(),
-                "shopping_ranking": "0"
-            }
-        else:
-            version = self.getLiveStudioLatestVersion()
-            self.s.headers = {
-                "user-agent": f"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) TikTokLIVEStudio/{version} Chrome/108.0.5359.215 Electron/22.3.18-tt.8.release.main.44 TTElectron/22.3.18-tt.8.release.main.44 Safari/537.36",
-            }
-            params = {
-                # App ID for TikTok Live Studio
-                "aid": "8311",
-                # App name for TikTok Live Studio
-                "app_name": "tiktok_live_studio",
-                # Channel for TikTok Live Studio
-                "channel": "studio",
-                "device_platform": "windows",
-                # Priority region for the stream
-                "priority_region": priority_region,
-                "live_mode": "6",
-                "version_code": version,
-                "webcast_sdk_version": version.replace(".", "").replace("0", ""),
-                "webcast_language": "en",
-                "app_language": "en",
-                "language": "en",
-                "browser_version": "5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) TikTokLIVEStudio/0.69.2 Chrome/108.0.5359.215 Electron/22.3.18-tt.8.release.main.44 TTElectron/22.3.18-tt.8.release.main.44 Safari/537.36",
-                "browser_name": "Mozilla",
-                "browser_platform": "Win32",
-                "browser_language": "en-US",
-                "screen_height": "1080",
-                "screen_width": "1920",
-                "timezone_name": "Africa/Lagos",
-                "device_id": "7378193331631310352",
-                "install_id": "7378196538524927745"
-            }
-            data = {
-                "title": title,
-                "live_studio": "1",
-                "gen_replay": str(gen_replay).lower(),
-                "chat_auth": "1",
-                "cover_uri": "",
-                "close_room_when_close_stream": str(close_room_when_close_stream).lower(),
-                "hashtag_id": str(hashtag_id),
-                "game_tag_id": str(game_tag_id),
-                "screenshot_cover_status": "1",
-                "live_sub_only": "0",
-                "chat_sub_only_auth": "2",
-                "multi_stream_scene": "0",
-                "gift_auth": "1",
-                "chat_l2": "1",
-                "star_comment_switch": "true",
-                "multi_stream_source": "1"
-            }
-        if age_restricted:
-            data["age_restricted"] = "4"
         if thumbnail_path:
-            uri = self.uploadThumbnail(thumbnail_path, base_url, params)
+            # Start normalising the cover while the lookups below run
+            import thumbnails
+            thumbnails.pipeline.prepare(thumbnail_path)
+        version = self.getLiveStudioLatestVersion() if spoof_plat not in (1, 2) else webcast.DEFAULT_VERSION
+        self.s.headers, params, data = webcast.create_request(
+            title, hashtag_id, game_tag_id, gen_replay, close_room_when_close_stream,
+            age_restricted, priority_region, spoof_plat, openudid, device_id, iid, version
+        )
+        if thumbnail_path:
+            uri = self.uploadThumbnail(thumbnail_path, params)
             data["cover_uri"] = uri
         # Signing is disabled for now
         # sig = Gorgon(urlencode(params, quote_via=urllib.parse.quote), urlencode(data, quote_via=urllib.parse.quote), urlencode(self.s.cookies, quote_via=urllib.parse.quote)).get_value()
@@ -364,115 +159,159 @@ class Stream:
         # else:
         #     self.s.headers.update(ladon_encrypt(sig["x-khronos"], 1611921764, 8311))
             
-        streamInfo = self.s.post(
-            base_url + "webcast/room/create/",
+        streamInfo = self._webcastPost(
+            webcast.CREATE_PATH,
             params=params,
             data=data
         ).json()
-        try:
-            self.streamUrl = streamInfo["data"]["stream_url"][
-                "rtmp_push_url"
-            ]
-            split_index = self.streamUrl.rfind("/")
-            self.baseStreamUrl = self.streamUrl[:split_index]
-            self.streamKey = self.streamUrl[split_index + 1:]
-            self.streamShareUrl = streamInfo["data"]["share_url"]
-            return True
-        except KeyError:
-            print(f"Error: {streamInfo['data']['prompts']}")
+        room, error = webcast.parse_create(streamInfo)
+        if room is None:
+            self.lastError = error
+            print(f"Error: {self.lastError}")
             return False
+        self.streamUrl = room["stream_url"]
+        self.baseStreamUrl = room["base_stream_url"]
+        self.streamKey = room["stream_key"]
+        self.streamShareUrl = room["share_url"]
+        self.roomId = room["room_id"]
+        self.upstreamStreamId = room["upstream_stream_id"]
+        return True
 
+    @_journaled("end_stream", context=_journal_context)
     def endStream(self):
-        base_url = self.getServerUrl()
-        params = {
-            # App ID for TikTok Live Studio
-            "aid": "8311",
-            # App name for TikTok Live Studio
-            "app_name": "tiktok_live_studio",
-            # Channel for TikTok Live Studio
-            "channel": "studio",
-            "device_platform": "windows",
-            "live_mode": "6",
-        }
-        streamInfo = self.s.post(
-            base_url + "webcast/room/finish_abnormal/",
-            params=params
+        streamInfo = self._webcastPost(
+            webcast.END_PATH,
+            params=webcast.end_params()
         ).json()
-        if "data" in streamInfo and "prompts" in streamInfo["data"]:
-            print(f"Error: {streamInfo['data']['prompts']}")
+        error = webcast.parse_end(streamInfo)
+        if error:
+            self.lastError = error
+            print(f"Error: {self.lastError}")
             return False
         return True
 
     def getServerUrl(self):
-        url = (
-            "https://tnc16-platform-useast1a.tiktokv.com/get_domains/v4/?"
-            "aid=8311&ttwebview_version=1130022001&device_platform=win"
-        )
-        response = self.s.get(url).json()
-        for data in response["data"]["ttnet_dispatch_actions"]:
-            if "param" in data and "strategy_info" in data["param"] and "webcast-normal.tiktokv.com" in data["param"]["strategy_info"]:
-                server_url = data['param']['strategy_info']['webcast-normal.tiktokv.com']
-                for data2 in response["data"]["ttnet_dispatch_actions"]:
-                    if "param" in data2 and "strategy_info" in data2["param"] and server_url in data2["param"]["strategy_info"]:
-                        server_url = data2['param']['strategy_info'][server_url]
-                        return f"https://{server_url}/"
-                return f"https://{server_url}/"
-            
+        """Base URL of the best-ranked webcast host."""
+        return f"https://{self.getWebcastHosts()[0]}/"
+
+    def getWebcastHosts(self):
+        """Webcast hosts from TikTok's dispatch data, best first."""
+        import hosts
+
+        candidates = metadata_cache.get_or_load(
+            "webcast_hosts",
+            self._fetchWebcastHosts,
+            SERVER_URL_CACHE_TTL
+        ) or [hosts.DEFAULT_HOST]
+        return hosts.webcast_hosts.rank(candidates)
+
+    def _fetchWebcastHosts(self):
+        import hosts
+
+        try:
+            response = self.s.get(webcast.HOSTS_URL).json()
+        except Exception as e:
+            print(f"Failed to fetch server list: {e}")
+            return None
+        candidates = hosts.extract_candidates(response)
+        hosts.webcast_hosts.probe(candidates)
+        return candidates
+
+    def _webcastPost(self, path, idempotent=False, **kwargs):
+        """POST to path on the best webcast host, failing over to the next.
+
+        Only connection failures and gateway errors fail over; any other
+        response is returned as is. Calls that aren't idempotent (room
+        create and end) fail over only when the connection couldn't be
+        set up, since a gateway error or a dropped connection may come
+        after the upstream already acted on the request.
+        """
+        import hosts
+        import requests
+
+        kwargs.setdefault("timeout", (WEBCAST_CONNECT_TIMEOUT, None))
+        candidates = self.getWebcastHosts()
+        for i, host in enumerate(candidates):
+            last = i == len(candidates) - 1
+            try:
+                response = self.s.post(f"https://{host}/{path}", **kwargs)
+            except requests.ConnectionError as e:
+                hosts.webcast_hosts.record(host, ok=False)
+                if last or not (idempotent or _connect_failed(e)):
+                    raise
+                print(f"{host} unreachable ({type(e).__name__}), trying {candidates[i + 1]}")
+                continue
+            if response.status_code in webcast.FAILOVER_STATUSES and idempotent and not last:
+                hosts.webcast_hosts.record(host, ok=False)
+                print(f"{host} returned {response.status_code}, trying {candidates[i + 1]}")
+                continue
+            self.lastUpstreamMs = round(response.elapsed.total_seconds() * 1000, 1)
+            self.lastHost = host
+            hosts.webcast_hosts.record(host, self.lastUpstreamMs)
+            return response
+
+    @_journaled("upload_thumbnail", context=_journal_context)
     def uploadThumbnail(
         self,
         file_path,
-        base_url,
         params
     ):
+        import thumbnails
+
+        prepared = thumbnails.pipeline.prepare(file_path).result()
+        account = account_name(self.cookies_file)
+        uri = thumbnails.upload_cache.get(account, prepared.digest)
+        if uri:
+            return uri
+
         files = {
-            "file": (f"crop_{round(time.time() * 1000)}.png", open(file_path, "rb"), "multipart/form-data")
+            "file": (prepared.filename, prepared.data, prepared.content_type)
         }
-        thumbnailInfo = self.s.post(
-                    base_url + "webcast/room/upload/image/",
+        thumbnailInfo = self._webcastPost(
+                    webcast.UPLOAD_IMAGE_PATH,
+                    idempotent=True,
                     params=params,
                     files=files
         ).json()
-        return thumbnailInfo.get("data", {}).get("uri", "")
+        uri = webcast.parse_upload(thumbnailInfo)
+        if uri:
+            thumbnails.upload_cache.put(account, prepared.digest, uri)
+        return uri
             
     def renewCookies(self):
-        response = self.s.get("https://www.tiktok.com/foryou")
-        if response.url == "https://www.tiktok.com/login/phone-or-email":
+        """Check the session is still logged in, saving rotated cookies to the account file."""
+        import account_health
+
+        status = account_health.checker.check(self.cookies_file, session=self.s)
+        if status["state"] == account_health.INVALID:
             print("Error: Cookies are invalid. Please login again.")
             return False
-        else:
-            new_cookies = []
-            cookies = dict(self.s.cookies)
-            for cookie in cookies:
-                new_cookies.append(
-                    {
-                        "name": cookie,
-                        "value": cookies[cookie]
-                    }
-                )
-            with open("cookies.json", "w") as file:
-                json.dump(new_cookies, file)
-            return True
+        return True
 
 
 def fetch_game_tags():
-    url = (
-        "https://webcast16-normal-c-useast2a.tiktokv.com/webcast/"
-        "room/hashtag/list/"
-    )
+    return metadata_cache.get_or_load("game_tags", _fetch_game_tags, GAME_TAGS_CACHE_TTL)
+
+
+def _fetch_game_tags():
     try:
-        response = requests.get(url)
-        game_tags = response.json()["data"]["game_tag_list"]
-        return {game["id"]: game["show_name"] for game in game_tags}
+        import requests
+
+        response = requests.get(webcast.GAME_TAGS_URL)
+        return webcast.parse_game_tags(response.json())
     except Exception as e:
         print(f"Failed to fetch game tags: {e}")
         return {}
 
 
 def generate_device():
-    if not LIBS_AVAILABLE:
-        print("Error: Libs modules not found. Cannot generate device.")
+    try:
+        from Libs.device import Device
+        from Libs.device_gen import Applog, Xlog
+    except ImportError as e:
+        print(f"Error: Libs modules not available ({e}). Cannot generate device.")
         return None, None, None
-        
+
     device: dict = Device().create_device()
     device_id, install_id = Applog(device).register_device()
     Xlog(device_id).bypass()
@@ -493,6 +332,17 @@ def find_cookies_files(cookies_dir="cookies"):
     return sorted(cookies_files)
 
 
+def account_status_label(cookies_file):
+    """Short login-state suffix for account pickers, from the last check."""
+    import account_health
+
+    status = account_health.checker.status(cookies_file)
+    if status is None:
+        return ""
+    label = {account_health.VALID: "logged in", account_health.INVALID: "logged out"}.get(status["state"], "unchecked")
+    return f" ({label}{', stale' if status['stale'] else ''})"
+
+
 def select_cookies_file(cookies_dir="cookies"):
     """Interactive cookies file selection."""
     cookies_files = find_cookies_files(cookies_dir)
@@ -504,7 +354,7 @@ def select_cookies_file(cookies_dir="cookies"):
     print("\nAvailable cookies files:")
     for i, file_path in enumerate(cookies_files, 1):
         file_name = os.path.basename(file_path)
-        print(f"{i}. {file_name}")
+        print(f"{i}. {file_name}{account_status_label(file_path)}")
     
     while True:
         try:
@@ -523,6 +373,29 @@ def select_cookies_file(cookies_dir="cookies"):
 
 def validate_cookies_file(file_path):
     """Validate if the cookies file is properly formatted."""
+    # Valid results are indexed by mtime/size so repeated runs in the daemon
+    # don't re-parse unchanged files.
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        stat = None
+    if stat is not None:
+        key = ("cookies_valid", os.path.abspath(file_path), stat.st_mtime, stat.st_size)
+        return metadata_cache.get_or_load(key, lambda: _validate_cookies_file(file_path), GAME_TAGS_CACHE_TTL)
+    return _validate_cookies_file(file_path)
+
+
+def _validate_cookies_file(file_path):
+    import journal
+
+    started = time.monotonic()
+    valid = _check_cookies_format(file_path)
+    journal.record("validate_cookies", valid, {"file_path": file_path}, started,
+                   account=account_name(file_path), error_class="invalid_format")
+    return valid
+
+
+def _check_cookies_format(file_path):
     try:
         with open(file_path, 'r') as f:
             cookies_data = json.load(f)
@@ -590,49 +463,76 @@ def list_cookies_info(cookies_dir="cookies"):
             print()
 
 
+def check_accounts(cookies_dir="cookies"):
+    """Probe every cookies file and print whether it is still logged in."""
+    import account_health
+
+    cookies_files = [f for f in find_cookies_files(cookies_dir) if validate_cookies_file(f)]
+    if not cookies_files:
+        print("No cookies files found.")
+        return
+    for file_path in cookies_files:
+        status = account_health.checker.check(file_path)
+        if status['state'] == account_health.VALID:
+            print(f"✓ {account_name(file_path)}: logged in as {status.get('username') or 'unknown user'}")
+        elif status['state'] == account_health.INVALID:
+            print(f"✗ {account_name(file_path)}: logged out ({status.get('reason')})")
+        else:
+            print(f"? {account_name(file_path)}: could not check ({status.get('reason')})")
+
+
 def save_last_used_cookies(cookies_file):
     """Save the last used cookies file path for future reference."""
-    with open(".last_cookies", "w") as f:
-        f.write(cookies_file)
+    storage.write_text(".last_cookies", cookies_file)
 
 def load_last_used_cookies():
     """Load the last used cookies file path."""
     try:
-        with open(".last_cookies", "r") as f:
-            return f.read().strip()
+        return storage.read_text(".last_cookies").strip()
     except FileNotFoundError:
         return None
 
 
-def generate_title_from_file(file_path="tittle.txt"):
-    """Pick a random title from file and return it."""
+def _pick_title(pool, no_repeat=None, config_file="config.json"):
+    if no_repeat is None:
+        no_repeat = titles.no_repeat_enabled(config_file)
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            titles = [line.strip() for line in f if line.strip()]
-        if not titles:
-            print(f"Error: {file_path} is empty.")
-            return None
-        return random.choice(titles)
+        title = pool.pick(no_repeat)
     except FileNotFoundError:
-        print(f"Error: {file_path} not found.")
+        print(f"Error: {pool.path} not found.")
         return None
     except Exception as e:
         print(f"Failed to generate title: {e}")
         return None
+    if title is None:
+        print(f"Error: {pool.path} is empty.")
+    return title
+
+
+def generate_title_from_file(file_path="tittle.txt", no_repeat=None):
+    """Pick a random title from file and return it."""
+    return _pick_title(titles.pools.for_path(file_path), no_repeat)
+
+
+def generate_title_from_pool(name="default", config_file="config.json", no_repeat=None):
+    """Pick a random title from a pool whitelisted in config.json."""
+    pools = titles.load_pools(config_file)
+    if name not in pools:
+        print(f"Error: unknown title pool '{name}'. Available pools: {', '.join(pools)}")
+        return None
+    return _pick_title(titles.pools.get(name, pools[name]), no_repeat, config_file)
 
 
 def save_config(config_data, file_path="config.json"):
     """Save configuration to a JSON file."""
-    with open(file_path, "w") as file:
-        json.dump(config_data, file)
+    storage.write_json(file_path, config_data)
     print(f"Config saved successfully to {file_path}.")
 
 
 def load_config(file_path="config.json"):
     """Load configuration from a JSON file."""
     try:
-        with open(file_path, "r") as file:
-            return json.load(file)
+        return storage.read_json(file_path)
     except FileNotFoundError:
         print(f"Config file {file_path} not found. Using defaults.")
         return {}
@@ -641,6 +541,482 @@ def load_config(file_path="config.json"):
         return {}
 
 
+class StreamError(Exception):
+    """A stream operation failed; code is a stable machine-readable reason."""
+
+    def __init__(self, message, code="upstream_error", retry_after=None):
+        super().__init__(message)
+        self.code = code
+        # Seconds after which a rate_limited call may be retried
+        self.retry_after = retry_after
+
+
+def pace(endpoint, account=None, deadline=None):
+    """Wait for the rate limiter's go-ahead, or raise StreamError('rate_limited')."""
+    try:
+        ratelimit.limiter.acquire(endpoint, account, deadline)
+    except ratelimit.RateLimited as e:
+        raise StreamError(f"Busy, retry after {e.retry_after}s", "rate_limited", e.retry_after) from None
+
+
+def account_name(cookies_file):
+    return os.path.basename(cookies_file).replace('.json', '')
+
+
+def resolve_account(account, cookies_dir="cookies"):
+    """Map an account name (cookies file name, with or without .json) to its file."""
+    for file_path in find_cookies_files(cookies_dir):
+        if account in (account_name(file_path), os.path.basename(file_path)):
+            return file_path
+    return None
+
+
+def save_uploaded_thumbnail(file_storage, upload_dir="uploads"):
+    """Store an uploaded thumbnail under a content-derived name and return its path."""
+    data = file_storage.read()
+    if not data:
+        return ""
+    ext = os.path.splitext(file_storage.filename or "")[1].lower() or ".img"
+    os.makedirs(upload_dir, exist_ok=True)
+    file_path = os.path.join(upload_dir, hashlib.sha256(data).hexdigest() + ext)
+    if not os.path.exists(file_path):
+        storage.atomic_write(file_path, data)
+    return file_path
+
+
+# Maps client idempotency keys to the stream records they created
+IDEMPOTENCY_INDEX_FILE = ".idempotency_keys.json"
+
+
+def stream_record_path(stream_id):
+    return f"stream_{stream_id}.json"
+
+
+def new_stream_id():
+    """Reserve a unique stream id by creating its record file exclusively."""
+    while True:
+        stream_id = str(time.time_ns() // 1000)
+        try:
+            with open(stream_record_path(stream_id), 'x'):
+                return stream_id
+        except FileExistsError:
+            continue
+
+
+def save_stream_record(stream_id, stream_data):
+    storage.write_json(stream_record_path(stream_id), stream_data)
+
+
+def update_stream_record(stream_id, **changes):
+    """Apply changes to a stored record under its file lock.
+
+    Returns the updated record, or None if it no longer exists (background
+    updates must not bring a deleted record back).
+    """
+    def apply(stream_data):
+        if not isinstance(stream_data, dict):
+            return None
+        stream_data.update(changes)
+        return stream_data
+    return storage.update_json(stream_record_path(stream_id), apply)
+
+
+def load_stream_record(stream_id):
+    """Load a stream record by id, or None if it doesn't exist."""
+    if not stream_id.replace('_', '').isalnum():
+        return None
+    try:
+        stream_data = storage.read_json(stream_record_path(stream_id))
+    except (FileNotFoundError, ValueError):
+        return None
+    stream_data.setdefault('id', stream_id)
+    return stream_data
+
+
+def list_stream_records():
+    """Return all stream records, newest first."""
+    records = []
+    for file_path in glob.glob("stream_*.json"):
+        stream_id = os.path.basename(file_path)[len("stream_"):-len(".json")]
+        record = load_stream_record(stream_id)
+        if record is not None:
+            records.append(record)
+    records.sort(key=lambda r: r.get('created_at', 0), reverse=True)
+    return records
+
+
+def _idempotency_index():
+    """Client idempotency key -> id of the stream record it created.
+
+    Saves create_stream_once() a scan of every record. Built from the
+    records the first time; create_stream_record() keeps it up to date.
+    """
+    try:
+        return storage.read_json(IDEMPOTENCY_INDEX_FILE)
+    except FileNotFoundError:
+        pass
+    except ValueError:
+        print(f"Warning: {IDEMPOTENCY_INDEX_FILE} is corrupt, rebuilding it")
+        os.remove(IDEMPOTENCY_INDEX_FILE)
+    # Oldest first, so the newest record wins for a reused key
+    index = {record['idempotency_key']: record['id']
+             for record in reversed(list_stream_records()) if record.get('idempotency_key')}
+    return storage.update_json(IDEMPOTENCY_INDEX_FILE, lambda current: current or index, {})
+
+
+def _set_idempotency_index(idempotency_key, stream_id):
+    """Point idempotency_key at stream_id, or drop it when stream_id is None."""
+    def apply(index):
+        if stream_id is None:
+            index.pop(idempotency_key, None)
+        else:
+            index[idempotency_key] = stream_id
+        return index
+
+    storage.update_json(IDEMPOTENCY_INDEX_FILE, apply, {})
+
+
+def create_stream_record(cookies_file, options, idempotency_key=None, deadline=None):
+    """Create a room for cookies_file and persist its stream record.
+
+    options uses the same keys as config.json. deadline (a time.monotonic()
+    value) bounds the wait for the rate limiter. Returns the saved record,
+    or raises StreamError.
+    """
+    import account_health
+
+    if account_health.checker.known_invalid(cookies_file):
+        raise StreamError(
+            f"Account {account_name(cookies_file)} is logged out. Export fresh cookies and try again.",
+            "account_invalid"
+        )
+    pace("create_stream", account_name(cookies_file), deadline)
+    with Stream(cookies_file) as s:
+        created = s.createStream(
+            options.get("title", ""),
+            options.get("hashtag_id", ""),
+            options.get("game_tag_id", "0"),
+            options.get("generate_replay", False),
+            options.get("close_room_when_close_stream", True),
+            options.get("age_restricted", False),
+            options.get("priority_region", ""),
+            options.get("spoof_plat", 0),
+            options.get("openudid", ""),
+            options.get("device_id", ""),
+            options.get("iid", ""),
+            options.get("thumbnail_path", "")
+        )
+        if not created:
+            raise StreamError(str(s.lastError or "Failed to create stream"), "create_failed")
+
+        # Save the cookies file for future use (like ending stream)
+        save_last_used_cookies(cookies_file)
+
+        stream_id = new_stream_id()
+        stream_data = {
+            'id': stream_id,
+            'title': options.get("title", ""),
+            'baseStreamUrl': s.baseStreamUrl,
+            'streamKey': s.streamKey,
+            'streamShareUrl': s.streamShareUrl,
+            'room_id': s.roomId,
+            'upstream_stream_id': s.upstreamStreamId,
+            'hashtag_id': options.get("hashtag_id", ""),
+            'game_tag_id': options.get("game_tag_id", "0"),
+            'priority_region': options.get("priority_region", ""),
+            'cookies_file': cookies_file,
+            'account': account_name(cookies_file),
+            'status': 'created',
+            'created_at': time.time()
+        }
+        if idempotency_key:
+            stream_data['idempotency_key'] = idempotency_key
+            stream_data['idempotency_fingerprint'] = idempotency.fingerprint(options)
+        save_stream_record(stream_id, stream_data)
+        if idempotency_key:
+            _set_idempotency_index(idempotency_key, stream_id)
+        rooms.poller.watch()
+        return stream_data
+
+
+def create_stream_once(cookies_file, options, idempotency_key=None, deadline=None):
+    """create_stream_record() with duplicate requests coalesced and replayed.
+
+    Requests are identified by idempotency_key when the client sends one,
+    otherwise by a hash of the account and options within a short window.
+    A key reused with another account or different options raises
+    StreamError('idempotency_conflict'). Returns (stream_data, replayed).
+    """
+    account = os.path.abspath(cookies_file)
+    fingerprint = None
+    if idempotency_key:
+        fingerprint = idempotency.fingerprint(options)
+        # Records keep their key (indexed in IDEMPOTENCY_INDEX_FILE), so
+        # replays survive a restart. A key only replays records of the same
+        # account (a record carries its push URL) created from the same options
+        stream_id = _idempotency_index().get(idempotency_key)
+        record = load_stream_record(stream_id) if stream_id else None
+        if stream_id and record is None:
+            # The record was deleted since
+            _set_idempotency_index(idempotency_key, None)
+        if record is not None and record.get('idempotency_key') == idempotency_key:
+            if os.path.abspath(record.get('cookies_file', '')) != account:
+                raise StreamError("This idempotency key was already used with another account",
+                                  "idempotency_conflict")
+            if record.get('idempotency_fingerprint', fingerprint) != fingerprint:
+                raise StreamError("This idempotency key was already used with different stream settings",
+                                  "idempotency_conflict")
+            return record, True
+        key = idempotency.token_key(account, idempotency_key)
+        window = idempotency.TOKEN_WINDOW
+    else:
+        key = idempotency.payload_key(account, options)
+        window = idempotency.PAYLOAD_WINDOW
+    try:
+        return idempotency.create_requests.run(
+            key,
+            lambda: create_stream_record(cookies_file, options, idempotency_key, deadline),
+            window,
+            fingerprint
+        )
+    except idempotency.KeyConflict:
+        raise StreamError("This idempotency key was already used with different stream settings",
+                          "idempotency_conflict")
+
+
+def start_go_live(cookies_file, options, input_source, idempotency_key=None,
+                  progress_callback=None, custom_ffmpeg_path=None):
+    """Create a room and start pushing input_source to it from this process.
+
+    The encoder warms up while the room is created (see golive.py).
+    Returns the running GoLivePipeline; raises StreamError or GoLiveError.
+    """
+    return launch_go_live(prepare_go_live(
+        cookies_file, options, input_source, idempotency_key, progress_callback, custom_ffmpeg_path
+    ))
+
+
+def prepare_go_live(cookies_file, options, input_source, idempotency_key=None,
+                    progress_callback=None, custom_ffmpeg_path=None):
+    """Build the GoLivePipeline for start_go_live() without starting it.
+
+    Its warm() can be called ahead of launch_go_live() to prime the encoder.
+    """
+    import golive
+
+    def on_progress(stream_id, stats):
+        if 'time_to_first_packet_ms' in stats and 'go_live_metrics' not in recorded:
+            recorded['go_live_metrics'] = dict(pipeline.metrics)
+            update_stream_record(stream_id, go_live_metrics=recorded['go_live_metrics'])
+        if progress_callback:
+            progress_callback(stream_id, stats)
+
+    recorded = {}
+    pipeline = golive.GoLivePipeline(
+        input_source,
+        create_room=lambda: create_stream_once(cookies_file, options, idempotency_key),
+        end_room=end_stream_record,
+        # "output_profile" in config.json picks one of ffmpeg.PROFILES
+        encoder_options={'profile': options['output_profile']} if options.get('output_profile') else None,
+        custom_ffmpeg_path=custom_ffmpeg_path,
+        progress_callback=on_progress
+    )
+    return pipeline
+
+
+def launch_go_live(pipeline):
+    """Create the room of a prepared pipeline and start its push."""
+    import golive
+
+    stream_data = pipeline.start()
+    if not pipeline.replayed:
+        update_stream_record(stream_data['id'], input_source=pipeline.input_source)
+        with golive.active_lock:
+            golive.active[stream_data['id']] = pipeline
+        from push_watchdog import monitor
+        monitor.watch(
+            stream_data['id'],
+            pipeline.is_running,
+            lambda: pipeline.last_progress_at,
+            pipeline.stop
+        )
+    return pipeline
+
+
+def end_stream_record(stream_data, deadline=None):
+    """End the room behind a stream record and mark the record ended."""
+    cookies_file = stream_data.get('cookies_file')
+    if not cookies_file:
+        raise StreamError("Stream record has no associated account", "account_unknown")
+    pace("end_stream", account_name(cookies_file), deadline)
+    with Stream(cookies_file) as s:
+        if not s.endStream():
+            raise StreamError(str(s.lastError or "Failed to end stream"), "end_failed")
+    ended_at = time.time()
+    changes = {
+        'status': 'ended',
+        'ended_at': ended_at,
+        'duration': round(ended_at - stream_data.get('created_at', ended_at), 1),
+        'cookies_file': cookies_file,
+        'account': account_name(cookies_file),
+    }
+    # The record may have been deleted while the room was being ended
+    return update_stream_record(stream_data['id'], **changes) or dict(stream_data, **changes)
+
+
+def end_stream_after_push(stream_id, reason):
+    """End the room of a push that stopped and release what it held.
+
+    Used by the push watchdog; reason is why the push went away
+    ('exited', 'crashed', 'stalled' or 'stopped').
+    """
+    stream_data = load_stream_record(stream_id)
+    if stream_data is None:
+        return None
+    if stream_data.get('status') != 'ended':
+        stream_data = end_stream_record(stream_data)
+        stream_data = update_stream_record(stream_id, ended_reason=reason) or stream_data
+
+    import golive
+    from push_watchdog import monitor
+    monitor.unwatch(stream_id)
+    with golive.active_lock:
+        pipeline = golive.active.pop(stream_id, None)
+    if pipeline is not None:
+        pipeline.stop()
+    if stream_data.get('cookies_file'):
+        session_pool.discard(stream_data['cookies_file'])
+    return stream_data
+
+
+def mark_end_failed(stream_id, reason, error):
+    """Record that the watchdog gave up ending the room of a push that stopped."""
+    update_stream_record(stream_id, status='end_failed', ended_reason=reason, end_error=str(error))
+
+
+def start_background_services():
+    """Start the services that watch over pushes from this process."""
+    from push_watchdog import monitor
+    import account_health
+
+    monitor.start(end_stream_after_push, mark_end_failed)
+    account_health.checker.start(lambda: find_cookies_files() if os.path.isdir("cookies") else [])
+    rooms.poller.start(list_stream_records, update_stream_record)
+    from scheduler import scheduler
+    scheduler.start(warm_scheduled_job, fire_scheduled_job, release_scheduled_job)
+
+
+class _WarmedJob:
+    """What a scheduled job's warm-up leaves ready for its start time."""
+
+    def __init__(self, stream, pipeline=None):
+        self.stream = stream
+        self.pipeline = pipeline
+        self._session_returned = False
+
+    def return_session(self):
+        """Hand the warm session back to the pool (once)."""
+        if not self._session_returned:
+            self._session_returned = True
+            self.stream.__exit__(None, None, None)
+
+
+def _touch_webcast_host(stream):
+    """Open (or refresh) a keep-alive connection to the best webcast host."""
+    stream.s.head(stream.getServerUrl(), timeout=(WEBCAST_CONNECT_TIMEOUT, 5), allow_redirects=False)
+
+
+def warm_scheduled_job(job, prime_at):
+    """Warm-up phase of a scheduled go-live (see scheduler.py).
+
+    Everything that doesn't need the room is done now, so that at the start
+    time only room creation and the push remain. Returns (state, metrics);
+    steps that fail are retried cold at the start time, but a logged-out
+    account fails the job right away.
+    """
+    import account_health
+    import scheduler
+
+    cookies_file = job['account']
+    options = job['options']
+    metrics = {}
+
+    def step(name, func):
+        started = time.monotonic()
+        try:
+            func()
+        except Exception as e:
+            metrics[f'{name}_error'] = str(e)
+            print(f"Warning: warm-up step {name} failed for job {job['id']}: {e}")
+        else:
+            metrics[f'{name}_ms'] = round((time.monotonic() - started) * 1000, 1)
+
+    if not validate_cookies_file(cookies_file):
+        raise StreamError(f"Cookies file {cookies_file} is missing or invalid", "account_unknown")
+    stream = Stream(cookies_file)
+    state = _WarmedJob(stream)
+    try:
+        status = account_health.checker.check(cookies_file, session=stream.s)
+        if status['state'] == account_health.INVALID:
+            raise StreamError(
+                f"Account {account_name(cookies_file)} is logged out. Export fresh cookies and try again.",
+                "account_invalid"
+            )
+        step('version', stream.getLiveStudioLatestVersion)
+        step('hosts', stream.getWebcastHosts)
+        step('connect', lambda: _touch_webcast_host(stream))
+        if options.get('thumbnail_path'):
+            def upload():
+                spoof_plat = options.get('spoof_plat', 0)
+                version = stream.getLiveStudioLatestVersion() if spoof_plat not in (1, 2) else webcast.DEFAULT_VERSION
+                stream.s.headers, params, _ = webcast.create_request(
+                    options.get('title', ''), options.get('hashtag_id', ''), options.get('game_tag_id', '0'),
+                    spoof_plat=spoof_plat, priority_region=options.get('priority_region', ''),
+                    openudid=options.get('openudid', ''), device_id=options.get('device_id', ''),
+                    iid=options.get('iid', ''), version=version
+                )
+                if not stream.uploadThumbnail(options['thumbnail_path'], params):
+                    raise StreamError("Thumbnail upload returned no URI")
+            step('thumbnail', upload)
+
+        if job.get('input_source'):
+            import golive
+            import telemetry
+            state.pipeline = prepare_go_live(
+                cookies_file, options, job['input_source'], f"schedule-{job['id']}",
+                progress_callback=telemetry.hub.update, custom_ffmpeg_path=job.get('ffmpeg_path')
+            )
+            step('stage', state.pipeline.stage_input)
+            step('probe', lambda: setattr(state.pipeline, 'probe', golive.probe_input(
+                state.pipeline.read_source, job.get('ffmpeg_path'))))
+            if not scheduler.scheduler.wait_until(prime_at):
+                return state, metrics
+            step('encoder', state.pipeline.warm)
+        # Connections idle during a long lead; open them again for T-0
+        step('reconnect', lambda: _touch_webcast_host(stream))
+    except BaseException:
+        release_scheduled_job(state)
+        raise
+    return state, metrics
+
+
+def fire_scheduled_job(job, state):
+    """Start time of a scheduled go-live: create the room and start the push."""
+    # Hand the warm session back so room creation picks it up from the pool
+    state.return_session()
+    if state.pipeline is not None:
+        return launch_go_live(state.pipeline).stream_data
+    stream_data, _ = create_stream_once(job['account'], job['options'], f"schedule-{job['id']}")
+    return stream_data
+
+
+def release_scheduled_job(state):
+    """Drop what a warm-up prepared for a job that won't start."""
+    if state.pipeline is not None:
+        state.pipeline.stop()
+    state.return_session()
+
+
 # Define topics
 topics = {
     "5": "Gaming",
@@ -654,18 +1030,30 @@ topics = {
     "45": "Education"
 }
 
-# Flask routes - only if Flask is available
-if FLASK_AVAILABLE and app:
+def create_app():
+    """Build the Flask application. Flask is only imported when this runs."""
+    from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify, stream_with_context
+
+    import account_health
+    import assets
+    import journal
+
+    app = Flask(__name__)
+    app.secret_key = SECRET_KEY
+    assets.init_app(app)
+
     @app.route('/')
     def index():
         """Main page with stream creation form"""
         cookies_files = find_cookies_files()
         game_tags = fetch_game_tags()
+        account_health.checker.revalidate(cookies_files)
         
         return render_template('index.html', 
                               topics=topics, 
                               game_tags=game_tags,
                               cookies_files=cookies_files,
+                              account_status=account_health.checker.statuses(cookies_files),
                               now={'year': time.strftime('%Y')})
 
     @app.route('/create_stream', methods=['POST'])
@@ -681,7 +1069,11 @@ if FLASK_AVAILABLE and app:
         age_restricted = 'age_restricted' in request.form
         spoof_plat = int(request.form.get('spoof_plat', '0'))
         thumbnail_path = request.form.get('thumbnail', '')
+        if request.files.get('thumbnail') and request.files['thumbnail'].filename:
+            thumbnail_path = save_uploaded_thumbnail(request.files['thumbnail'])
         cookies_file = request.form.get('cookies_file')
+        idempotency_key = request.form.get('idempotency_key')
+        input_source = request.form.get('input_source', '').strip()
         
         # Validate required fields
         if not title:
@@ -711,59 +1103,53 @@ if FLASK_AVAILABLE and app:
             device_id = ""
             iid = ""
         
+        options = {
+            'title': title,
+            'hashtag_id': hashtag_id,
+            'game_tag_id': game_tag_id,
+            'generate_replay': gen_replay,
+            'close_room_when_close_stream': close_room,
+            'age_restricted': age_restricted,
+            'priority_region': priority_region,
+            'spoof_plat': spoof_plat,
+            'openudid': openudid,
+            'device_id': device_id,
+            'iid': iid,
+            'thumbnail_path': thumbnail_path
+        }
+
         try:
-            with Stream(cookies_file) as s:
-                created = s.createStream(
-                    title,
-                    hashtag_id,
-                    game_tag_id,
-                    gen_replay,
-                    close_room,
-                    age_restricted,
-                    priority_region,
-                    spoof_plat,
-                    openudid,
-                    device_id,
-                    iid,
-                    thumbnail_path
+            if input_source:
+                import telemetry
+                pipeline = start_go_live(
+                    cookies_file, options, input_source, idempotency_key,
+                    progress_callback=telemetry.hub.update
                 )
-                
-                if created:
-                    # Save the cookies file for future use (like ending stream)
-                    save_last_used_cookies(cookies_file)
-                    
-                    # Prepare stream data for saving
-                    stream_data = {
-                        'title': title,
-                        'baseStreamUrl': s.baseStreamUrl,
-                        'streamKey': s.streamKey,
-                        'streamShareUrl': s.streamShareUrl,
-                        'hashtag_id': hashtag_id,
-                        'game_tag_id': game_tag_id,
-                        'priority_region': priority_region,
-                        'created_at': time.time()
-                    }
-                    
-                    # Save stream data
-                    stream_id = str(int(time.time()))
-                    file_path = f"stream_{stream_id}.json"
-                    with open(file_path, 'w') as f:
-                        json.dump(stream_data, f)
-                    
-                    return render_template('stream_created.html',
-                                          baseStreamUrl=s.baseStreamUrl,
-                                          streamKey=s.streamKey,
-                                          streamShareUrl=s.streamShareUrl,
-                                          title=title,
-                                          stream_id=stream_id,
-                                          now={'year': time.strftime('%Y')})
-                else:
-                    flash('Failed to create stream. Please check your settings and try again.', 'error')
-                    return redirect(url_for('index'))
+                stream_data, replayed = pipeline.stream_data, pipeline.replayed
+            else:
+                stream_data, replayed = create_stream_once(cookies_file, options, idempotency_key)
+        except StreamError as e:
+            if e.code == 'rate_limited':
+                flash(f'Too many streams are being created right now. {e}', 'error')
+            elif e.code == 'idempotency_conflict':
+                flash(f'{e}. Reload the page and submit the form again.', 'error')
+            else:
+                flash('Failed to create stream. Please check your settings and try again.', 'error')
+            return redirect(url_for('index'))
         except Exception as e:
             flash(f'Error creating stream: {str(e)}', 'error')
             return redirect(url_for('index'))
 
+        return render_template('stream_created.html',
+                              baseStreamUrl=stream_data['baseStreamUrl'],
+                              streamKey=stream_data['streamKey'],
+                              streamShareUrl=stream_data['streamShareUrl'],
+                              title=stream_data.get('title', title),
+                              stream_id=stream_data['id'],
+                              replayed=replayed,
+                              created_at=datetime.fromtimestamp(stream_data.get('created_at', time.time())).strftime('%Y-%m-%d %H:%M:%S'),
+                              now={'year': time.strftime('%Y')})
+
     @app.route('/end_stream', methods=['POST'])
     def end_stream():
         """End the current stream"""
@@ -774,6 +1160,7 @@ if FLASK_AVAILABLE and app:
             return redirect(url_for('index'))
         
         try:
+            pace("end_stream", account_name(cookies_file))
             with Stream(cookies_file) as s:
                 if s.endStream():
                     flash('Stream ended successfully', 'success')
@@ -787,6 +1174,12 @@ if FLASK_AVAILABLE and app:
     @app.route('/generate_device')
     def generate_device_route():
         """Generate device info for spoofing"""
+        try:
+            pace("generate_device")
+        except StreamError as e:
+            response = jsonify({'error': str(e)})
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 429
         openudid, device_id, iid = generate_device()
         
         if openudid:
@@ -803,10 +1196,12 @@ if FLASK_AVAILABLE and app:
         """List available cookies files"""
         cookies_files = find_cookies_files()
         cookies_info = []
+        account_health.checker.revalidate(cookies_files)
         
         for file_path in cookies_files:
             file_name = os.path.basename(file_path)
             file_size = os.path.getsize(file_path)
+            session = account_health.checker.status(file_path)
             
             try:
                 with open(file_path, 'r') as f:
@@ -825,23 +1220,33 @@ if FLASK_AVAILABLE and app:
                         'file_path': file_path,
                         'file_size': file_size,
                         'cookie_count': cookie_count,
-                        'domains': domain_str
+                        'domains': domain_str,
+                        'session': session
                     })
             except Exception as e:
                 cookies_info.append({
                     'file_name': file_name,
                     'file_path': file_path,
                     'file_size': file_size,
-                    'error': str(e)
+                    'error': str(e),
+                    'session': session
                 })
         
         return render_template('cookies_list.html', cookies_info=cookies_info, now={'year': time.strftime('%Y')})
 
     @app.route('/random_title')
     def random_title():
-        """Generate a random title from file"""
-        file_path = request.args.get('file', 'tittle.txt')
-        title = generate_title_from_file(file_path)
+        """Generate a random title from a whitelisted pool"""
+        pool = request.args.get('pool', 'default')
+        if 'file' in request.args:
+            # Older clients name the file; only whitelisted ones are served
+            paths = {path: name for name, path in titles.load_pools().items()}
+            if request.args['file'] not in paths:
+                return jsonify({'error': 'Unknown title pool'}), 404
+            pool = paths[request.args['file']]
+        elif pool not in titles.load_pools():
+            return jsonify({'error': 'Unknown title pool'}), 404
+        title = generate_title_from_pool(pool)
         
         if title:
             return jsonify({'title': title})
@@ -858,8 +1263,7 @@ if FLASK_AVAILABLE and app:
         
         for file_path in stream_files:
             try:
-                with open(file_path, 'r') as f:
-                    stream_data = json.load(f)
+                stream_data = storage.read_json(file_path)
                     
                 # Ekstrak informasi file
                 file_name = os.path.basename(file_path)
@@ -873,6 +1277,8 @@ if FLASK_AVAILABLE and app:
                     'baseStreamUrl': stream_data.get('baseStreamUrl', ''),
                     'streamKey': stream_data.get('streamKey', ''),
                     'streamShareUrl': stream_data.get('streamShareUrl', ''),
+                    'status': stream_data.get('status', 'created'),
+                    'room_state': stream_data.get('room_state') if stream_data.get('room_id') else None,
                     'created_date': created_date,
                     'file_path': file_path
                 })
@@ -881,6 +1287,132 @@ if FLASK_AVAILABLE and app:
         
         return render_template('streams_list.html', streams=streams, now={'year': time.strftime('%Y')})
 
+    @app.route('/streams/events')
+    def stream_events():
+        """Server-Sent Events feed of live telemetry for all active pushes"""
+        import telemetry
+
+        def generate():
+            version = None
+            last_sent = 0
+            yield 'retry: 3000\n\n'
+            while True:
+                telemetry.hub.scan_directory()
+                current, sessions = telemetry.hub.snapshot()
+                if current != version:
+                    version = current
+                    last_sent = time.time()
+                    yield f"data: {json.dumps(sessions)}\n\n"
+                elif time.time() - last_sent > 15:
+                    last_sent = time.time()
+                    yield ": keepalive\n\n"
+                telemetry.hub.wait_for_change(version, 1.0)
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    @app.route('/journal')
+    def journal_page():
+        """Recent entries of the operations journal with per-operation stats"""
+        max_limit = 1000
+        filters = {
+            'op': request.args.get('op') or None,
+            'failed': request.args.get('failed') == '1',
+            'since': request.args.get('since') or None,
+            'until': request.args.get('until') or None,
+            'limit': min(max(request.args.get('limit', 100, type=int) or 100, 1), max_limit),
+        }
+        failed = True if filters['failed'] else None
+        error = None
+        journal.writer.flush()
+        try:
+            if filters['since'] or filters['until']:
+                entries = journal.query(
+                    since=journal.parse_time(filters['since']), until=journal.parse_time(filters['until']),
+                    op=filters['op'], failed=failed
+                )[-filters['limit']:]
+            else:
+                entries = journal.tail(filters['limit'], op=filters['op'], failed=failed)
+        except ValueError:
+            error = "Times must look like -30m, -6h, -2d or 2025-01-31T12:00"
+            entries = []
+
+        for entry in entries:
+            entry['time'] = datetime.fromtimestamp(entry.get('ts', 0)).strftime('%Y-%m-%d %H:%M:%S')
+        operations = sorted({"create_stream", "end_stream", "upload_thumbnail", "validate_cookies", "check_account"}
+                            | {e.get('op') for e in entries if e.get('op')})
+        return render_template('journal.html',
+                              entries=list(reversed(entries)),
+                              summary=journal.summarize(entries),
+                              operations=operations,
+                              filters=filters,
+                              max_limit=max_limit,
+                              error=error,
+                              now={'year': time.strftime('%Y')})
+
+    @app.route('/schedule')
+    def schedule_page():
+        """Scheduled streams and the form to add one"""
+        from scheduler import scheduler, DEFAULT_LEAD
+
+        jobs = []
+        for job in reversed(scheduler.jobs()):
+            job['when'] = datetime.fromtimestamp(job['run_at']).strftime('%Y-%m-%d %H:%M:%S')
+            job['account_name'] = account_name(job['account'])
+            jobs.append(job)
+        return render_template('schedule.html',
+                              jobs=jobs,
+                              topics=topics,
+                              game_tags=fetch_game_tags(),
+                              cookies_files=find_cookies_files(),
+                              default_lead=DEFAULT_LEAD,
+                              now={'year': time.strftime('%Y')})
+
+    @app.route('/schedule', methods=['POST'])
+    def schedule_add():
+        """Add a scheduled stream from the form"""
+        import scheduler
+
+        cookies_file = request.form.get('cookies_file')
+        if cookies_file not in find_cookies_files() or not validate_cookies_file(cookies_file):
+            flash('Please choose a valid account', 'error')
+            return redirect(url_for('schedule_page'))
+        options = load_config()
+        options.update({
+            'title': request.form.get('title', '').strip(),
+            'hashtag_id': request.form.get('topic', ''),
+            'game_tag_id': request.form.get('game_tag', '') or options.get('game_tag_id', '0'),
+            'priority_region': request.form.get('region', ''),
+            'thumbnail_path': request.form.get('thumbnail', '').strip(),
+        })
+        if not options['title'] or not options['hashtag_id']:
+            flash('Stream title and topic are required', 'error')
+            return redirect(url_for('schedule_page'))
+        try:
+            run_at = scheduler.parse_when(request.form.get('when', ''))
+            lead = request.form.get('lead', type=float)
+            job = scheduler.scheduler.add(run_at, cookies_file, options,
+                                          request.form.get('input_source', '').strip(), lead)
+        except ValueError as e:
+            flash(f'Invalid start time: {e}', 'error')
+            return redirect(url_for('schedule_page'))
+        flash(f"Stream scheduled for {datetime.fromtimestamp(job['run_at']).strftime('%Y-%m-%d %H:%M')}", 'success')
+        return redirect(url_for('schedule_page'))
+
+    @app.route('/schedule/<job_id>/cancel', methods=['POST'])
+    def schedule_cancel(job_id):
+        """Cancel a scheduled stream"""
+        from scheduler import scheduler
+
+        if scheduler.cancel(job_id):
+            flash('Scheduled stream cancelled', 'success')
+        else:
+            flash('That stream has already started or no longer exists', 'error')
+        return redirect(url_for('schedule_page'))
+
     @app.route('/delete_stream/<stream_id>', methods=['POST'])
     def delete_stream(stream_id):
         """Delete a stream"""
@@ -904,7 +1436,189 @@ if FLASK_AVAILABLE and app:
                 'error': str(e)
             }), 500
 
-def main():
+    register_api(app)
+    return app
+
+
+API_ERROR_STATUS = {
+    'invalid_request': 400,
+    'account_not_found': 404,
+    'account_unknown': 409,
+    'account_invalid': 409,
+    'stream_not_found': 404,
+    'stream_already_ended': 409,
+    'idempotency_conflict': 409,
+    'rate_limited': 429,
+    'create_failed': 502,
+    'end_failed': 502,
+    'upstream_error': 502,
+}
+
+
+def register_api(app):
+    """Register the versioned JSON API (/api/v1) on a Flask app."""
+    from flask import Blueprint, request, jsonify
+    from werkzeug.exceptions import HTTPException
+
+    import account_health
+
+    api = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+    def error(code, message, retry_after=None):
+        response = jsonify({'error': {'code': code, 'message': message}})
+        if retry_after:
+            response.headers['Retry-After'] = str(retry_after)
+        return response, API_ERROR_STATUS.get(code, 400)
+
+    def deadline():
+        """Deadline from an RFC 7240 'Prefer: wait=N' header, if any."""
+        for preference in request.headers.get('Prefer', '').split(','):
+            name, _, value = preference.strip().partition('=')
+            if name.lower() == 'wait':
+                try:
+                    return time.monotonic() + max(0.0, float(value))
+                except ValueError:
+                    return None
+        return None
+
+    def public(stream_data):
+        data = {k: v for k, v in stream_data.items() if k not in ('cookies_file', 'idempotency_key')}
+        if stream_data.get('baseStreamUrl'):
+            data['rtmpUrl'] = f"{stream_data['baseStreamUrl']}/{stream_data.get('streamKey', '')}"
+        return data
+
+    @api.errorhandler(StreamError)
+    def stream_error(e):
+        return error(e.code, str(e), e.retry_after)
+
+    @api.errorhandler(Exception)
+    def unexpected_error(e):
+        if isinstance(e, HTTPException):
+            return jsonify({'error': {'code': 'invalid_request', 'message': e.description}}), e.code
+        return error('upstream_error', str(e))
+
+    @api.route('/accounts', methods=['GET'])
+    def accounts():
+        cookies_files = find_cookies_files()
+        account_health.checker.revalidate(cookies_files)
+        health = {}
+        for f in cookies_files:
+            status = account_health.checker.status(f)
+            health[account_name(f)] = {
+                'state': status['state'] if status else account_health.UNKNOWN,
+                'checked_at': status['checked_at'] if status else None,
+                'stale': status['stale'] if status else True,
+            }
+        return jsonify({'accounts': [account_name(f) for f in cookies_files], 'health': health})
+
+    @api.route('/streams', methods=['POST'])
+    def create():
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            return error('invalid_request', 'Request body must be a JSON object')
+
+        account = body.get('account')
+        if not account:
+            return error('invalid_request', 'account is required')
+        cookies_file = resolve_account(account)
+        if not cookies_file or not validate_cookies_file(cookies_file):
+            return error('account_not_found', f"Unknown or invalid account '{account}'")
+
+        options = {
+            'title': body.get('title'),
+            'hashtag_id': str(body.get('hashtag_id') or body.get('topic') or ''),
+            'game_tag_id': str(body.get('game_tag_id') or '0'),
+            'generate_replay': bool(body.get('gen_replay', False)),
+            'close_room_when_close_stream': bool(body.get('close_room', True)),
+            'age_restricted': bool(body.get('age_restricted', False)),
+            'priority_region': body.get('region', ''),
+            'spoof_plat': body.get('spoof_plat') or 0,
+            'openudid': body.get('openudid', ''),
+            'device_id': body.get('device_id', ''),
+            'iid': body.get('iid', ''),
+            'thumbnail_path': body.get('thumbnail', '')
+        }
+        if not options['title']:
+            return error('invalid_request', 'title is required')
+        if not options['hashtag_id']:
+            return error('invalid_request', 'hashtag_id is required')
+        if options['hashtag_id'] == "5" and options['game_tag_id'] in ('', '0'):
+            return error('invalid_request', 'game_tag_id is required for the Gaming topic')
+        if options['spoof_plat'] not in (0, 1, 2, '0', '1', '2'):
+            return error('invalid_request', 'spoof_plat must be 0, 1 or 2')
+        options['spoof_plat'] = int(options['spoof_plat'])
+        if options['spoof_plat'] in (1, 2) and not all([options['openudid'], options['device_id'], options['iid']]):
+            return error('invalid_request', 'openudid, device_id and iid are required for mobile spoofing')
+
+        idempotency_key = request.headers.get('Idempotency-Key') or body.get('idempotency_key')
+        stream_data, replayed = create_stream_once(cookies_file, options, idempotency_key, deadline())
+        return jsonify({'stream': public(stream_data), 'replayed': replayed}), 200 if replayed else 201
+
+    @api.route('/streams', methods=['GET'])
+    def list_streams():
+        try:
+            page = max(1, int(request.args.get('page', 1)))
+            per_page = min(100, max(1, int(request.args.get('per_page', 20))))
+        except ValueError:
+            return error('invalid_request', 'page and per_page must be integers')
+        records = list_stream_records()
+        account = request.args.get('account')
+        if account:
+            records = [r for r in records if r.get('account') == account]
+        start = (page - 1) * per_page
+        return jsonify({
+            'streams': [public(r) for r in records[start:start + per_page]],
+            'page': page,
+            'per_page': per_page,
+            'total': len(records)
+        })
+
+    @api.route('/streams/<stream_id>', methods=['GET'])
+    def get_stream(stream_id):
+        stream_data = load_stream_record(stream_id)
+        if stream_data is None:
+            return error('stream_not_found', f"Stream '{stream_id}' not found")
+        return jsonify({'stream': public(stream_data)})
+
+    @api.route('/streams/<stream_id>/logs', methods=['GET'])
+    def stream_logs(stream_id):
+        import sessionlog
+
+        if load_stream_record(stream_id) is None:
+            return error('stream_not_found', f"Stream '{stream_id}' not found")
+        try:
+            lines = min(1000, max(0, int(request.args.get('lines', 100))))
+        except ValueError:
+            return error('invalid_request', 'lines must be an integer')
+        return jsonify({'lines': sessionlog.tail(stream_id, lines) or []})
+
+    @api.route('/streams/<stream_id>/end', methods=['POST'])
+    def end_stream(stream_id):
+        stream_data = load_stream_record(stream_id)
+        if stream_data is None:
+            return error('stream_not_found', f"Stream '{stream_id}' not found")
+        if stream_data.get('status') == 'ended':
+            return error('stream_already_ended', f"Stream '{stream_id}' has already ended")
+
+        # Older records don't know their account; allow naming it explicitly
+        body = request.get_json(silent=True) or {}
+        if not stream_data.get('cookies_file') and body.get('account'):
+            cookies_file = resolve_account(body['account'])
+            if not cookies_file:
+                return error('account_not_found', f"Unknown account '{body['account']}'")
+            stream_data['cookies_file'] = cookies_file
+            stream_data['account'] = account_name(cookies_file)
+
+        return jsonify({'stream': public(end_stream_record(stream_data, deadline()))})
+
+    @api.route('/limits', methods=['GET'])
+    def limits():
+        return jsonify({'limits': ratelimit.load_limits(), 'metrics': ratelimit.limiter.metrics()})
+
+    app.register_blueprint(api)
+
+
+def build_parser():
     # Create command line parser
     parser = argparse.ArgumentParser(description="TikTok Stream Key Generator (CLI Version)")
     
@@ -925,26 +1639,88 @@ def main():
     parser.add_argument("--end-stream", action="store_true", help="End current stream")
     parser.add_argument("--list-games", action="store_true", help="List available game tags")
     parser.add_argument("--list-cookies", action="store_true", help="List available cookies files")
+    parser.add_argument("--check-accounts", action="store_true", help="Check which cookies files are still logged in")
     parser.add_argument("--select-cookies", action="store_true", help="Interactively select cookies file")
-    parser.add_argument("--random-title", type=str, help="Generate random title from specified file")
+    parser.add_argument("--random-title", type=str, help="Generate random title from a title pool in config.json or a file")
     parser.add_argument("--generate-device", action="store_true", help="Generate device info for spoofing")
     parser.add_argument("--no-select", action="store_true", help="Skip account selection and use first valid cookies")
+    parser.add_argument("--go-live", type=str, metavar="INPUT", help="Create the stream and push INPUT to it with ffmpeg in this process")
+    parser.add_argument("--ffmpeg-path", type=str, help="Custom path to ffmpeg executable (used with --go-live)")
+    parser.add_argument("--schedule", type=str, metavar="WHEN",
+                        help="Schedule the stream (or --go-live push) instead of starting it now; WHEN is +10m, 20:00 or 2025-01-31T20:00")
+    parser.add_argument("--lead", type=float, help="Seconds before the scheduled time to start warming up (default: 120)")
+    parser.add_argument("--list-schedule", action="store_true", help="List scheduled streams")
+    parser.add_argument("--cancel-schedule", type=str, metavar="JOB_ID", help="Cancel a scheduled stream")
     parser.add_argument("--web", action="store_true", help="Run as web application")
     parser.add_argument("--port", type=int, default=5000, help="Port for web application")
+    parser.add_argument("--daemon", action="store_true", help="Run the resident CLI daemon in the foreground")
+    parser.add_argument("--stop-daemon", action="store_true", help="Stop the resident CLI daemon")
+    parser.add_argument("--no-daemon", action="store_true", help="Run in this process without using or spawning the daemon")
+    parser.add_argument("--no-services", action="store_true",
+                        help="With --daemon, only serve CLI commands (no push watchdog, account checks, room polling or scheduler)")
     
     # Spoofing arguments
     parser.add_argument("--openudid", type=str, help="OpenUDID for mobile spoofing")
     parser.add_argument("--device-id", type=str, help="Device ID for mobile spoofing")
     parser.add_argument("--iid", type=str, help="Install ID for mobile spoofing")
-    
-    args = parser.parse_args()
+    return parser
+
+
+def needs_terminal(argv):
+    """Whether main(argv) may prompt for input and so must not be forwarded.
+
+    Mirrors main(): a stream create (or schedule) with several cookies files
+    and no --no-select asks which account to use.
+    """
+    if "-h" in argv or "--help" in argv:
+        return False
+    parser = build_parser()
+
+    def usage_error(message):
+        raise ValueError(message)
+
+    # Let usage errors be reported once, by whichever process runs main()
+    parser.error = usage_error
+    try:
+        args, _ = parser.parse_known_args(argv)
+    except (ValueError, SystemExit):
+        return False
+    if args.select_cookies or args.go_live:
+        return True
+    if args.no_select or any((args.daemon, args.stop_daemon, args.web, args.list_games, args.list_cookies,
+                              args.check_accounts, args.list_schedule, args.cancel_schedule,
+                              args.generate_device, args.end_stream)):
+        return False
+    return os.path.isdir(args.cookies_dir) and len(find_cookies_files(args.cookies_dir)) > 1
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.daemon:
+        import daemon
+        if args.no_services:
+            daemon.serve(main)
+            return
+        from push_watchdog import monitor
+        from scheduler import scheduler
+        start_background_services()
+        daemon.serve(main, keepalive=lambda: monitor.busy() or scheduler.busy())
+        return
+
+    if args.stop_daemon:
+        import daemon
+        print(daemon.stop(), end="")
+        return
     
     # Handle web mode
     if args.web:
-        if not FLASK_AVAILABLE:
+        try:
+            app = create_app()
+        except ImportError:
             print("Error: Flask is not installed. Please install it with: pip install flask")
             return
-            
+
         # Create templates directory if it doesn't exist
         if not os.path.exists('templates'):
             os.makedirs('templates')
@@ -956,6 +1732,9 @@ def main():
                 print(f"Error: templates/{template} not found. Please make sure the template files are in the correct location.")
                 return
         
+        # With the debug reloader only the serving child runs the services
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            start_background_services()
         app.run(host='0.0.0.0', port=args.port, debug=True)
         return
     
@@ -970,6 +1749,18 @@ def main():
     if args.list_cookies:
         list_cookies_info(args.cookies_dir)
         return
+
+    if args.check_accounts:
+        check_accounts(args.cookies_dir)
+        return
+
+    if args.list_schedule:
+        list_schedule()
+        return
+
+    if args.cancel_schedule:
+        cancel_schedule(args.cancel_schedule)
+        return
     
     if args.select_cookies:
         selected_cookies = select_cookies_file(args.cookies_dir)
@@ -985,6 +1776,11 @@ def main():
         return
     
     if args.generate_device:
+        try:
+            pace("generate_device")
+        except StreamError as e:
+            print(f"Error: {e}")
+            return
         openudid, device_id, iid = generate_device()
         if openudid:
             print(f"Generated device info:")
@@ -1011,11 +1807,12 @@ def main():
             print("No valid cookies files found.")
             return
         
-        account_name = os.path.basename(cookies_file).replace('.json', '')
-        print(f"Using account: {account_name}")
+        account = os.path.basename(cookies_file).replace('.json', '')
+        print(f"Using account: {account}")
         print(f"Cookies file: {cookies_file}")
         
         try:
+            pace("end_stream", account)
             with Stream(cookies_file) as s:
                 if s.endStream():
                     print("Stream ended successfully.")
@@ -1032,7 +1829,10 @@ def main():
     if args.title:
         config["title"] = args.title
     elif args.random_title:
-        title = generate_title_from_file(args.random_title)
+        if args.random_title in titles.load_pools(args.config):
+            title = generate_title_from_pool(args.random_title, args.config)
+        else:
+            title = generate_title_from_file(args.random_title, titles.no_repeat_enabled(args.config))
         if title:
             config["title"] = title
             print(f"Generated title: {title}")
@@ -1123,11 +1923,13 @@ def main():
         print("No cookies files found.")
         return
     
+    import account_health
+
     # If there are multiple cookies files and no --no-select flag, let user choose
     if len(cookies_files) == 1 or args.no_select:
         # Only one cookies file or --no-select flag, use first valid automatically
         for file_path in cookies_files:
-            if validate_cookies_file(file_path):
+            if validate_cookies_file(file_path) and not account_health.checker.known_invalid(file_path):
                 cookies_file = file_path
                 break
     else:
@@ -1139,11 +1941,11 @@ def main():
                 valid_cookies.append(file_path)
                 file_name = os.path.basename(file_path)
                 # Try to extract account name from filename
-                account_name = file_name.replace('.json', '')
+                account = file_name.replace('.json', '')
                 # Remove "cookies/" prefix if present
-                if account_name.startswith('cookies/'):
-                    account_name = account_name[8:]
-                print(f"{i}. {account_name}")
+                if account.startswith('cookies/'):
+                    account = account[8:]
+                print(f"{i}. {account}{account_status_label(file_path)}")
         
         if not valid_cookies:
             print("No valid cookies files found.")
@@ -1168,15 +1970,24 @@ def main():
         print("No valid cookies files found.")
         return
     
-    account_name = os.path.basename(cookies_file).replace('.json', '')
-    print(f"Using account: {account_name}")
+    account = os.path.basename(cookies_file).replace('.json', '')
+    print(f"Using account: {account}")
     print(f"Cookies file: {cookies_file}")
     
     # Save the cookies file for future use (like ending stream)
     save_last_used_cookies(cookies_file)
+
+    if args.schedule:
+        schedule_cli(cookies_file, config, args.schedule, args.lead, args.go_live, args.ffmpeg_path)
+        return
     
+    if args.go_live:
+        go_live_cli(cookies_file, config, args.go_live, args.ffmpeg_path)
+        return
+
     # Create stream
     try:
+        pace("create_stream", account)
         with Stream(cookies_file) as s:
             created = s.createStream(
                 config.get("title", ""),
@@ -1206,7 +2017,115 @@ def main():
         print(f"Error creating stream: {e}")
 
 
-if __name__ == "__main__":
-    main()
+def schedule_cli(cookies_file, config, when, lead=None, input_source=None, custom_ffmpeg_path=None):
+    """Add a scheduled stream for cookies_file with the current settings."""
+    import scheduler
+
+    try:
+        run_at = scheduler.parse_when(when)
+        job = scheduler.scheduler.add(run_at, cookies_file, config, input_source, lead, custom_ffmpeg_path)
+    except ValueError as e:
+        print(f"Error: Invalid schedule time '{when}': {e}")
+        return
+    print(f"Scheduled stream {job['id']} for {datetime.fromtimestamp(run_at).strftime('%Y-%m-%d %H:%M:%S')}"
+          f" (warm-up {job['lead']:.0f}s before).")
+    print("Scheduled streams run in the daemon (--daemon) or the web app (--web).")
+
+
+def list_schedule():
+    from scheduler import scheduler
+
+    jobs = scheduler.jobs()
+    if not jobs:
+        print("No scheduled streams.")
+        return
+    for job in jobs:
+        when = datetime.fromtimestamp(job['run_at']).strftime('%Y-%m-%d %H:%M:%S')
+        line = f"{job['id']}  {when}  {job['status']:9}  {account_name(job['account'])}  {job['options'].get('title', '')}"
+        if job.get('input_source'):
+            line += f"  <- {job['input_source']}"
+        if job.get('late_ms') is not None:
+            line += f"  (started {job['late_ms']} ms late)"
+        if job.get('error'):
+            line += f"  [{job['error']}]"
+        print(line)
 
-app.run()
+
+def cancel_schedule(job_id):
+    from scheduler import scheduler
+
+    job = scheduler.cancel(job_id)
+    if job:
+        print(f"Cancelled scheduled stream {job['id']}.")
+    else:
+        print(f"Error: No pending scheduled stream '{job_id}'.")
+
+
+def go_live_cli(cookies_file, config, input_source, custom_ffmpeg_path=None):
+    """Create the stream and push input_source to it until interrupted."""
+    import golive
+    from telemetry import FileTelemetryWriter
+
+    writers = {}
+
+    def publish(stream_id, stats):
+        if stream_id not in writers:
+            writers[stream_id] = FileTelemetryWriter(stream_id, stream_id=stream_id)
+        writers[stream_id](stats)
+
+    try:
+        pipeline = start_go_live(
+            cookies_file, config, input_source,
+            progress_callback=publish,
+            custom_ffmpeg_path=custom_ffmpeg_path
+        )
+    except (StreamError, golive.GoLiveError) as e:
+        print(f"Error going live: {e}")
+        return
+
+    stream_data = pipeline.stream_data
+    # Our telemetry files carry this process's pid; a stall is stopped here
+    from push_watchdog import monitor
+    monitor.register_stop(stream_data['id'], pipeline.stop)
+    print("Stream created and push started!")
+    print(f"Share URL: {stream_data['streamShareUrl']}")
+    print(f"Room created after {pipeline.metrics.get('room_created_ms')} ms, "
+          f"encoder primed after {pipeline.metrics.get('encoder_primed_ms')} ms")
+    print("Press Ctrl+C to stop streaming...")
+    reason = 'exited'
+    try:
+        pipeline.wait()
+    except KeyboardInterrupt:
+        print("\nStopping push...")
+        reason = 'stopped'
+        pipeline.stop()
+    finally:
+        for writer in writers.values():
+            writer.close()
+    if 'time_to_first_packet_ms' in pipeline.metrics:
+        print(f"Time to first packet: {pipeline.metrics['time_to_first_packet_ms']} ms")
+
+    # Don't leave the room open once our push is gone
+    try:
+        end_stream_after_push(stream_data['id'], reason)
+        print("Stream ended.")
+    except StreamError as e:
+        print(f"Failed to end stream: {e}")
+
+
+def run(argv=None):
+    """CLI entry point: forward to the resident daemon when possible."""
+    argv = sys.argv[1:] if argv is None else argv
+    if "--no-daemon" not in argv and not os.environ.get("TIKTOK_NO_DAEMON"):
+        import daemon
+        response = daemon.forward(argv, __file__, autospawn=bool(os.environ.get("TIKTOK_DAEMON_AUTOSPAWN")),
+                                  needs_terminal=needs_terminal)
+        if response is not None:
+            sys.stdout.write(response.get("output", ""))
+            return response.get("exit_code", 0)
+    main(argv)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
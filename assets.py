@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""Precompiled, fingerprinted static assets and HTTP caching for the web UI.
+
+`python3 assets.py build` compiles the Tailwind classes used in templates/
+and static/js/ into one stylesheet with the Tailwind CLI, then copies it
+together with the page stylesheets and scripts from static/css and static/js
+into static/dist under content-hashed names (app.3f2a9c01d4e5.js). Each file
+gets gzip and, when the brotli module is installed, brotli siblings, and
+static/dist/manifest.json maps logical names to the built files.
+`--vendor` also downloads Font Awesome into static/vendor so the panel works
+without internet access.
+
+init_app() wires this into Flask:
+
+- asset(name) in templates returns the fingerprinted /assets/ URL, falling
+  back to /static/ sources and, for the Tailwind stylesheet and Font
+  Awesome, to the CDNs when nothing was built.
+- /assets/ responses are immutable for a year and served precompressed
+  according to Accept-Encoding.
+- HTML and JSON responses get an ETag over their body, answer
+  If-None-Match with 304 and are compressed on the fly.
+- fragment(name, source) caches rendered template fragments (the topic and
+  game tag lists) for as long as their source object stays the same.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(ROOT, "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_FILE = os.path.join(DIST_DIR, "manifest.json")
+TAILWIND_CONFIG = os.path.join("static", "js", "tailwind.config.js")
+TAILWIND_OUTPUT = "css/tailwind.css"
+TAILWIND_INPUT = "@tailwind base;\n@tailwind components;\n@tailwind utilities;\n"
+# Directories under static/ copied into the build
+SOURCE_DIRS = ("css", "js", "vendor")
+# Files only used without a build
+SKIP_SOURCES = ("js/tailwind.config.js",)
+# Extensions given content-hashed names; anything else (web fonts) is
+# referenced by relative URLs and keeps its name under a versioned directory
+FINGERPRINTED = (".css", ".js")
+COMPRESSED = (".css", ".js", ".svg", ".json", ".ttf", ".eot")
+HASH_LENGTH = 12
+
+FONT_AWESOME_VERSION = "6.4.0"
+FONT_AWESOME = f"vendor/fontawesome-{FONT_AWESOME_VERSION}/css/all.min.css"
+FONT_AWESOME_CDN = f"https://cdnjs.cloudflare.com/ajax/libs/font-awesome/{FONT_AWESOME_VERSION}/css/all.min.css"
+
+ASSET_MAX_AGE = 365 * 24 * 3600
+MANIFEST_CHECK_INTERVAL = 2.0
+# Responses smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 512
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+DYNAMIC_TYPES = ("text/html", "application/json", "text/plain", "text/css", "application/javascript")
+
+
+# --- Build -----------------------------------------------------------------
+
+def tailwind_command():
+    """Return the Tailwind CLI as an argv prefix, or None.
+
+    TAILWIND_CLI (e.g. the standalone binary) wins, then a tailwindcss
+    executable on PATH, then npx.
+    """
+    if os.environ.get("TAILWIND_CLI"):
+        return shlex.split(os.environ["TAILWIND_CLI"])
+    if shutil.which("tailwindcss"):
+        return ["tailwindcss"]
+    if shutil.which("npx"):
+        return ["npx", "--yes", "tailwindcss@3"]
+    return None
+
+
+def compile_tailwind(output_path, minify=True):
+    """Compile the used utility classes into output_path; returns True on success."""
+    command = tailwind_command()
+    if command is None:
+        print("Error: Tailwind CLI not found. Install the standalone binary and set TAILWIND_CLI, or install Node.js")
+        return False
+    with tempfile.NamedTemporaryFile("w", suffix=".css", delete=False) as f:
+        f.write(TAILWIND_INPUT)
+        input_path = f.name
+    try:
+        command = command + ["-c", TAILWIND_CONFIG, "-i", input_path, "-o", output_path]
+        if minify:
+            command.append("--minify")
+        result = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    except OSError as e:
+        print(f"Error: could not run the Tailwind CLI: {e}")
+        return False
+    finally:
+        os.remove(input_path)
+    if result.returncode != 0 or not os.path.exists(output_path):
+        print(f"Error: Tailwind CLI failed: {(result.stderr or result.stdout).strip()}")
+        return False
+    return True
+
+
+def fingerprint(name, data):
+    """Return name with a content hash before its extension."""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+def _write_variants(path, data):
+    """Write path and its precompressed siblings."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    if not path.endswith(COMPRESSED) or len(data) < MIN_COMPRESS_SIZE:
+        return
+    # mtime=0 keeps the .gz bytes identical across builds
+    compressed = gzip.compress(data, 9, mtime=0)
+    if len(compressed) < len(data):
+        with open(path + ".gz", "wb") as f:
+            f.write(compressed)
+    if brotli is not None:
+        compressed = brotli.compress(data, quality=11)
+        if len(compressed) < len(data):
+            with open(path + ".br", "wb") as f:
+                f.write(compressed)
+
+
+def _sources():
+    """Yield (logical name, path) for every file copied into the build."""
+    for directory in SOURCE_DIRS:
+        base = os.path.join(STATIC_DIR, directory)
+        for dirpath, _, filenames in os.walk(base):
+            for filename in sorted(filenames):
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, STATIC_DIR).replace(os.sep, "/")
+                if name not in SKIP_SOURCES:
+                    yield name, path
+
+
+def build(minify=True):
+    """Rebuild static/dist; returns the manifest, or None on failure."""
+    staging = tempfile.mkdtemp(prefix=".dist-", dir=STATIC_DIR)
+    try:
+        tailwind_path = os.path.join(staging, "tailwind.css")
+        if not compile_tailwind(tailwind_path, minify):
+            return None
+        with open(tailwind_path, "rb") as f:
+            files = [(TAILWIND_OUTPUT, f.read())]
+        os.remove(tailwind_path)
+        for name, path in _sources():
+            with open(path, "rb") as f:
+                files.append((name, f.read()))
+
+        manifest = {}
+        for name, data in files:
+            built = fingerprint(name, data) if name.endswith(FINGERPRINTED) else name
+            _write_variants(os.path.join(staging, built), data)
+            manifest[name] = built
+        with open(os.path.join(staging, "manifest.json"), "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+        # Swap the whole directory so the running app never sees half a build
+        previous = None
+        if os.path.exists(DIST_DIR):
+            previous = DIST_DIR + ".old"
+            shutil.rmtree(previous, ignore_errors=True)
+            os.replace(DIST_DIR, previous)
+        os.replace(staging, DIST_DIR)
+        if previous:
+            shutil.rmtree(previous, ignore_errors=True)
+        return manifest
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def vendor(timeout=30):
+    """Download Font Awesome and its web fonts into static/vendor."""
+    import requests
+
+    css_path = os.path.join(STATIC_DIR, *FONT_AWESOME.split("/"))
+    base_url = FONT_AWESOME_CDN.rsplit("/", 1)[0]
+    response = requests.get(FONT_AWESOME_CDN, timeout=timeout)
+    response.raise_for_status()
+    os.makedirs(os.path.dirname(css_path), exist_ok=True)
+    with open(css_path, "wb") as f:
+        f.write(response.content)
+
+    fonts = sorted(set(re.findall(r"url\((\.\./webfonts/[^)?#]+)", response.text)))
+    for font in fonts:
+        font_response = requests.get(f"{base_url}/{font}", timeout=timeout)
+        font_response.raise_for_status()
+        font_path = os.path.normpath(os.path.join(os.path.dirname(css_path), font))
+        os.makedirs(os.path.dirname(font_path), exist_ok=True)
+        with open(font_path, "wb") as f:
+            f.write(font_response.content)
+    return 1 + len(fonts)
+
+
+# --- Serving ---------------------------------------------------------------
+
+class Manifest:
+    """The build manifest, re-read when a new build replaces it."""
+
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def get(self, name):
+        now = time.monotonic()
+        if now - self._checked_at >= MANIFEST_CHECK_INTERVAL:
+            with self._lock:
+                self._checked_at = now
+                try:
+                    mtime = os.path.getmtime(self.path)
+                except OSError:
+                    mtime = None
+                if mtime != self._mtime:
+                    try:
+                        with open(self.path) as f:
+                            self._entries = json.load(f)
+                    except (OSError, ValueError):
+                        self._entries = {}
+                    self._mtime = mtime
+        return self._entries.get(name)
+
+
+class FragmentCache:
+    """Rendered template fragments, valid while their source object is unchanged.
+
+    The source is compared by identity: metadata_cache hands out the same
+    game tag dict until it reloads, and the entry keeps a reference to it so
+    its id can't be reused.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def render(self, name, source, caller):
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is not None and entry[0] is source:
+            return entry[1]
+        html = caller()
+        with self._lock:
+            self._entries[name] = (source, html)
+        return html
+
+    def invalidate(self, name=None):
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+
+manifest = Manifest()
+fragments = FragmentCache()
+
+
+def choose_encoding(accept_encodings, available=("br", "gzip")):
+    """Return the best of available accepted by the client, or None."""
+    if brotli is None and "br" in available:
+        available = tuple(e for e in available if e != "br")
+    best = None
+    for encoding in available:
+        quality = accept_encodings[encoding]
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+
+def _compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, GZIP_LEVEL)
+
+
+def init_app(app):
+    """Register asset(), fragment(), the /assets route and response caching."""
+    from flask import abort, request, send_file, url_for
+    from werkzeug.security import safe_join
+
+    def asset(name, fallback=None):
+        built = manifest.get(name)
+        if built:
+            return url_for("built_asset", filename=built)
+        if os.path.isfile(os.path.join(app.static_folder, name)):
+            return url_for("static", filename=name)
+        return fallback
+
+    app.jinja_env.globals.update(
+        asset=asset,
+        fragment=fragments.render,
+        FONT_AWESOME=FONT_AWESOME,
+        FONT_AWESOME_CDN=FONT_AWESOME_CDN,
+    )
+
+    @app.route("/assets/<path:filename>")
+    def built_asset(filename):
+        """Serve a fingerprinted file from static/dist, precompressed if possible"""
+        path = safe_join(DIST_DIR, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        available = tuple(e for e, suffix in (("br", ".br"), ("gzip", ".gz")) if os.path.isfile(path + suffix))
+        encoding = choose_encoding(request.accept_encodings, available)
+        response = send_file(
+            path + {"br": ".br", "gzip": ".gz"}[encoding] if encoding else path,
+            mimetype=mimetypes.guess_type(filename)[0] or "application/octet-stream",
+            conditional=True,
+        )
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        if available:
+            response.vary.add("Accept-Encoding")
+        response.headers["Cache-Control"] = f"public, max-age={ASSET_MAX_AGE}, immutable"
+        return response
+
+    @app.after_request
+    def cache_response(response):
+        """Add an ETag to dynamic pages, answer revalidations and compress"""
+        if (request.method not in ("GET", "HEAD") or response.status_code != 200
+                or response.direct_passthrough or response.is_streamed
+                or response.mimetype not in DYNAMIC_TYPES
+                or "Content-Encoding" in response.headers):
+            return response
+        body = response.get_data()
+        encoding = None
+        if len(body) >= MIN_COMPRESS_SIZE:
+            encoding = choose_encoding(request.accept_encodings)
+        etag = hashlib.sha256(body).hexdigest()[:20]
+        response.set_etag(f"{etag}-{encoding}" if encoding else etag)
+        response.vary.add("Accept-Encoding")
+        if response.mimetype == "text/html" and "Cache-Control" not in response.headers:
+            response.headers["Cache-Control"] = "no-cache"
+        response.make_conditional(request)
+        if response.status_code == 304 or encoding is None:
+            return response
+        response.set_data(_compress(body, encoding))
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the web UI's static assets")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Compile and fingerprint assets into static/dist")
+    build_parser.add_argument("--vendor", action="store_true", help="Download Font Awesome first, for offline use")
+    build_parser.add_argument("--no-minify", action="store_true", help="Keep the compiled stylesheet readable")
+    subparsers.add_parser("vendor", help="Download Font Awesome into static/vendor")
+    args = parser.parse_args(argv)
+
+    if args.command == "vendor" or args.vendor:
+        try:
+            count = vendor()
+        except Exception as e:
+            print(f"Error: failed to download Font Awesome: {e}")
+            return 1
+        print(f"Downloaded {count} Font Awesome files into static/vendor")
+        if args.command == "vendor":
+            return 0
+
+    result = build(minify=not args.no_minify)
+    if result is None:
+        return 1
+    print(f"Built {len(result)} assets into {os.path.relpath(DIST_DIR)}"
+          f" ({'gzip + brotli' if brotli is not None else 'gzip'})")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""asyncio client for the webcast operations of app.Stream.
+
+AsyncStream has the same methods as Stream (version lookup, server URL,
+create, end and thumbnail upload, plus fetch_game_tags) as coroutines, and
+keeps the same attributes (baseStreamUrl, streamKey, roomId, lastError,
+lastUpstreamMs, ...). Both build their requests and read the answers with
+webcast.py, share the metadata cache, the host ranking and the thumbnail
+cache, and write the same journal entries.
+
+All AsyncStreams on an event loop share one AsyncClient: a single aiohttp
+connection pool with at most MAX_CONNECTIONS connections, and at most
+PER_HOST_LIMIT requests in flight per host. Requests beyond that wait for a
+slot before their timeout starts, so a burst of thousands of calls queues
+instead of timing out. Responses are read inside their context managers,
+so a cancelled or timed-out call always hands its connection back.
+
+Cookies are kept per AsyncStream and sent with each request (the shared
+pool has no cookie jar), so accounts never see each other's cookies.
+
+aiohttp is optional; it's only needed by this module:
+
+    pip install aiohttp
+
+The CLI keeps using the blocking Stream. From synchronous code, run():
+
+    async def end_all(cookies_files):
+        streams = [AsyncStream(f) for f in cookies_files]
+        return await asyncio.gather(*(s.endStream() for s in streams))
+
+    results = asyncstream.run(end_all(files))
+"""
+import asyncio
+import json
+import os
+import time
+from urllib.parse import urlsplit
+
+from cache import metadata_cache
+import journal
+import storage
+import webcast
+
+MAX_CONNECTIONS = 100
+PER_HOST_LIMIT = 10
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+# Same cache keys and TTLs as app.Stream, so both use one warm cache
+VERSION_CACHE_TTL = 3600
+SERVER_URL_CACHE_TTL = 600
+GAME_TAGS_CACHE_TTL = 3600
+
+
+def _aiohttp():
+    try:
+        import aiohttp
+    except ImportError:
+        raise RuntimeError("aiohttp is not installed. Install it with: pip install aiohttp") from None
+    return aiohttp
+
+
+class Response:
+    """A fully read response."""
+
+    def __init__(self, status, body, elapsed_ms, cookies):
+        self.status = status
+        self.body = body
+        self.elapsed_ms = elapsed_ms
+        self.cookies = cookies
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class AsyncClient:
+    """Shared aiohttp connection pool with per-host concurrency limits."""
+
+    def __init__(self, max_connections=MAX_CONNECTIONS, per_host=PER_HOST_LIMIT,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT):
+        self.max_connections = max_connections
+        self.per_host = per_host
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._session = None
+        self._loop = None
+        self._slots = {}
+
+    def _ensure_session(self):
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            aiohttp = _aiohttp()
+            connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.per_host,
+                                             ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar())
+            self._loop = loop
+            self._slots = {}
+        return self._session
+
+    def _slot(self, host):
+        slot = self._slots.get(host)
+        if slot is None:
+            slot = self._slots[host] = asyncio.Semaphore(self.per_host)
+        return slot
+
+    async def request(self, method, url, cookies=None, headers=None, params=None,
+                      data=None, files=None, timeout=None):
+        """Send a request and read the whole answer; returns a Response.
+
+        files is {field: (filename, bytes, content_type)} as with requests.
+        timeout is (connect, read) seconds and starts once a slot is free.
+        """
+        aiohttp = _aiohttp()
+        session = self._ensure_session()
+        connect, read = timeout or (self.connect_timeout, self.read_timeout)
+        headers = dict(headers or {})
+        if cookies:
+            headers["cookie"] = "; ".join(f"{name}={value}" for name, value in cookies.items())
+        if files:
+            form = aiohttp.FormData()
+            for name, value in (data or {}).items():
+                form.add_field(name, str(value))
+            for field, (filename, content, content_type) in files.items():
+                form.add_field(field, content, filename=filename, content_type=content_type)
+            data = form
+        elif data is not None:
+            data = {k: str(v) for k, v in data.items()}
+        if params is not None:
+            params = {k: str(v) for k, v in params.items()}
+
+        host = urlsplit(url).hostname
+        async with self._slot(host):
+            started = time.monotonic()
+            async with session.request(
+                method, url, headers=headers, params=params, data=data,
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=connect, sock_read=read)
+            ) as response:
+                body = await response.read()
+                elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+                rotated = {name: morsel.value for name, morsel in response.cookies.items()}
+                return Response(response.status, body, elapsed_ms, rotated)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+def _journal_context(stream, ok):
+    """Journal fields for an AsyncStream operation (see journal.journaled)."""
+    fields = {
+        'account': os.path.basename(stream.cookies_file).replace('.json', ''),
+        'upstream_ms': stream.lastUpstreamMs,
+        'host': stream.lastHost,
+    }
+    if not ok and stream.lastError:
+        fields['error'] = stream.lastError
+    return fields
+
+
+class AsyncStream:
+    """Coroutine version of app.Stream for one account."""
+
+    def __init__(self, cookies_file, client=None):
+        if not os.path.exists(cookies_file):
+            raise FileNotFoundError(f"Cookies file not found: {cookies_file}")
+        self.cookies_file = cookies_file
+        self.cookies = {c["name"]: c["value"] for c in storage.read_json(cookies_file)}
+        self.client = client or default_client
+        self.headers = {}
+        self.lastError = None
+        self.lastUpstreamMs = None
+        self.lastHost = None
+        self.roomId = None
+        self.upstreamStreamId = None
+
+    async def _get(self, url, **kwargs):
+        response = await self.client.request("GET", url, cookies=self.cookies, headers=self.headers, **kwargs)
+        self.cookies.update(response.cookies)
+        return response
+
+    async def getLiveStudioLatestVersion(self):
+        version = metadata_cache.get("live_studio_version")
+        if version is None:
+            try:
+                version = webcast.parse_version((await self._get(webcast.VERSION_URL, params=webcast.VERSION_PARAMS)).json())
+                metadata_cache.set("live_studio_version", version, VERSION_CACHE_TTL)
+            except Exception as e:
+                print(f"Failed to fetch latest version: {e}")
+        return version or webcast.DEFAULT_VERSION
+
+    async def getWebcastHosts(self):
+        """Webcast hosts from TikTok's dispatch data, best first."""
+        import hosts
+
+        candidates = metadata_cache.get("webcast_hosts")
+        if not candidates:
+            try:
+                candidates = hosts.extract_candidates((await self._get(webcast.HOSTS_URL)).json())
+            except Exception as e:
+                print(f"Failed to fetch server list: {e}")
+                candidates = None
+            if candidates:
+                # TCP/TLS probes block, keep them off the event loop
+                await asyncio.to_thread(hosts.webcast_hosts.probe, candidates)
+                metadata_cache.set("webcast_hosts", candidates, SERVER_URL_CACHE_TTL)
+        return hosts.webcast_hosts.rank(candidates or [hosts.DEFAULT_HOST])
+
+    async def getServerUrl(self):
+        """Base URL of the best-ranked webcast host."""
+        return f"https://{(await self.getWebcastHosts())[0]}/"
+
+    async def _webcastPost(self, path, idempotent=False, **kwargs):
+        """POST to path on the best webcast host, failing over to the next.
+
+        Like Stream._webcastPost, room create and end only fail over when
+        the connection couldn't be set up.
+        """
+        import hosts
+
+        aiohttp = _aiohttp()
+        candidates = await self.getWebcastHosts()
+        for i, host in enumerate(candidates):
+            last = i == len(candidates) - 1
+            try:
+                response = await self.client.request(
+                    "POST", f"https://{host}/{path}", cookies=self.cookies, headers=self.headers,
+                    timeout=(CONNECT_TIMEOUT, None), **kwargs
+                )
+            except aiohttp.ClientConnectionError as e:
+                hosts.webcast_hosts.record(host, ok=False)
+                connect_errors = (aiohttp.ClientConnectorError, getattr(aiohttp, "ConnectionTimeoutError", ()))
+                if last or not (idempotent or isinstance(e, connect_errors)):
+                    raise
+                print(f"{host} unreachable ({type(e).__name__}), trying {candidates[i + 1]}")
+                continue
+            if response.status in webcast.FAILOVER_STATUSES and idempotent and not last:
+                hosts.webcast_hosts.record(host, ok=False)
+                print(f"{host} returned {response.status}, trying {candidates[i + 1]}")
+                continue
+            self.cookies.update(response.cookies)
+            self.lastUpstreamMs = response.elapsed_ms
+            self.lastHost = host
+            hosts.webcast_hosts.record(host, self.lastUpstreamMs)
+            return response
+
+    @journal.journaled("create_stream", context=_journal_context)
+    async def createStream(
+        self,
+        title,
+        hashtag_id,
+        game_tag_id="0",
+        gen_replay=False,
+        close_room_when_close_stream=True,
+        age_restricted=False,
+        priority_region="",
+        spoof_plat=0,
+        openudid="",
+        device_id="",
+        iid="",
+        thumbnail_path=""
+    ):
+        if thumbnail_path:
+            import thumbnails
+            thumbnails.pipeline.prepare(thumbnail_path)
+        version = await self.getLiveStudioLatestVersion() if spoof_plat not in (1, 2) else webcast.DEFAULT_VERSION
+        self.headers, params, data = webcast.create_request(
+            title, hashtag_id, game_tag_id, gen_replay, close_room_when_close_stream,
+            age_restricted, priority_region, spoof_plat, openudid, device_id, iid, version
+        )
+        if thumbnail_path:
+            data["cover_uri"] = await self.uploadThumbnail(thumbnail_path, params)
+        response = await self._webcastPost(webcast.CREATE_PATH, params=params, data=data)
+        room, error = webcast.parse_create(response.json())
+        if room is None:
+            self.lastError = error
+            print(f"Error: {self.lastError}")
+            return False
+        self.streamUrl = room["stream_url"]
+        self.baseStreamUrl = room["base_stream_url"]
+        self.streamKey = room["stream_key"]
+        self.streamShareUrl = room["share_url"]
+        self.roomId = room["room_id"]
+        self.upstreamStreamId = room["upstream_stream_id"]
+        return True
+
+    @journal.journaled("end_stream", context=_journal_context)
+    async def endStream(self):
+        response = await self._webcastPost(webcast.END_PATH, params=webcast.end_params())
+        error = webcast.parse_end(response.json())
+        if error:
+            self.lastError = error
+            print(f"Error: {self.lastError}")
+            return False
+        return True
+
+    @journal.journaled("upload_thumbnail", context=_journal_context)
+    async def uploadThumbnail(self, file_path, params):
+        import thumbnails
+
+        prepared = await asyncio.wrap_future(thumbnails.pipeline.prepare(file_path))
+        account = os.path.basename(self.cookies_file).replace('.json', '')
+        uri = thumbnails.upload_cache.get(account, prepared.digest)
+        if uri:
+            return uri
+        files = {"file": (prepared.filename, prepared.data, prepared.content_type)}
+        response = await self._webcastPost(webcast.UPLOAD_IMAGE_PATH, idempotent=True, params=params, files=files)
+        uri = webcast.parse_upload(response.json())
+        if uri:
+            thumbnails.upload_cache.put(account, prepared.digest, uri)
+        return uri
+
+
+async def fetch_game_tags(client=None):
+    """{id: name} of TikTok's game tags, cached like app.fetch_game_tags."""
+    game_tags = metadata_cache.get("game_tags")
+    if game_tags:
+        return game_tags
+    try:
+        response = await (client or default_client).request("GET", webcast.GAME_TAGS_URL)
+        game_tags = webcast.parse_game_tags(response.json())
+    except Exception as e:
+        print(f"Failed to fetch game tags: {e}")
+        return {}
+    if game_tags:
+        metadata_cache.set("game_tags", game_tags, GAME_TAGS_CACHE_TTL)
+    return game_tags
+
+
+def run(coro):
+    """Run coro to completion from synchronous code and close the pool."""
+    async def main():
+        try:
+            return await coro
+        finally:
+            await default_client.close()
+    return asyncio.run(main())
+
+
+# Process-wide instance; bound to whichever event loop uses it
+default_client = AsyncClient()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""Encode-throughput benchmark for TikTokStreamer.
+
+Pushes synthetic sources through TikTokStreamer into a local RTMP sink
+(rtmp.py) as fast as ffmpeg can encode them, and measures sustained fps,
+speed (multiple of realtime), CPU% and peak RSS for every combination of
+source, resolution, preset and thread count. Results go to a JSON file and
+optionally a CSV matrix, so capacity limits (e.g. streams per core at each
+preset) come from measurements on the actual host.
+
+    python3 ffmpeg.py benchmark --presets ultrafast,veryfast --threads 1,2
+"""
+import argparse
+import contextlib
+import csv
+import io
+import itertools
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+
+from ffmpeg import TikTokStreamer
+from rtmp import RTMPSink
+
+DEFAULT_SOURCES = 'testpattern,noise,still'
+DEFAULT_RESOLUTIONS = '720x1280,1080x1920'
+DEFAULT_PRESETS = 'ultrafast,superfast,veryfast'
+DEFAULT_THREADS = '1,2,4'
+DEFAULT_DURATION = 20
+DEFAULT_WARMUP = 5
+FRAME_RATE = 30
+SAMPLE_INTERVAL = 0.5
+
+# lavfi graphs producing video on out0 and audio on out1
+SOURCES = {
+    'testpattern': 'testsrc2=size={size}:rate={rate}',
+    'noise': 'color=c=gray:size={size}:rate={rate},noise=alls=60:allf=t+u',
+    'still': 'smptehdbars=size={size}:rate={rate}',
+}
+AUDIO_SOURCE = 'sine=frequency=440:sample_rate=48000'
+
+CSV_FIELDS = [
+    'source', 'resolution', 'preset', 'threads', 'ok', 'fps', 'speed',
+    'cpu_percent', 'rss_mb', 'streams_per_core', 'bitrate_kbps', 'error',
+]
+
+try:
+    CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+except (AttributeError, ValueError, OSError):
+    CLOCK_TICKS = None
+
+
+def lavfi_graph(source, resolution, rate=FRAME_RATE):
+    video = SOURCES[source].format(size=resolution, rate=rate)
+    return f"{video}[out0];{AUDIO_SOURCE}[out1]"
+
+
+def _proc_sample(pid):
+    """Return (cpu_seconds, rss_bytes) for pid from /proc, or None."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # Fields after the command name, which may contain spaces
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f"/proc/{pid}/status") as f:
+            rss_kb = next((int(line.split()[1]) for line in f if line.startswith('VmRSS:')), 0)
+    except (OSError, IndexError, ValueError):
+        return None
+    if not CLOCK_TICKS:
+        return None
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS, rss_kb * 1024
+
+
+class _Sampler:
+    """Samples the encoder's progress and resource usage during one run."""
+
+    def __init__(self, streamer, warmup):
+        self.streamer = streamer
+        self.warmup = warmup
+        self.progress = []
+        self.usage = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def on_progress(self, stats):
+        self.progress.append((time.monotonic(), stats.get('frame', 0), stats))
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            process = self.streamer.ffmpeg_process
+            if process is None:
+                continue
+            sample = _proc_sample(process.pid)
+            if sample is not None:
+                self.usage.append((time.monotonic(),) + sample)
+
+    def summary(self, started):
+        """Steady-state figures, ignoring the first warmup seconds."""
+        result = {'fps': None, 'speed': None, 'cpu_percent': None, 'rss_mb': None, 'bitrate_kbps': None}
+        steady = [p for p in self.progress if p[0] - started >= self.warmup] or self.progress
+        if len(steady) >= 2 and steady[-1][0] > steady[0][0]:
+            result['fps'] = round((steady[-1][1] - steady[0][1]) / (steady[-1][0] - steady[0][0]), 1)
+            result['speed'] = round(result['fps'] / FRAME_RATE, 2)
+        if self.progress:
+            result['bitrate_kbps'] = self.progress[-1][2].get('bitrate_kbps')
+        usage = [u for u in self.usage if u[0] - started >= self.warmup] or self.usage
+        if len(usage) >= 2 and usage[-1][0] > usage[0][0]:
+            result['cpu_percent'] = round((usage[-1][1] - usage[0][1]) / (usage[-1][0] - usage[0][0]) * 100, 1)
+        if self.usage:
+            result['rss_mb'] = round(max(u[2] for u in self.usage) / (1024 * 1024), 1)
+        return result
+
+
+def run_case(sink, source, resolution, preset, threads, duration, warmup,
+             custom_ffmpeg_path=None, maxrate='3000k', bufsize='6000k', verbose=False):
+    """Push one synthetic source into sink and return its measurements."""
+    streamer = TikTokStreamer(stall_timeout=0, probe=None)
+    sampler = _Sampler(streamer, warmup)
+    streamer.progress_callback = sampler.on_progress
+
+    input_options = ['-hide_banner', '-loglevel', 'error', '-f', 'lavfi']
+    output_options = ['-t', str(duration)]
+    if threads:
+        output_options = ['-threads', str(threads)] + output_options
+    key = f"{source}-{resolution}-{preset}-{threads}"
+
+    log = io.StringIO()
+    started = time.monotonic()
+    sampler.start()
+    try:
+        with contextlib.redirect_stdout(log):
+            ok = streamer.start_stream(
+                lavfi_graph(source, resolution), sink.url(f"bench/{key}"),
+                preset=preset, maxrate=maxrate, bufsize=bufsize,
+                loop=False, custom_ffmpeg_path=custom_ffmpeg_path,
+                input_options=input_options, output_options=output_options,
+                realtime=False
+            )
+    finally:
+        sampler.stop()
+    if verbose:
+        print(log.getvalue())
+
+    result = {
+        'source': source,
+        'resolution': resolution,
+        'preset': preset,
+        'threads': threads,
+        'ok': bool(ok),
+        'error': None,
+    }
+    result.update(sampler.summary(started))
+    if not ok:
+        lines = [line for line in log.getvalue().splitlines() if line.strip()]
+        result['error'] = lines[-1] if lines else 'ffmpeg failed'
+    # One core's worth of this encode runs speed / cores_used realtime streams
+    if result['speed'] and result['cpu_percent']:
+        result['streams_per_core'] = round(result['speed'] / (result['cpu_percent'] / 100), 2)
+    else:
+        result['streams_per_core'] = None
+    return result
+
+
+def ffmpeg_version(custom_ffmpeg_path=None):
+    try:
+        output = subprocess.run(
+            [custom_ffmpeg_path or 'ffmpeg', '-version'],
+            capture_output=True, text=True, timeout=10
+        ).stdout
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return output.splitlines()[0] if output else None
+
+
+def write_csv(path, results):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def _split(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='ffmpeg.py benchmark',
+        description="Measure encode throughput per preset, resolution and thread count"
+    )
+    parser.add_argument('--sources', default=DEFAULT_SOURCES,
+                        help=f'Synthetic sources: {", ".join(SOURCES)} (default: {DEFAULT_SOURCES})')
+    parser.add_argument('--resolutions', default=DEFAULT_RESOLUTIONS,
+                        help=f'Comma-separated WxH list (default: {DEFAULT_RESOLUTIONS})')
+    parser.add_argument('--presets', default=DEFAULT_PRESETS,
+                        help=f'Comma-separated x264 presets (default: {DEFAULT_PRESETS})')
+    parser.add_argument('--threads', default=DEFAULT_THREADS,
+                        help=f'Comma-separated encoder thread counts, 0 for auto (default: {DEFAULT_THREADS})')
+    parser.add_argument('--duration', type=int, default=DEFAULT_DURATION,
+                        help=f'Seconds of video encoded per run (default: {DEFAULT_DURATION})')
+    parser.add_argument('--warmup', type=float, default=DEFAULT_WARMUP,
+                        help=f'Seconds ignored at the start of each run (default: {DEFAULT_WARMUP})')
+    parser.add_argument('--maxrate', default='3000k', help='Maximum video bitrate (default: 3000k)')
+    parser.add_argument('--bufsize', default='6000k', help='Buffer size (default: 6000k)')
+    parser.add_argument('--ffmpeg-path', help='Custom path to ffmpeg executable')
+    parser.add_argument('--output', default='benchmark.json', help='JSON results file (default: benchmark.json)')
+    parser.add_argument('--csv', help='Also write the result matrix to this CSV file')
+    parser.add_argument('--verbose', action='store_true', help='Show ffmpeg output for each run')
+    args = parser.parse_args(argv)
+
+    sources = _split(args.sources)
+    unknown = [s for s in sources if s not in SOURCES]
+    if unknown:
+        print(f"Error: unknown source(s): {', '.join(unknown)}")
+        return 2
+    try:
+        threads = [int(t) for t in _split(args.threads)]
+    except ValueError:
+        print("Error: --threads must be a comma-separated list of integers")
+        return 2
+
+    version = ffmpeg_version(args.ffmpeg_path)
+    if version is None:
+        print(f"Error: '{args.ffmpeg_path or 'ffmpeg'}' not found. Please install FFmpeg or provide custom path with --ffmpeg-path")
+        return 1
+
+    cases = list(itertools.product(sources, _split(args.resolutions), _split(args.presets), threads))
+    print(f"{version}")
+    print(f"Running {len(cases)} runs of {args.duration}s each")
+
+    results = []
+    with RTMPSink() as sink:
+        for i, (source, resolution, preset, thread_count) in enumerate(cases, 1):
+            result = run_case(
+                sink, source, resolution, preset, thread_count,
+                args.duration, args.warmup, args.ffmpeg_path,
+                args.maxrate, args.bufsize, args.verbose
+            )
+            results.append(result)
+            if result['ok']:
+                print(f"[{i}/{len(cases)}] {source} {resolution} {preset} threads={thread_count}: "
+                      f"{result['fps']} fps, {result['speed']}x, CPU {result['cpu_percent']}%, "
+                      f"RSS {result['rss_mb']} MB, {result['streams_per_core']} streams/core")
+            else:
+                print(f"[{i}/{len(cases)}] {source} {resolution} {preset} threads={thread_count}: failed: {result['error']}")
+
+    report = {
+        'created_at': time.time(),
+        'host': {
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'ffmpeg': version,
+        },
+        'settings': {
+            'duration': args.duration,
+            'warmup': args.warmup,
+            'frame_rate': FRAME_RATE,
+            'maxrate': args.maxrate,
+            'bufsize': args.bufsize,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+    if args.csv:
+        write_csv(args.csv, results)
+        print(f"Result matrix saved to {args.csv}")
+    return 0 if all(r['ok'] for r in results) else 1
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
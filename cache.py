@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Small in-process caches shared by the CLI, the web app and the daemon.
+
+In a one-shot CLI process these are simply filled and thrown away, in the
+resident daemon (see daemon.py) they keep sessions and metadata warm between
+commands.
+"""
+import os
+import threading
+import time
+
+
+class TTLCache:
+    """Thread-safe key/value cache whose entries expire after a TTL."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+
+    def get_or_load(self, key, loader, ttl):
+        """Return the cached value for key, calling loader() on a miss.
+
+        Falsy results (failed lookups) are returned but not cached.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = loader()
+            if value:
+                self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+
+class SessionPool:
+    """Pool of requests sessions keyed by cookies file.
+
+    A session is checked out exclusively by acquire() and handed back with
+    release(), so callers that mutate session headers (Stream.createStream)
+    never share a session concurrently. Sessions are keyed by the cookies
+    file path and its mtime, so editing an account file starts fresh.
+    """
+
+    def __init__(self, max_idle_per_key=2, idle_timeout=600):
+        self.max_idle_per_key = max_idle_per_key
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._idle = {}
+
+    @staticmethod
+    def _key(cookies_file):
+        path = os.path.abspath(cookies_file)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+        return path, mtime
+
+    def acquire(self, cookies_file, cookies=None):
+        """Return a (session, key) pair, creating the session if needed."""
+        import requests
+
+        key = self._key(cookies_file)
+        now = time.monotonic()
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                session, released_at = idle.pop()
+                if now - released_at < self.idle_timeout:
+                    # Callers replace headers per request type, start clean
+                    session.headers = requests.utils.default_headers()
+                    return session, key
+                session.close()
+
+        session = requests.session()
+        if cookies:
+            session.cookies.update(cookies)
+        return session, key
+
+    def release(self, session, key):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_key:
+                idle.append((session, time.monotonic()))
+                return
+        session.close()
+
+    def discard(self, cookies_file):
+        """Close every idle session belonging to cookies_file."""
+        path = os.path.abspath(cookies_file)
+        with self._lock:
+            keys = [key for key in self._idle if key[0] == path]
+            sessions = [s for key in keys for s, _ in self._idle.pop(key)]
+        for session in sessions:
+            session.close()
+
+    def close_all(self):
+        with self._lock:
+            sessions = [s for idle in self._idle.values() for s, _ in idle]
+            self._idle.clear()
+        for session in sessions:
+            session.close()
+
+
+# Process-wide instances
+metadata_cache = TTLCache()
+session_pool = SessionPool()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""Resident CLI daemon for app.py.
+
+The daemon keeps the expensive state of app.py warm between invocations
+(pooled sessions, version/domain/game-tag caches and the cookies index, see
+cache.py) and executes forwarded command lines in-process. app.py acts as a
+thin client: it forwards its argv over a Unix socket in the working directory
+and falls back to running the command itself when no daemon is listening.
+A daemon is only spawned in the background for the next call when the user
+opts in (TIKTOK_DAEMON_AUTOSPAWN=1). Spawned daemons run with --no-services:
+they serve commands and caches only, and leave the push watchdog, account
+checker, room poller and scheduler to an explicit --daemon or --web.
+
+Commands that may prompt for input are recognised by the client before
+anything is forwarded (LOCAL_ONLY_FLAGS plus the caller's own check), so a
+command never starts in the daemon and then has to be re-run in the terminal.
+Output is captured per request: sys.stdout and sys.stderr are replaced once by
+a stream that writes to the buffer of the request being served on the current
+thread, so background threads keep logging to the daemon's own output and
+requests can run concurrently.
+
+Protocol: one JSON object per line in each direction.
+    request:  {"argv": [...], "cwd": "..."} or {"command": "ping" | "stop"}
+    response: {"output": "...", "exit_code": 0} or {"fallback": true}
+"""
+import builtins
+import io
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+
+SOCKET_NAME = ".app.sock"
+CONNECT_TIMEOUT = 0.5
+DEFAULT_IDLE_TIMEOUT = 15 * 60
+
+# Commands that must run in the caller's own process
+LOCAL_ONLY_FLAGS = {"--web", "--daemon", "--stop-daemon", "--no-daemon", "--select-cookies", "--go-live"}
+
+
+def socket_path(cwd=None):
+    return os.path.join(cwd or os.getcwd(), SOCKET_NAME)
+
+
+def is_supported():
+    return hasattr(socket, "AF_UNIX")
+
+
+class NeedsTerminal(Exception):
+    """Raised inside the daemon when a command asks for interactive input."""
+
+
+# Output buffer of the request served by the current thread, if any
+_request_local = threading.local()
+
+
+class _RequestStream(io.TextIOBase):
+    """Routes writes to the current request's buffer, else to the real stream."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def _target(self):
+        return getattr(_request_local, "out", None) or self.stream
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+    def isatty(self):
+        return False
+
+
+def _install_request_streams():
+    if not isinstance(sys.stdout, _RequestStream):
+        sys.stdout = _RequestStream(sys.stdout)
+    if not isinstance(sys.stderr, _RequestStream):
+        sys.stderr = _RequestStream(sys.stderr)
+    if not getattr(builtins.input, "_daemon_guard", False):
+        original_input = builtins.input
+
+        def guarded_input(prompt=""):
+            if getattr(_request_local, "out", None) is not None:
+                raise NeedsTerminal(prompt)
+            return original_input(prompt)
+
+        guarded_input._daemon_guard = True
+        builtins.input = guarded_input
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+        except ValueError:
+            response = {"output": "Error: malformed daemon request\n", "exit_code": 2}
+        else:
+            response = self.server.execute(request)
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+class CLIDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, main_func, idle_timeout=DEFAULT_IDLE_TIMEOUT, keepalive=None):
+        self.cwd = os.path.dirname(os.path.abspath(path))
+        self.main_func = main_func
+        self.idle_timeout = idle_timeout
+        # Returns True while background work should keep the daemon alive
+        self.keepalive = keepalive
+        self.last_activity = time.monotonic()
+        self._active = 0
+        self._active_lock = threading.Lock()
+        _install_request_streams()
+        super().__init__(path, _Handler)
+
+    def execute(self, request):
+        self.last_activity = time.monotonic()
+        command = request.get("command")
+        if command == "ping":
+            return {"output": "", "exit_code": 0, "pid": os.getpid()}
+        if command == "stop":
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {"output": "Daemon stopped.\n", "exit_code": 0}
+
+        if os.path.abspath(request.get("cwd", "")) != self.cwd:
+            return {"fallback": True}
+
+        argv = request.get("argv", [])
+        out = io.StringIO()
+        exit_code = 0
+        with self._active_lock:
+            self._active += 1
+        _request_local.out = out
+        try:
+            self.main_func(argv)
+        except NeedsTerminal:
+            # The client checks for prompts up front; re-running the command
+            # in the terminal now could repeat what it already did.
+            print("Error: this command needs a terminal, run it again with --no-daemon")
+            exit_code = 1
+        except SystemExit as e:
+            if isinstance(e.code, int):
+                exit_code = e.code
+            elif e.code is not None:
+                print(e.code)
+                exit_code = 1
+        except Exception as e:
+            print(f"Error: {e}")
+            exit_code = 1
+        finally:
+            _request_local.out = None
+            with self._active_lock:
+                self._active -= 1
+            self.last_activity = time.monotonic()
+        return {"output": out.getvalue(), "exit_code": exit_code}
+
+    def _idle_watch(self):
+        while True:
+            time.sleep(min(30, self.idle_timeout))
+            if self._active or (self.keepalive and self.keepalive()):
+                self.last_activity = time.monotonic()
+                continue
+            if time.monotonic() - self.last_activity > self.idle_timeout:
+                self.shutdown()
+                return
+
+
+def _request(path, payload, timeout=None):
+    """Send one request to the daemon, returning the decoded response."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(path)
+        # Commands may take as long as their upstream calls
+        sock.settimeout(timeout)
+        sock.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as reader:
+            line = reader.readline()
+    finally:
+        sock.close()
+    if not line:
+        raise ConnectionError("daemon closed the connection")
+    return json.loads(line)
+
+
+def is_running(path=None):
+    if not is_supported():
+        return False
+    try:
+        _request(path or socket_path(), {"command": "ping"}, timeout=CONNECT_TIMEOUT)
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+def spawn(script):
+    """Start a detached daemon for the current working directory."""
+    if getattr(sys, "frozen", False):
+        command = [sys.executable, "--daemon", "--no-services"]
+    else:
+        command = [sys.executable, os.path.abspath(script), "--daemon", "--no-services"]
+    try:
+        subprocess.Popen(
+            command,
+            cwd=os.getcwd(),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+    except OSError:
+        pass
+
+
+def forward(argv, script, autospawn=False, needs_terminal=None):
+    """Run argv in the daemon.
+
+    Returns the daemon's response, or None when the command should run in
+    the calling process (no daemon, unsupported platform, interactive
+    command). needs_terminal(argv) lets the caller flag commands that would
+    prompt for input. With autospawn, a command-only daemon is spawned for
+    next time if none is listening.
+    """
+    if not is_supported() or LOCAL_ONLY_FLAGS.intersection(argv):
+        return None
+    if needs_terminal and needs_terminal(argv):
+        return None
+    path = socket_path()
+    try:
+        response = _request(path, {"argv": list(argv), "cwd": os.getcwd()})
+    except (FileNotFoundError, ConnectionRefusedError):
+        if autospawn:
+            spawn(script)
+        return None
+    except (OSError, ValueError):
+        return None
+    if response.get("fallback"):
+        return None
+    return response
+
+
+def stop(path=None):
+    try:
+        response = _request(path or socket_path(), {"command": "stop"}, timeout=5)
+        return response.get("output", "")
+    except (OSError, ValueError):
+        return "No daemon running.\n"
+
+
+def serve(main_func, idle_timeout=DEFAULT_IDLE_TIMEOUT, keepalive=None):
+    """Run the daemon in the foreground until stopped or idle."""
+    if not is_supported():
+        print("Error: the CLI daemon requires Unix domain sockets.")
+        return False
+
+    path = socket_path()
+    if os.path.exists(path):
+        if is_running(path):
+            print("Daemon already running.")
+            return False
+        os.unlink(path)
+
+    try:
+        server = CLIDaemon(path, main_func, idle_timeout, keepalive)
+    except OSError as e:
+        print(f"Error starting daemon: {e}")
+        return False
+
+    os.chmod(path, 0o600)
+    threading.Thread(target=server._idle_watch, daemon=True).start()
+    print(f"Daemon listening on {path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        from cache import session_pool
+        session_pool.close_all()
+    return True
@@ -5,13 +5,207 @@ import sys
 import time
 import signal
 import os
+import threading
 from pathlib import Path
 
+import sessionlog
+import storage
+
+# Seconds without output progress before a push counts as stalled
+STALL_TIMEOUT = 15
+# Allowance for connecting and the first packet before stall checks apply
+STARTUP_TIMEOUT = 30
+LOG_TAIL_LINES = 20
+# How long ingest probe results are reused
+PROBE_OK_TTL = 60
+PROBE_FAILED_TTL = 10
+
+# Named output profiles for 9:16 pushes. Each pins the frame size and rate,
+# a short fixed closed GOP (a joining viewer waits at most gop_seconds for a
+# keyframe) and VBV sized to one GOP at maxrate unless 'bufsize' is given.
+# Extra or changed profiles go in config.json under "output_profiles".
+PROFILES = {
+    '720p30': {'resolution': '720x1280', 'fps': 30, 'gop_seconds': 2, 'maxrate': '3000k', 'fit': 'blur'},
+    '1080p30': {'resolution': '1080x1920', 'fps': 30, 'gop_seconds': 2, 'maxrate': '6000k', 'fit': 'blur'},
+}
+# How a source of another aspect ratio is fitted into the frame
+FIT_MODES = ('crop', 'blur', 'letterbox')
+SCALE_FLAGS = 'fast_bilinear'
+# The blurred background is built at 1/BLUR_DOWNSCALE size, which is
+# invisible after the blur and much cheaper than blurring at full size
+BLUR_DOWNSCALE = 8
+BLUR_RADIUS = 4
+DEFAULT_MAXRATE = '3000k'
+DEFAULT_BUFSIZE = '6000k'
+
+TCP_STATES = {
+    '01': 'ESTABLISHED', '02': 'SYN_SENT', '03': 'SYN_RECV', '04': 'FIN_WAIT1',
+    '05': 'FIN_WAIT2', '06': 'TIME_WAIT', '07': 'CLOSE', '08': 'CLOSE_WAIT',
+    '09': 'LAST_ACK', '0A': 'LISTEN', '0B': 'CLOSING',
+}
+
+
+def load_profiles(config_file="config.json"):
+    """Return {name: profile}, config.json "output_profiles" over PROFILES."""
+    try:
+        configured = storage.read_json(config_file).get("output_profiles")
+    except (FileNotFoundError, ValueError, AttributeError):
+        configured = None
+    profiles = {name: dict(profile) for name, profile in PROFILES.items()}
+    if isinstance(configured, dict):
+        for name, profile in configured.items():
+            if isinstance(profile, dict):
+                profiles.setdefault(name, {}).update(profile)
+    return profiles
+
+
+def video_filter(resolution=None, fps=None, fit='letterbox', scale_flags=SCALE_FLAGS):
+    """One filter graph doing frame rate, 9:16 fitting and yuv420p in a single pass.
+
+    fit 'crop' fills the frame and cuts the overhang, 'blur' puts the whole
+    picture over a blurred, zoomed copy of itself, 'letterbox' pads with
+    black. The frame rate is dropped first so later filters see fewer frames.
+    """
+    steps = [f"fps={fps}"] if fps else []
+    if resolution:
+        width, height = (int(v) for v in resolution.lower().split('x'))
+        cover = f"scale={width}:{height}:force_original_aspect_ratio=increase:flags={scale_flags}"
+        contain = f"scale={width}:{height}:force_original_aspect_ratio=decrease:flags={scale_flags}"
+        if fit == 'crop':
+            steps += [cover, f"crop={width}:{height}"]
+        elif fit == 'blur':
+            small_w = max(2, width // BLUR_DOWNSCALE // 2 * 2)
+            small_h = max(2, height // BLUR_DOWNSCALE // 2 * 2)
+            head = ",".join(steps + ["split[bg][fg]"])
+            return (
+                f"{head};"
+                f"[bg]scale={small_w}:{small_h}:force_original_aspect_ratio=increase:flags={scale_flags},"
+                f"crop={small_w}:{small_h},boxblur={BLUR_RADIUS},"
+                f"scale={width}:{height}:flags={scale_flags}[bg];"
+                f"[fg]{contain}[fg];"
+                f"[bg][fg]overlay=(W-w)/2:(H-h)/2,setsar=1,format=yuv420p"
+            )
+        elif fit == 'letterbox':
+            steps += [contain, f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2"]
+        else:
+            raise ValueError(f"Unknown fit '{fit}', expected one of {', '.join(FIT_MODES)}")
+        steps.append("setsar=1")
+    steps.append("format=yuv420p")
+    return ",".join(steps)
+
+
+def gop_bufsize(maxrate, gop_seconds):
+    """VBV buffer holding one GOP at maxrate ('3000k', '6M') as an ffmpeg rate."""
+    value = str(maxrate).strip().lower()
+    scale = {'k': 1, 'm': 1000}.get(value[-1:])
+    rate_kbps = float(value[:-1]) * scale if scale else float(value) / 1000
+    return f"{int(rate_kbps * gop_seconds)}k"
+
+
+def gop_options(fps, gop_seconds):
+    """Encoder options for a fixed closed GOP of gop_seconds at fps."""
+    gop = max(1, int(round(fps * gop_seconds)))
+    return ['-g', str(gop), '-keyint_min', str(gop), '-sc_threshold', '0', '-flags', '+cgop']
+
+
+def is_pipe(input_source):
+    return input_source in ('-', 'pipe:', 'pipe:0')
+
+
+def _parse_number(value, suffix=''):
+    """Parse an ffmpeg progress value such as '2500.1kbits/s' or '1.01x'."""
+    value = (value or '').strip()
+    if suffix and value.endswith(suffix):
+        value = value[:-len(suffix)]
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _decode_address(value):
+    """Decode a /proc/net/tcp 'HEX_IP:HEX_PORT' address."""
+    host, _, port = value.partition(':')
+    raw = bytes.fromhex(host)
+    if len(raw) == 4:
+        ip = '.'.join(str(b) for b in reversed(raw))
+    else:
+        # IPv6 is stored as four little-endian 32-bit words
+        words = [raw[i:i + 4][::-1] for i in range(0, 16, 4)]
+        ip = ':'.join(b''.join(words)[i:i + 2].hex() for i in range(0, 16, 2))
+    return f"{ip}:{int(port, 16)}"
+
+
+def socket_diagnostics(pid):
+    """Return the TCP sockets of process pid with their state and queues.
+
+    Linux only (reads /proc); returns an empty list elsewhere.
+    """
+    fd_dir = f"/proc/{pid}/fd"
+    try:
+        inodes = set()
+        for fd in os.listdir(fd_dir):
+            try:
+                target = os.readlink(os.path.join(fd_dir, fd))
+            except OSError:
+                continue
+            if target.startswith('socket:['):
+                inodes.add(target[8:-1])
+    except OSError:
+        return []
+
+    sockets = []
+    for table in ('tcp', 'tcp6'):
+        try:
+            with open(f"/proc/{pid}/net/{table}") as f:
+                lines = f.readlines()[1:]
+        except OSError:
+            continue
+        for line in lines:
+            fields = line.split()
+            if len(fields) < 10 or fields[9] not in inodes:
+                continue
+            tx_queue, rx_queue = fields[4].split(':')
+            sockets.append({
+                'local': _decode_address(fields[1]),
+                'remote': _decode_address(fields[2]),
+                'state': TCP_STATES.get(fields[3], fields[3]),
+                'send_queue': int(tx_queue, 16),
+                'recv_queue': int(rx_queue, 16),
+            })
+    return sockets
+
 
 class TikTokStreamer:
-    def __init__(self):
+    def __init__(self, progress_callback=None, stall_callback=None,
+                 stall_timeout=STALL_TIMEOUT, startup_timeout=STARTUP_TIMEOUT,
+                 probe='publish', session_log=None, input_feed='auto', input_cache=None,
+                 readahead_bytes=None):
         self.ffmpeg_process = None
         self.running = False
+        # Called with a stats dict whenever ffmpeg reports progress
+        self.progress_callback = progress_callback
+        # Called with a stall event dict when a push stops making progress
+        self.stall_callback = stall_callback
+        # 0 disables stall detection
+        self.stall_timeout = stall_timeout
+        self.startup_timeout = startup_timeout
+        # Pre-flight ingest check: 'publish', 'connect' or None to skip
+        self.probe = probe
+        self.ingest_probe = None
+        # How file inputs reach ffmpeg: see inputfeed.MODES; None reads directly
+        self.input_feed = input_feed
+        self.input_cache = input_cache
+        self.readahead_bytes = readahead_bytes
+        self.feeder = None
+        self.stats = {}
+        self.started_at = None
+        self.starts = 0
+        self.stall_events = []
+        # ffmpeg's log; memory-only unless the caller passes a file-backed one
+        self.session_log = session_log or sessionlog.SessionLog(f"pid-{os.getpid()}", directory=None)
+        self._progress_mark = None
+        self._last_progress = None
 
     def signal_handler(self, signum, frame):
         """Handle Ctrl+C and other signals to gracefully stop streaming"""
@@ -19,65 +213,157 @@ class TikTokStreamer:
         self.stop_stream()
         sys.exit(0)
 
-    def start_stream(self, input_source, rtmp_url, 
-                    video_codec='libx264', preset='veryfast', 
-                    maxrate='3000k', bufsize='6000k',
-                    audio_codec='aac', audio_bitrate='128k',
-                    loop=True, custom_ffmpeg_path=None):
+    def build_command(self, input_source, output,
+                      video_codec='libx264', preset='veryfast',
+                      maxrate=None, bufsize=None,
+                      audio_codec='aac', audio_bitrate='128k',
+                      loop=True, custom_ffmpeg_path=None, progress=True,
+                      input_options=None, output_options=None, realtime=True,
+                      resolution=None, profile=None, fit=None):
         """
-        Start streaming to TikTok using FFmpeg
+        Build the ffmpeg command line pushing input_source to output as FLV
         
-        Args:
-            input_source: Path to video file or stream source
-            rtmp_url: RTMP URL from TikTok stream key generator
-            video_codec: Video codec (default: libx264)
-            preset: FFmpeg preset (default: veryfast)
-            maxrate: Maximum video bitrate (default: 3000k)
-            bufsize: Buffer size (default: 6000k)
-            audio_codec: Audio codec (default: aac)
-            audio_bitrate: Audio bitrate (default: 128k)
-            loop: Loop video input (default: True)
-            custom_ffmpeg_path: Custom path to ffmpeg executable
-        """
+        Reading from a pipe ('pipe:0') disables native-rate reading and
+        looping, and 'copy' codecs skip their encoder options, so the same
+        builder serves both encoding pushes and copy relays.
+        input_options go before '-i' (e.g. ['-f', 'lavfi'] for generated
+        sources), output_options before the output; realtime=False drops
+        '-re' so ffmpeg encodes as fast as it can. resolution ('WxH') fits
+        the video into that frame size, letterboxing as needed.
         
-        # Check if input source exists
-        if not Path(input_source).exists():
-            print(f"Error: Input source '{input_source}' not found")
-            return False
+        profile names an entry of load_profiles(): its frame size, frame
+        rate, fit and VBV apply unless given explicitly, and it pins a fixed
+        closed GOP. fit is one of FIT_MODES. Scaling, fitting and the
+        yuv420p conversion run as one filter graph (see video_filter).
+        """
+        settings = {}
+        if profile:
+            settings = load_profiles().get(profile)
+            if settings is None:
+                raise ValueError(f"Unknown output profile '{profile}'")
+        maxrate = maxrate or settings.get('maxrate', DEFAULT_MAXRATE)
+        fps = settings.get('fps')
+        gop_seconds = settings.get('gop_seconds', 2)
+        if not bufsize:
+            bufsize = settings.get('bufsize') or (gop_bufsize(maxrate, gop_seconds) if fps else DEFAULT_BUFSIZE)
+        resolution = resolution or settings.get('resolution')
+        fit = fit or settings.get('fit', 'letterbox')
         
         # Determine ffmpeg executable
         ffmpeg_cmd = custom_ffmpeg_path if custom_ffmpeg_path else 'ffmpeg'
+        from_pipe = is_pipe(input_source)
         
         # Build ffmpeg command
         command = [ffmpeg_cmd]
         
         # Add input options
-        command.extend(['-re'])  # Read input at native frame rate
+        if realtime and not from_pipe:
+            command.extend(['-re'])  # Read input at native frame rate
         
-        if loop:
+        if loop and not from_pipe:
             command.extend(['-stream_loop', '-1'])  # Loop input video
         
+        if from_pipe:
+            command.extend(['-f', 'flv'])
+        if input_options:
+            command.extend(input_options)
         command.extend(['-i', input_source])  # Input file
         
         # Add video options
         command.extend(['-c:v', video_codec])
-        command.extend(['-preset', preset])
-        command.extend(['-maxrate', maxrate])
-        command.extend(['-bufsize', bufsize])
-        command.extend(['-vf', 'format=yuv420p'])
-        command.extend(['-pix_fmt', 'yuv420p'])
+        if video_codec != 'copy':
+            command.extend(['-preset', preset])
+            command.extend(['-maxrate', maxrate])
+            command.extend(['-bufsize', bufsize])
+            command.extend(['-vf', video_filter(resolution, fps, fit)])
+            if fps:
+                command.extend(gop_options(fps, gop_seconds))
         
         # Add audio options
         command.extend(['-c:a', audio_codec])
-        command.extend(['-b:a', audio_bitrate])
+        if audio_codec != 'copy':
+            command.extend(['-b:a', audio_bitrate])
+        
+        # Machine-readable progress on stdout (human stats stay on stderr)
+        if progress:
+            command.extend(['-progress', 'pipe:1'])
+        
+        if output_options:
+            command.extend(output_options)
         
         # Add output format and URL
         command.extend(['-f', 'flv'])
-        command.append(rtmp_url)
+        command.append(output)
+        return command
+
+    def start_stream(self, input_source, rtmp_url, 
+                    video_codec='libx264', preset='veryfast', 
+                    maxrate=None, bufsize=None,
+                    audio_codec='aac', audio_bitrate='128k',
+                    loop=True, custom_ffmpeg_path=None, stdin=None,
+                    input_options=None, output_options=None, realtime=True,
+                    resolution=None, profile=None, fit=None):
+        """
+        Start streaming to TikTok using FFmpeg
+        
+        Args:
+            input_source: Path to video file or stream source ('pipe:0' to read FLV from stdin)
+            rtmp_url: RTMP URL from TikTok stream key generator
+            video_codec: Video codec (default: libx264)
+            preset: FFmpeg preset (default: veryfast)
+            maxrate: Maximum video bitrate (default: the profile's, else 3000k)
+            bufsize: Buffer size (default: the profile's, else 6000k)
+            audio_codec: Audio codec (default: aac)
+            audio_bitrate: Audio bitrate (default: 128k)
+            loop: Loop video input (default: True)
+            custom_ffmpeg_path: Custom path to ffmpeg executable
+            stdin: File descriptor or file feeding a 'pipe:0' input
+            input_options, output_options, realtime, resolution, profile, fit: see build_command
+        """
+        
+        # Check if input source exists (generated sources have input options)
+        if not is_pipe(input_source) and not input_options and not Path(input_source).exists():
+            print(f"Error: Input source '{input_source}' not found")
+            return False
+        
+        # Fail fast on a bad or expired push URL, before encoding starts
+        if self.probe and rtmp_url.startswith(('rtmp://', 'rtmps://')):
+            probe = self.probe_ingest(rtmp_url, publish=self.probe == 'publish')
+            if not probe['ok']:
+                print(f"Error: ingest check failed at {probe['stage']}: {probe['error']}")
+                return False
+            print(f"Ingest {probe['host']} reachable, RTT {probe['rtt_ms']} ms")
+        
+        # Stage a file on slow storage locally, or read ahead of ffmpeg
+        read_source = input_source
+        if self.input_feed and not input_options and not is_pipe(input_source):
+            import inputfeed
+            self.feeder = inputfeed.InputFeeder(
+                input_source, self.input_feed, cache=self.input_cache,
+                window=self.readahead_bytes or inputfeed.READAHEAD_BYTES, loop=loop
+            )
+            try:
+                read_source = self.feeder.prepare()
+            except OSError as e:
+                print(f"Warning: input staging failed ({e}), reading {input_source} directly")
+                self.feeder = None
+        
+        ffmpeg_cmd = custom_ffmpeg_path if custom_ffmpeg_path else 'ffmpeg'
+        command = self.build_command(
+            read_source, rtmp_url,
+            video_codec=video_codec, preset=preset,
+            maxrate=maxrate, bufsize=bufsize,
+            audio_codec=audio_codec, audio_bitrate=audio_bitrate,
+            loop=loop, custom_ffmpeg_path=custom_ffmpeg_path,
+            input_options=input_options, output_options=output_options,
+            realtime=realtime, resolution=resolution, profile=profile, fit=fit
+        )
         
         print(f"Starting stream with command:")
         print(" ".join(command))
         print(f"Input: {input_source}")
+        if read_source != input_source:
+            print(f"Reading: {read_source} ({self.feeder.mode})")
         print(f"Output: {rtmp_url}")
         print("Press Ctrl+C to stop streaming...")
         
@@ -85,39 +371,54 @@ class TikTokStreamer:
             # Start ffmpeg process
             self.ffmpeg_process = subprocess.Popen(
                 command,
+                stdin=stdin,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 universal_newlines=True
             )
             
+            process = self.ffmpeg_process
+            if self.feeder:
+                self.feeder.attach(process.pid)
             self.running = True
+            self.started_at = time.time()
+            self.starts += 1
+            self.stats = {}
+            self._progress_mark = None
+            self._last_progress = time.monotonic()
+            progress_thread = threading.Thread(
+                target=self._read_progress,
+                args=(process.stdout,),
+                daemon=True
+            )
+            progress_thread.start()
+            # Read ffmpeg's log on its own thread so a hung ffmpeg that
+            # prints nothing can't block the monitor loop
+            log_thread = threading.Thread(
+                target=self._read_log,
+                args=(process.stderr,),
+                daemon=True
+            )
+            log_thread.start()
             
             # Monitor the process
-            while self.running and self.ffmpeg_process.poll() is None:
-                # Read and display ffmpeg output in real-time
-                if self.ffmpeg_process.stderr:
-                    line = self.ffmpeg_process.stderr.readline()
-                    if line:
-                        print(line.strip())
-                
-                time.sleep(0.1)
+            while self.running and process.poll() is None:
+                if self._check_stall(process):
+                    return False
+                time.sleep(0.5)
             
             # Check if process completed normally
-            if self.ffmpeg_process.poll() is not None:
-                return_code = self.ffmpeg_process.returncode
+            if process.poll() is not None:
+                return_code = process.returncode
+                # Show any remaining output
+                log_thread.join(timeout=2)
                 if return_code == 0:
                     print("Stream completed successfully")
                 else:
                     print(f"Stream ended with return code: {return_code}")
                 
-                # Show any remaining output
-                if self.ffmpeg_process.stderr:
-                    remaining_output = self.ffmpeg_process.stderr.read()
-                    if remaining_output:
-                        print("Remaining output:")
-                        print(remaining_output.strip())
-                
                 return return_code == 0
+            return False
             
         except FileNotFoundError:
             print(f"Error: '{ffmpeg_cmd}' not found. Please install FFmpeg or provide custom path with --ffmpeg-path")
@@ -129,6 +430,113 @@ class TikTokStreamer:
         except Exception as e:
             print(f"Error starting stream: {e}")
             return False
+        finally:
+            if self.feeder:
+                self.feeder.close()
+
+    def probe_ingest(self, rtmp_url, publish=True):
+        """Check rtmp_url's ingest with rtmp.probe_ingest, reusing recent results."""
+        from cache import metadata_cache
+        import rtmp
+
+        key = ('ingest_probe', rtmp_url, publish)
+        result = metadata_cache.get(key)
+        if result is None:
+            info = self.get_stream_info(rtmp_url)
+            tc_url = info.get('server_url', rtmp_url).rstrip('/')
+            result = rtmp.probe_ingest(tc_url, info.get('stream_key', ''), publish=publish)
+            metadata_cache.set(key, result, PROBE_OK_TTL if result['ok'] else PROBE_FAILED_TTL)
+        self.ingest_probe = result
+        return result
+
+    def _read_log(self, stream):
+        """Record ffmpeg's log in the session log, echoing all but per-frame status."""
+        for line in stream:
+            line = line.rstrip()
+            if line and self.session_log.write(line) >= sessionlog.INFO:
+                print(line)
+
+    def _check_stall(self, process):
+        """Stop the push if it made no progress within the stall window.
+
+        Progress means out_time or bytes_written advancing; a blocked RTMP
+        socket freezes both while ffmpeg keeps running. Returns True when
+        the push was stopped.
+        """
+        if not self.stall_timeout:
+            return False
+        mark = (self.stats.get('out_time'), self.stats.get('bytes_written'))
+        now = time.monotonic()
+        if mark != self._progress_mark:
+            self._progress_mark = mark
+            self._last_progress = now
+            return False
+        window = self.stall_timeout if self.stats else max(self.stall_timeout, self.startup_timeout)
+        stalled_for = now - self._last_progress
+        if stalled_for < window:
+            return False
+
+        event = {
+            'type': 'stall',
+            'at': time.time(),
+            'stalled_for': round(stalled_for, 1),
+            'pid': process.pid,
+            'out_time': self.stats.get('out_time'),
+            'bytes_written': self.stats.get('bytes_written', 0),
+            'log_tail': self.session_log.tail(LOG_TAIL_LINES),
+            'last_status': self.session_log.last_status,
+            'sockets': socket_diagnostics(process.pid),
+            'input': self.feeder.metrics() if self.feeder else None,
+        }
+        self.stall_events.append(event)
+        print(f"Stream stalled: no progress for {event['stalled_for']}s, stopping ffmpeg")
+        for sock in event['sockets']:
+            print(f"  socket {sock['local']} -> {sock['remote']} {sock['state']} "
+                  f"send-q={sock['send_queue']} recv-q={sock['recv_queue']}")
+        self.stats = dict(self.stats, state='stalled')
+        for callback, payload in ((self.progress_callback, self.stats), (self.stall_callback, event)):
+            if callback:
+                try:
+                    callback(payload)
+                except Exception as e:
+                    print(f"Stall callback failed: {e}")
+        self.stop_stream()
+        return True
+
+    def _read_progress(self, stream):
+        """Parse ffmpeg's -progress key=value blocks from stream."""
+        block = {}
+        for line in stream:
+            key, _, value = line.strip().partition('=')
+            if not key:
+                continue
+            block[key] = value
+            if key == 'progress':
+                self._publish_progress(block)
+                block = {}
+
+    def _publish_progress(self, block):
+        out_time_us = _parse_number(block.get('out_time_us'))
+        self.stats = {
+            'state': 'ended' if block.get('progress') == 'end' else 'pushing',
+            'frame': int(_parse_number(block.get('frame')) or 0),
+            'fps': _parse_number(block.get('fps')),
+            'bitrate_kbps': _parse_number(block.get('bitrate'), 'kbits/s'),
+            'speed': _parse_number(block.get('speed'), 'x'),
+            'dropped_frames': int(_parse_number(block.get('drop_frames')) or 0),
+            'duplicated_frames': int(_parse_number(block.get('dup_frames')) or 0),
+            'bytes_written': int(_parse_number(block.get('total_size')) or 0),
+            'out_time': out_time_us / 1e6 if out_time_us is not None else None,
+            'uptime': time.time() - self.started_at if self.started_at else 0,
+            'reconnects': max(0, self.starts - 1),
+            'ingest_rtt_ms': self.ingest_probe.get('rtt_ms') if self.ingest_probe else None,
+            'input': self.feeder.metrics() if self.feeder else None,
+        }
+        if self.progress_callback:
+            try:
+                self.progress_callback(self.stats)
+            except Exception as e:
+                print(f"Progress callback failed: {e}")
 
     def stop_stream(self):
         """Stop the current stream"""
@@ -176,10 +584,9 @@ class TikTokStreamer:
 def load_rtmp_url_from_file(file_path='rtmp_url.txt'):
     """Load RTMP URL from a text file"""
     try:
-        with open(file_path, 'r') as f:
-            content = f.read().strip()
-            if content:
-                return content
+        content = storage.read_text(file_path).strip()
+        if content:
+            return content
     except FileNotFoundError:
         print(f"File '{file_path}' not found")
     except Exception as e:
@@ -190,14 +597,17 @@ def load_rtmp_url_from_file(file_path='rtmp_url.txt'):
 def save_rtmp_url_to_file(rtmp_url, file_path='rtmp_url.txt'):
     """Save RTMP URL to a text file"""
     try:
-        with open(file_path, 'w') as f:
-            f.write(rtmp_url.strip())
+        storage.write_text(file_path, rtmp_url.strip())
         print(f"RTMP URL saved to {file_path}")
     except Exception as e:
         print(f"Error saving RTMP URL to file: {e}")
 
 
 def main():
+    if sys.argv[1:2] == ['benchmark']:
+        import benchmark
+        sys.exit(benchmark.main(sys.argv[2:]))
+    
     parser = argparse.ArgumentParser(
         description="TikTok FFmpeg Streamer - Stream video to TikTok Live",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -215,11 +625,20 @@ Examples:
   # Custom settings
   python3 ffmpeg.py video.mp4 "rtmp://server/stream_key" --preset ultrafast --maxrate 2500k
   
+  # Landscape source reframed to 720x1280@30 with a blurred background
+  python3 ffmpeg.py video.mp4 "rtmp://server/stream_key" --profile 720p30 --fit blur
+  
   # No loop
   python3 ffmpeg.py video.mp4 "rtmp://server/stream_key" --no-loop
   
+  # Loop a file from a network mount out of memory
+  python3 ffmpeg.py /mnt/media/show.mp4 "rtmp://server/stream_key" --input-feed stage --cache-dir /dev/shm/tiktok-input
+  
   # Custom ffmpeg path
   python3 ffmpeg.py video.mp4 "rtmp://server/stream_key" --ffmpeg-path /usr/local/bin/ffmpeg
+  
+  # Encode-throughput benchmark against a local RTMP sink
+  python3 ffmpeg.py benchmark --presets ultrafast,veryfast --resolutions 720x1280
         """
     )
     
@@ -231,8 +650,14 @@ Examples:
     parser.add_argument('--preset', default='veryfast', 
                        choices=['ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow', 'slower', 'veryslow'],
                        help='FFmpeg preset (default: veryfast)')
-    parser.add_argument('--maxrate', default='3000k', help='Maximum video bitrate (default: 3000k)')
-    parser.add_argument('--bufsize', default='6000k', help='Buffer size (default: 6000k)')
+    parser.add_argument('--maxrate', help="Maximum video bitrate (default: the profile's, else 3000k)")
+    parser.add_argument('--bufsize', help="Buffer size (default: the profile's, else 6000k)")
+    
+    parser.add_argument('--resolution', help='Scale the video to WxH, e.g. 720x1280 (default: keep the input size)')
+    parser.add_argument('--profile', choices=sorted(load_profiles()),
+                       help='Output profile: 9:16 frame size, frame rate, fixed closed GOP and VBV')
+    parser.add_argument('--fit', choices=FIT_MODES,
+                       help="How another aspect ratio fills the frame (default: the profile's, else letterbox)")
     
     # Audio options
     parser.add_argument('--audio-codec', default='aac', help='Audio codec (default: aac)')
@@ -251,10 +676,68 @@ Examples:
     parser.add_argument('--info', action='store_true', help='Show stream information and exit')
     parser.add_argument('--stop', action='store_true', help='Stop any running stream and exit')
     
+    parser.add_argument('--auto-bitrate', action='store_true',
+                       help='Measure the uplink to the ingest and pick resolution/bitrate from the ladder')
+    parser.add_argument('--uplink-refresh', action='store_true',
+                       help='With --auto-bitrate, measure again instead of using a cached result')
+    parser.add_argument('--stall-timeout', type=float, default=STALL_TIMEOUT,
+                       help=f'Stop a push that makes no progress for this many seconds, 0 disables (default: {STALL_TIMEOUT})')
+    
+    parser.add_argument('--input-feed', default='auto', choices=['auto', 'stage', 'readahead', 'off'],
+                       help='Stage the input to a local cache or read ahead of ffmpeg; auto does so for '
+                            'files on network filesystems (default: auto)')
+    parser.add_argument('--cache-dir', help='Input cache directory, e.g. under /dev/shm to stage into memory (default: .input_cache)')
+    parser.add_argument('--cache-max-mb', type=int, help='Evict least recently used staged inputs beyond this size (default: 4096)')
+    parser.add_argument('--readahead-mb', type=int, help='Bytes kept read ahead of ffmpeg when not staging (default: 64)')
+    
+    parser.add_argument('--no-probe', action='store_true', help='Skip the pre-flight ingest check')
+    parser.add_argument('--no-probe-publish', action='store_true',
+                       help='Only check connect in the pre-flight ingest check, not publish')
+    
+    # Log options
+    parser.add_argument('--log-dir', default=sessionlog.LOG_DIR, help=f'Directory for session logs (default: {sessionlog.LOG_DIR})')
+    parser.add_argument('--log-level', default='info', choices=list(sessionlog.LEVELS),
+                       help='Lowest ffmpeg log level kept; debug includes per-frame status (default: info)')
+    parser.add_argument('--log-max-bytes', type=int, default=sessionlog.MAX_BYTES,
+                       help=f'Rotate the session log at this size (default: {sessionlog.MAX_BYTES})')
+    parser.add_argument('--no-log-file', action='store_true', help='Keep the session log in memory only')
+    
+    # Telemetry options
+    parser.add_argument('--stream-id', help='Stream record id, links telemetry to the web dashboard')
+    parser.add_argument('--telemetry-dir', default='telemetry', help='Directory for live telemetry files (default: telemetry)')
+    parser.add_argument('--no-telemetry', action='store_true', help='Do not publish live telemetry')
+    
     args = parser.parse_args()
     
     # Create streamer instance
-    streamer = TikTokStreamer()
+    session_id = args.stream_id or f"pid-{os.getpid()}"
+    telemetry_writer = None
+    if not args.no_telemetry:
+        from telemetry import FileTelemetryWriter
+        telemetry_writer = FileTelemetryWriter(session_id, args.telemetry_dir, stream_id=args.stream_id)
+    session_log = sessionlog.open_session(
+        session_id,
+        None if args.no_log_file else args.log_dir,
+        level=args.log_level,
+        max_bytes=args.log_max_bytes
+    )
+    probe = None if args.no_probe else ('connect' if args.no_probe_publish else 'publish')
+    input_cache = None
+    if args.cache_dir or args.cache_max_mb:
+        import inputfeed
+        input_cache = inputfeed.InputCache(
+            args.cache_dir or inputfeed.CACHE_DIR,
+            args.cache_max_mb * 1024 ** 2 if args.cache_max_mb else inputfeed.CACHE_MAX_BYTES
+        )
+    streamer = TikTokStreamer(
+        progress_callback=telemetry_writer,
+        stall_timeout=args.stall_timeout,
+        probe=probe,
+        session_log=session_log,
+        input_feed=None if args.input_feed == 'off' else args.input_feed,
+        input_cache=input_cache,
+        readahead_bytes=args.readahead_mb * 1024 ** 2 if args.readahead_mb else None
+    )
     
     # Set up signal handlers
     signal.signal(signal.SIGINT, streamer.signal_handler)
@@ -299,19 +782,44 @@ Examples:
         print(f"Error: Input source '{args.input_source}' not found")
         return
     
+    # Pick the bitrate ladder rung the uplink can sustain
+    maxrate, bufsize = args.maxrate, args.bufsize
+    audio_bitrate, resolution = args.audio_bitrate, args.resolution
+    if args.auto_bitrate:
+        import uplink
+        try:
+            rung, measurement = uplink.choose_profile(rtmp_url, refresh=args.uplink_refresh)
+        except Exception as e:
+            print(f"Uplink probe failed ({e}), keeping the configured bitrate")
+        else:
+            print(f"Uplink {measurement['throughput_kbps']:.0f} kbit/s, RTT {measurement['rtt_ms']} ms: "
+                  f"using {rung['name']} ({rung['resolution']}, {rung['maxrate']})")
+            maxrate, bufsize = rung['maxrate'], rung['bufsize']
+            audio_bitrate = rung.get('audio_bitrate', audio_bitrate)
+            resolution = rung.get('resolution', resolution)
+    
     # Start streaming
-    success = streamer.start_stream(
-        input_source=args.input_source,
-        rtmp_url=rtmp_url,
-        video_codec=args.video_codec,
-        preset=args.preset,
-        maxrate=args.maxrate,
-        bufsize=args.bufsize,
-        audio_codec=args.audio_codec,
-        audio_bitrate=args.audio_bitrate,
-        loop=not args.no_loop,
-        custom_ffmpeg_path=args.ffmpeg_path
-    )
+    success = False
+    try:
+        success = streamer.start_stream(
+            input_source=args.input_source,
+            rtmp_url=rtmp_url,
+            video_codec=args.video_codec,
+            preset=args.preset,
+            maxrate=maxrate,
+            bufsize=bufsize,
+            audio_codec=args.audio_codec,
+            audio_bitrate=audio_bitrate,
+            loop=not args.no_loop,
+            custom_ffmpeg_path=args.ffmpeg_path,
+            resolution=resolution,
+            profile=args.profile,
+            fit=args.fit
+        )
+    finally:
+        if telemetry_writer:
+            telemetry_writer.close(exit_code=0 if success else 1)
+        sessionlog.close_session(session_id)
     
     if success:
         print("Streaming completed successfully")
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""One-click go-live: create the room and start the ffmpeg push in-process.
+
+The encoder is warmed up while the room is being created: the input is
+probed, ffmpeg is started encoding to FLV on a pipe, and the most recent GOP
+(plus the codec headers) is kept ready in memory. As soon as room creation
+returns the push URL, a copy relay (ffmpeg -c copy) is started toward it and
+fed the buffered GOP followed by the live encoder output, so click-to-live
+time is roughly the room-create latency.
+"""
+import json
+import os
+import struct
+import subprocess
+import threading
+import time
+
+import inputfeed
+import sessionlog
+from ffmpeg import TikTokStreamer
+
+PRIME_TIMEOUT = 20
+PROBE_TIMEOUT = 10
+
+FLV_TAG_AUDIO = 8
+FLV_TAG_VIDEO = 9
+FLV_TAG_SCRIPT = 18
+
+
+class GoLiveError(Exception):
+    pass
+
+
+def ffprobe_path(custom_ffmpeg_path=None):
+    if not custom_ffmpeg_path:
+        return 'ffprobe'
+    directory, name = os.path.split(custom_ffmpeg_path)
+    return os.path.join(directory, name.replace('ffmpeg', 'ffprobe'))
+
+
+def probe_input(input_source, custom_ffmpeg_path=None, timeout=PROBE_TIMEOUT):
+    """Return ffprobe's stream/format summary for input_source."""
+    command = [
+        ffprobe_path(custom_ffmpeg_path), '-v', 'error',
+        '-show_entries', 'format=duration,format_name:stream=codec_type,codec_name,width,height,r_frame_rate',
+        '-of', 'json', input_source
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    except FileNotFoundError:
+        raise GoLiveError(f"'{command[0]}' not found")
+    except subprocess.TimeoutExpired:
+        raise GoLiveError(f"Probing '{input_source}' timed out")
+    if result.returncode != 0:
+        raise GoLiveError(f"Cannot read input '{input_source}': {result.stderr.strip()}")
+    info = json.loads(result.stdout or '{}')
+    if not any(s.get('codec_type') == 'video' for s in info.get('streams', [])):
+        raise GoLiveError(f"Input '{input_source}' has no video stream")
+    return info
+
+
+def _read_exact(stream, size):
+    data = b''
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+class FLVGopBuffer:
+    """Keeps the FLV header, codec configuration tags and the latest GOP.
+
+    Everything before the newest video keyframe is dropped, so when the
+    relay starts it receives a decodable stream that is at most one GOP
+    behind the encoder.
+    """
+
+    def __init__(self):
+        self.header = b''
+        self.init_tags = []
+        self.gop = []
+        self.keyframe_seen = threading.Event()
+
+    def add(self, tag_type, tag):
+        data = tag[11:13]
+        if tag_type == FLV_TAG_SCRIPT:
+            self.init_tags.append(tag)
+        elif tag_type == FLV_TAG_AUDIO:
+            # AAC sequence header
+            if len(data) > 1 and data[0] >> 4 == 10 and data[1] == 0:
+                self.init_tags.append(tag)
+            elif self.gop:
+                self.gop.append(tag)
+        elif tag_type == FLV_TAG_VIDEO:
+            # AVC sequence header
+            if len(data) > 1 and data[0] & 0x0F == 7 and data[1] == 0:
+                self.init_tags.append(tag)
+            elif data and data[0] >> 4 == 1:
+                self.gop = [tag]
+                self.keyframe_seen.set()
+            elif self.gop:
+                self.gop.append(tag)
+
+    def drain(self):
+        chunks = [self.header] + self.init_tags + self.gop
+        self.gop = []
+        return b''.join(chunks)
+
+
+class GoLivePipeline:
+    """Create a room and push input_source to it with a pre-warmed encoder.
+
+    create_room is called with no arguments and must return
+    (stream_data, replayed) like app.create_stream_once(); end_room(stream_data)
+    is called if the push cannot start after the room was created.
+    progress_callback(stream_id, stats) receives the relay's telemetry.
+    """
+
+    def __init__(self, input_source, create_room, end_room=None,
+                 encoder_options=None, custom_ffmpeg_path=None,
+                 progress_callback=None):
+        self.input_source = input_source
+        self.create_room = create_room
+        self.end_room = end_room
+        self.encoder_options = dict(encoder_options or {})
+        self.custom_ffmpeg_path = custom_ffmpeg_path
+        # What the encoder reads: input_source or its staged copy
+        self.read_source = input_source
+        self.feeder = None
+        self.progress_callback = progress_callback
+
+        self.stream_data = None
+        self.replayed = False
+        self.probe = None
+        self.metrics = {}
+        self.encoder = None
+        self._pump_thread = None
+        self.relay = TikTokStreamer(progress_callback=self._on_relay_progress)
+        self._gop = FLVGopBuffer()
+        self._relay_lock = threading.Lock()
+        self._relay_out = None
+        self._warm_error = None
+        self._started = None
+        self._relay_thread = None
+        self._stopping = False
+        # Epoch time of the relay's last progress report
+        self.last_progress_at = None
+
+    # Warm-up
+
+    def warm(self):
+        """Probe the input and start the encoder up to its first keyframe.
+
+        start() does this while the room is created; calling it beforehand
+        (a scheduled go-live) leaves start() only the room and the relay.
+        An input probed already (self.probe set) isn't probed again. A file
+        on slow storage is staged locally first (see inputfeed.py).
+        """
+        t = time.monotonic()
+        if self.feeder is None:
+            self.stage_input()
+        if self.probe is None:
+            probe_started = time.monotonic()
+            self.probe = probe_input(self.read_source, self.custom_ffmpeg_path)
+            self.metrics['probe_ms'] = round((time.monotonic() - probe_started) * 1000, 1)
+
+        command = TikTokStreamer().build_command(
+            self.read_source, 'pipe:1',
+            custom_ffmpeg_path=self.custom_ffmpeg_path,
+            progress=False,
+            **self.encoder_options
+        )
+        try:
+            self.encoder = subprocess.Popen(
+                command,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL
+            )
+        except FileNotFoundError:
+            raise GoLiveError(f"'{command[0]}' not found")
+        if self._stopping:
+            self._stop_encoder()
+            raise GoLiveError("Go-live cancelled")
+        self.feeder.attach(self.encoder.pid)
+        self._pump_thread = threading.Thread(target=self._pump, args=(self.encoder, self._gop), daemon=True)
+        self._pump_thread.start()
+
+        if not self._gop.keyframe_seen.wait(PRIME_TIMEOUT):
+            self._stop_encoder()
+            raise GoLiveError("Encoder produced no keyframe while warming up")
+        self.metrics['encoder_primed_ms'] = self._elapsed_ms() if self._started else round((time.monotonic() - t) * 1000, 1)
+
+    def stage_input(self):
+        """Stage the input locally or set up read-ahead (see inputfeed.py)."""
+        self.feeder = inputfeed.InputFeeder(self.input_source)
+        try:
+            self.read_source = self.feeder.prepare()
+        except OSError as e:
+            print(f"Warning: input staging failed ({e}), reading {self.input_source} directly")
+        if self.feeder.stage_ms is not None:
+            self.metrics['stage_ms'] = self.feeder.stage_ms
+
+    def primed(self):
+        """True if warm() already has the encoder running with a keyframe buffered."""
+        return (self.encoder is not None and self.encoder.poll() is None
+                and self._gop.keyframe_seen.is_set())
+
+    def _stop_encoder(self):
+        """Terminate the encoder and wait for its pump, so a new one can be warmed."""
+        encoder, pump = self.encoder, self._pump_thread
+        self.encoder = self._pump_thread = None
+        if encoder is not None and encoder.poll() is None:
+            encoder.terminate()
+            try:
+                encoder.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                encoder.kill()
+                encoder.wait()
+        # The pump ends at the encoder's EOF
+        if pump is not None and pump is not threading.current_thread():
+            pump.join(timeout=5)
+        self._gop = FLVGopBuffer()
+
+    def _warm_safe(self):
+        try:
+            self.warm()
+        except Exception as e:
+            self._warm_error = e
+
+    def _pump(self, encoder, gop):
+        """Move FLV tags from encoder into its GOP buffer or the relay."""
+        stdout = encoder.stdout
+        header = _read_exact(stdout, 13)
+        if header is None:
+            return
+        gop.header = header
+        while True:
+            tag_header = _read_exact(stdout, 11)
+            if tag_header is None:
+                break
+            tag_type = tag_header[0] & 0x1F
+            size = struct.unpack('>I', b'\0' + tag_header[1:4])[0]
+            body = _read_exact(stdout, size + 4)
+            if body is None:
+                break
+            tag = tag_header + body
+            with self._relay_lock:
+                if self._relay_out is None:
+                    gop.add(tag_type, tag)
+                    continue
+                out = self._relay_out
+            try:
+                out.write(tag)
+                out.flush()
+            except (BrokenPipeError, OSError, ValueError):
+                break
+        self._close_relay_input()
+
+    def _attach_relay(self, out):
+        with self._relay_lock:
+            buffered = self._gop.drain()
+            try:
+                out.write(buffered)
+                out.flush()
+            except (BrokenPipeError, OSError):
+                pass
+            self._relay_out = out
+        self.metrics['first_write_ms'] = self._elapsed_ms()
+
+    def _close_relay_input(self):
+        with self._relay_lock:
+            out, self._relay_out = self._relay_out, None
+        if out is not None:
+            try:
+                out.close()
+            except OSError:
+                pass
+
+    # Push
+
+    def _on_relay_progress(self, stats):
+        self.last_progress_at = time.time()
+        if 'time_to_first_packet_ms' not in self.metrics and stats.get('bytes_written'):
+            self.metrics['time_to_first_packet_ms'] = self._elapsed_ms()
+        stats = dict(stats, **{k: v for k, v in self.metrics.items() if k.endswith('_ms')})
+        if self.progress_callback:
+            self.progress_callback(self.stream_data['id'], stats)
+
+    def _elapsed_ms(self):
+        return round((time.monotonic() - self._started) * 1000, 1)
+
+    def start(self):
+        """Warm the encoder while creating the room, then start pushing.
+
+        Returns the stream record once the relay is running. Raises
+        GoLiveError (or the room creation error) if the push can't start.
+        """
+        self._started = time.monotonic()
+        warm_thread = None
+        if not self.primed():
+            if self.encoder is not None:
+                # Warmed ahead of time, but the encoder has exited or never
+                # produced a keyframe since
+                self._stop_encoder()
+            warm_thread = threading.Thread(target=self._warm_safe, daemon=True)
+            warm_thread.start()
+
+        try:
+            self.stream_data, self.replayed = self.create_room()
+        except BaseException:
+            self.stop()
+            raise
+        self.metrics['room_created_ms'] = self._elapsed_ms()
+
+        if self.replayed:
+            # A duplicate request: the original request owns the push
+            self.stop()
+            return self.stream_data
+
+        # Check the push URL while the encoder finishes warming up; the
+        # relay reuses the cached result
+        rtmp_url = f"{self.stream_data['baseStreamUrl']}/{self.stream_data['streamKey']}"
+        probe = self.relay.probe_ingest(rtmp_url) if self.relay.probe else {'ok': True}
+        if probe.get('rtt_ms') is not None:
+            self.metrics['ingest_rtt_ms'] = probe['rtt_ms']
+        if not probe['ok']:
+            self._warm_error = GoLiveError(f"Ingest check failed at {probe['stage']}: {probe['error']}")
+
+        if warm_thread is not None:
+            warm_thread.join()
+        if self._warm_error is not None:
+            self._fail(str(self._warm_error))
+
+        self.relay.session_log = sessionlog.open_session(self.stream_data['id'])
+        read_fd, write_fd = os.pipe()
+        self._relay_thread = threading.Thread(
+            target=self.relay.start_stream,
+            args=('pipe:0', rtmp_url),
+            kwargs={
+                'video_codec': 'copy',
+                'audio_codec': 'copy',
+                'loop': False,
+                'custom_ffmpeg_path': self.custom_ffmpeg_path,
+                'stdin': read_fd,
+            },
+            daemon=True
+        )
+        self._relay_thread.start()
+        # The relay process holds its own copy of the read end once spawned
+        while self.relay.ffmpeg_process is None and self._relay_thread.is_alive():
+            time.sleep(0.01)
+        os.close(read_fd)
+        if self.relay.ffmpeg_process is None:
+            # The relay gave up before spawning ffmpeg (missing binary, Popen
+            # error): nothing will ever read the pipe
+            os.close(write_fd)
+            self._fail("Relay ffmpeg failed to start")
+        self._attach_relay(os.fdopen(write_fd, 'wb'))
+        return self.stream_data
+
+    def _fail(self, message):
+        """Stop everything, end the room created for this push and raise."""
+        self.stop()
+        if self.end_room:
+            try:
+                self.end_room(self.stream_data)
+            except Exception as e:
+                print(f"Failed to end room after go-live failure: {e}")
+        raise GoLiveError(message)
+
+    def wait(self):
+        """Block until the push ends."""
+        if self._relay_thread is not None:
+            self._relay_thread.join()
+        self.stop()
+
+    def is_running(self):
+        return self._relay_thread is not None and self._relay_thread.is_alive()
+
+    def stop(self):
+        if self._stopping:
+            return
+        self._stopping = True
+        self._stop_encoder()
+        self._close_relay_input()
+        if self.feeder is not None:
+            self.feeder.close()
+        if self.relay.running:
+            self.relay.stop_stream()
+        if self.stream_data and not self.replayed:
+            sessionlog.close_session(self.stream_data['id'])
+
+
+# Pipelines started by this process, keyed by stream id
+active = {}
+active_lock = threading.Lock()
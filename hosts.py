@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""Latency-ranked selection of TikTok webcast API hosts.
+
+TikTok's TNC dispatch payload (get_domains) maps webcast-normal.tiktokv.com
+to regional hosts and lists alternatives in its strategy_info tables. All
+webcast hosts found there are candidates. They are probed in parallel
+(TCP connect + TLS handshake), and every probe and API call feeds
+exponentially weighted moving averages per host: probe round-trip time,
+API call latency and error rate. The two latencies are kept apart, since a
+probe takes tens of ms and an API call hundreds; hosts are ranked on API
+latency only when every measured candidate has one, on probe RTT otherwise.
+Stream sends its calls to the best-ranked host and falls over to the next
+one on connection errors and gateway failures (see Stream._webcastPost for
+calls that must not be repeated).
+"""
+import math
+import socket
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+DEFAULT_HOST = "webcast-normal.tiktokv.com"
+PORT = 443
+PROBE_TIMEOUT = 2
+# Weight of the newest observation in the moving averages
+ALPHA = 0.3
+# Latency added to a host's score per unit of error rate
+ERROR_PENALTY_MS = 2000
+
+
+def _targets(response):
+    """Yield the strategy_info tables of a TNC get_domains response."""
+    for action in (response or {}).get("data", {}).get("ttnet_dispatch_actions", []):
+        table = action.get("param", {}).get("strategy_info")
+        if isinstance(table, dict):
+            yield table
+
+
+def extract_candidates(response, seed=DEFAULT_HOST):
+    """Return the webcast hosts in a TNC response, the dispatched one first.
+
+    The seed host is followed through the strategy tables (a host may be
+    mapped again, e.g. to a regional alias) and the end of that chain comes
+    first; every other webcast host mentioned in the tables follows, and the
+    seed itself is the last resort.
+    """
+    tables = list(_targets(response))
+    mapping = {}
+    for table in tables:
+        for source, target in table.items():
+            mapping.setdefault(source, target)
+
+    chain = []
+    host = seed
+    while host in mapping and mapping[host] not in chain and mapping[host] != host:
+        host = mapping[host]
+        chain.append(host)
+
+    candidates = list(reversed(chain))
+    for table in tables:
+        for source, target in table.items():
+            for host in (target, source):
+                if "webcast" in host and "normal" in host and host not in candidates:
+                    candidates.append(host)
+    if seed in candidates:
+        candidates.remove(seed)
+    candidates.append(seed)
+    return candidates
+
+
+def probe_host(host, port=PORT, timeout=PROBE_TIMEOUT):
+    """Return the TCP connect + TLS handshake time to host in ms, or None."""
+    started = time.monotonic()
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            context = ssl.create_default_context()
+            with context.wrap_socket(sock, server_hostname=host):
+                return round((time.monotonic() - started) * 1000, 1)
+    except (OSError, ssl.SSLError):
+        return None
+
+
+class _HostStats:
+    def __init__(self):
+        # Probe (TCP + TLS) round trip and API call latency, kept apart
+        self.rtt_ms = None
+        self.latency_ms = None
+        self.error_rate = 0.0
+        self.observations = 0
+        self.updated_at = None
+
+
+class HostSelector:
+    """Ranks hosts by moving averages of latency and errors."""
+
+    def __init__(self, alpha=ALPHA, error_penalty_ms=ERROR_PENALTY_MS):
+        self.alpha = alpha
+        self.error_penalty_ms = error_penalty_ms
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _average(self, current, value):
+        return value if current is None else current + self.alpha * (value - current)
+
+    def record(self, host, latency_ms=None, ok=True, probe=False):
+        """Feed one observation for host: a probe RTT or an API call latency."""
+        with self._lock:
+            stats = self._stats.setdefault(host, _HostStats())
+            if ok and latency_ms is not None:
+                if probe:
+                    stats.rtt_ms = self._average(stats.rtt_ms, latency_ms)
+                else:
+                    stats.latency_ms = self._average(stats.latency_ms, latency_ms)
+            stats.error_rate += self.alpha * ((0.0 if ok else 1.0) - stats.error_rate)
+            stats.observations += 1
+            stats.updated_at = time.time()
+
+    def score(self, host, metric="rtt_ms"):
+        """Lower is better; hosts without a successful observation rank last.
+
+        metric is "rtt_ms" (probes) or "latency_ms" (API calls).
+        """
+        with self._lock:
+            stats = self._stats.get(host)
+            value = getattr(stats, metric) if stats is not None else None
+            if value is None:
+                return math.inf
+            return value + stats.error_rate * self.error_penalty_ms
+
+    def _metric(self, candidates):
+        """API latency when every measured candidate has one, else probe RTT."""
+        with self._lock:
+            measured = [self._stats[host] for host in candidates if host in self._stats
+                        and (self._stats[host].rtt_ms is not None or self._stats[host].latency_ms is not None)]
+        if measured and all(stats.latency_ms is not None for stats in measured):
+            return "latency_ms"
+        return "rtt_ms"
+
+    def rank(self, candidates):
+        """Order candidates best first, keeping dispatch order among ties."""
+        order = {host: i for i, host in enumerate(candidates)}
+        metric = self._metric(candidates)
+        return sorted(candidates, key=lambda host: (self.score(host, metric), order[host]))
+
+    def probe(self, candidates, timeout=PROBE_TIMEOUT):
+        """Probe all candidates in parallel and record the results."""
+        if not candidates:
+            return
+        with ThreadPoolExecutor(max_workers=min(8, len(candidates)), thread_name_prefix="host-probe") as executor:
+            futures = {executor.submit(probe_host, host, PORT, timeout): host for host in candidates}
+            wait(futures, timeout=timeout + 1)
+            for future, host in futures.items():
+                latency = future.result() if future.done() else None
+                self.record(host, latency, ok=latency is not None, probe=True)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                host: {
+                    "rtt_ms": round(s.rtt_ms, 1) if s.rtt_ms is not None else None,
+                    "latency_ms": round(s.latency_ms, 1) if s.latency_ms is not None else None,
+                    "error_rate": round(s.error_rate, 3),
+                    "observations": s.observations,
+                    "updated_at": s.updated_at,
+                }
+                for host, s in self._stats.items()
+            }
+
+
+# Process-wide selector; its averages stay warm inside the daemon
+webcast_hosts = HostSelector()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Request de-duplication for stream creation.
+
+Concurrent duplicates of the same request (double-clicks, client retries)
+are coalesced onto a single upstream call; duplicates that arrive after it
+finished get the stored result replayed instead of creating another room.
+A key reused for a request with different contents raises KeyConflict
+instead of replaying an unrelated result.
+"""
+import hashlib
+import json
+import threading
+import time
+
+# Replay window for requests identified only by their payload
+PAYLOAD_WINDOW = 60
+# Replay window for requests carrying an explicit client token
+TOKEN_WINDOW = 24 * 3600
+
+
+class KeyConflict(Exception):
+    """A key was reused for a request with different contents."""
+
+
+def token_key(account, token):
+    return f"token:{account}:{token}"
+
+
+def payload_key(account, payload):
+    """Key a request by a hash of the account and its canonical payload."""
+    canonical = json.dumps(payload, sort_keys=True, default=str)
+    digest = hashlib.sha256(f"{account}\0{canonical}".encode("utf-8")).hexdigest()
+    return f"payload:{digest}"
+
+
+def fingerprint(payload):
+    """Hash of a payload, ignoring fields left empty."""
+    normalised = {k: v for k, v in payload.items() if v not in (None, "")}
+    canonical = json.dumps(normalised, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class _Entry:
+    def __init__(self, window, fingerprint=None):
+        self.done = threading.Event()
+        self.window = window
+        self.fingerprint = fingerprint
+        self.result = None
+        self.error = None
+        self.finished_at = None
+
+
+class IdempotencyStore:
+    """Run a function at most once per key within the key's window."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def _purge(self, now):
+        expired = [
+            key for key, entry in self._entries.items()
+            if entry.finished_at is not None and now - entry.finished_at > entry.window
+        ]
+        for key in expired:
+            del self._entries[key]
+
+    def run(self, key, func, window=PAYLOAD_WINDOW, fingerprint=None):
+        """Return (result, replayed).
+
+        The first caller for a key runs func(); callers arriving while it is
+        in flight wait for and share its outcome, including its exception.
+        Successful results are replayed for window seconds, failures are
+        forgotten so a later retry runs again. A caller whose fingerprint
+        differs from the first caller's gets KeyConflict.
+        """
+        with self._lock:
+            self._purge(time.monotonic())
+            entry = self._entries.get(key)
+            owner = entry is None
+            if owner:
+                entry = self._entries[key] = _Entry(window, fingerprint)
+            elif entry.fingerprint != fingerprint:
+                raise KeyConflict(key)
+
+        if not owner:
+            entry.done.wait()
+            if entry.error is not None:
+                raise entry.error
+            return entry.result, True
+
+        try:
+            entry.result = func()
+        except BaseException as e:
+            entry.error = e
+            with self._lock:
+                self._entries.pop(key, None)
+            raise
+        finally:
+            entry.finished_at = time.monotonic()
+            entry.done.set()
+        return entry.result, False
+
+
+# Process-wide store shared by the HTML and JSON create routes
+create_requests = IdempotencyStore()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Import-time budget check for app.py.
+
+Every CLI call (cron jobs, the daemon's thin client) pays for importing app
+before it does anything, so app imports its heavy dependencies inside the
+functions that need them. This check runs `python -X importtime -c "import
+app"` in fresh interpreters and fails when the median cumulative import time
+of app exceeds the budget, or when a module that only some commands need
+(Flask, requests, the Libs signing code, the journal, ...) is loaded by the
+import itself.
+
+    python3 importtime.py
+    python3 importtime.py --budget-ms 25 --runs 9
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+DEFAULT_MODULE = 'app'
+DEFAULT_BUDGET_MS = 40
+DEFAULT_RUNS = 5
+
+# Modules that must not be loaded by `import app` (prefix match on packages)
+DEFERRED_MODULES = [
+    'flask', 'werkzeug', 'requests', 'Libs',
+    'account_health', 'hosts', 'journal',
+]
+
+
+def measure(module, cwd):
+    """Import module in a fresh interpreter; returns (cumulative_us, modules)."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=cwd, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'import failed')
+
+    cumulative = None
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue  # header line
+        name = fields[2].strip()
+        modules.add(name)
+        if name == module:
+            cumulative = int(fields[1])
+    if cumulative is None:
+        raise RuntimeError(f'{module} was not imported')
+    return cumulative, modules
+
+
+def deferred_loaded(modules, deferred=DEFERRED_MODULES):
+    return sorted(name for name in modules
+                  if any(name == d or name.startswith(d + '.') for d in deferred))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check that importing app stays within its time budget')
+    parser.add_argument('--module', default=DEFAULT_MODULE, help=f'Module to import (default: {DEFAULT_MODULE})')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help=f'Maximum median cumulative import time in ms (default: {DEFAULT_BUDGET_MS})')
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS,
+                        help=f'Timed imports, each in a fresh interpreter (default: {DEFAULT_RUNS})')
+    args = parser.parse_args(argv)
+
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    try:
+        # Untimed first run so bytecode compilation isn't counted
+        measure(args.module, cwd)
+        samples = []
+        loaded = set()
+        for _ in range(max(1, args.runs)):
+            cumulative, modules = measure(args.module, cwd)
+            samples.append(cumulative / 1000)
+            loaded |= modules
+    except (OSError, RuntimeError) as e:
+        print(f"Error: could not import {args.module}: {e}")
+        return 2
+
+    median = statistics.median(samples)
+    print(f"import {args.module}: median {median:.1f} ms over {len(samples)} runs "
+          f"(min {min(samples):.1f}, max {max(samples):.1f}, budget {args.budget_ms:g} ms)")
+
+    failed = False
+    if median > args.budget_ms:
+        print(f"Error: import {args.module} is over budget by {median - args.budget_ms:.1f} ms")
+        failed = True
+    eager = deferred_loaded(loaded)
+    if args.module == DEFAULT_MODULE and eager:
+        print(f"Error: import {args.module} loads modules that should be imported lazily: {', '.join(eager)}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""Input feeding for pushes from slow or network storage.
+
+With -stream_loop -1 ffmpeg reads its input again on every loop, so a file
+on an NFS/SMB mount is fetched over the network for as long as the push
+runs, and an I/O hiccup shows up as an encoder stall. InputFeeder sits
+between the file and ffmpeg:
+
+- staged: the file is copied once into a local cache directory and ffmpeg
+  reads the copy. The cache is bounded by max_bytes and evicts the least
+  recently used copies; a copy is keyed by the source's path, size and
+  mtime, so an edited file is staged again. Point the cache at a tmpfs
+  (e.g. --cache-dir /dev/shm/tiktok-input) to keep staged inputs in memory.
+- readahead: ffmpeg reads the original file while a thread keeps the next
+  `window` bytes after ffmpeg's read position in the page cache, wrapping
+  to the start of the file for a looped input. ffmpeg's position comes
+  from /proc/<pid>/fdinfo, so on other platforms only the first window is
+  read ahead.
+
+Mode 'auto' (the default) leaves files on local filesystems alone; for a
+network filesystem it stages looped inputs that fit in the cache and reads
+ahead otherwise. 'stage' and 'readahead' force a mode for any file, 'off'
+disables both.
+
+metrics() reports what was done and how the storage behaved: staging time
+and throughput, read-ahead throughput, slow reads (over SLOW_READ seconds)
+and underruns (ffmpeg reading past the read-ahead window, i.e. waiting on
+the storage itself). TikTokStreamer publishes them under 'input' in its
+progress stats.
+
+A process never evicts a copy it is pushing from. Another process may;
+ffmpeg keeps its open file descriptor, so on POSIX systems the push is
+unaffected.
+"""
+import hashlib
+import os
+import shutil
+import threading
+import time
+
+CACHE_DIR = ".input_cache"
+CACHE_MAX_BYTES = 4 * 1024 ** 3
+READAHEAD_BYTES = 64 * 1024 ** 2
+CHUNK_SIZE = 1024 ** 2
+# A single read slower than this counts as a storage stall
+SLOW_READ = 0.5
+# How often the read-ahead thread checks ffmpeg's read position
+POLL_INTERVAL = 0.2
+# Give up following a reader whose position never shows up in /proc
+TRACK_TIMEOUT = 10
+MODES = ('auto', 'stage', 'readahead', 'off')
+
+NETWORK_FILESYSTEMS = {
+    'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', '9p', 'afs', 'ceph', 'glusterfs', 'lustre',
+    'davfs', 'fuse.sshfs', 'fuse.glusterfs', 'fuse.rclone', 'fuse.s3fs', 'fuse.gcsfuse',
+}
+
+
+def filesystem_type(path):
+    """Type of the filesystem holding path ('nfs4', 'ext4', ...), None if unknown.
+
+    Linux only (reads /proc/self/mounts).
+    """
+    path = os.path.realpath(path)
+    best, best_type = '', None
+    try:
+        with open('/proc/self/mounts') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                # Mount points escape spaces and tabs as octal
+                mount_point = fields[1].replace('\\040', ' ').replace('\\011', '\t')
+                inside = path == mount_point or path.startswith(mount_point.rstrip('/') + '/')
+                if inside and len(mount_point) >= len(best):
+                    best, best_type = mount_point, fields[2]
+    except OSError:
+        return None
+    return best_type
+
+
+def is_network_path(path):
+    return filesystem_type(path) in NETWORK_FILESYSTEMS
+
+
+def _read_position(pid, path):
+    """Offset of pid's open file descriptor on path, None if it has none.
+
+    Linux only (reads /proc/<pid>/fd and fdinfo).
+    """
+    fd_dir = f"/proc/{pid}/fd"
+    try:
+        fds = os.listdir(fd_dir)
+    except OSError:
+        return None
+    for fd in fds:
+        try:
+            if os.readlink(os.path.join(fd_dir, fd)) != path:
+                continue
+            with open(f"/proc/{pid}/fdinfo/{fd}") as f:
+                for line in f:
+                    if line.startswith('pos:'):
+                        return int(line.split()[1])
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+class FeedStats:
+    """Read metrics of one input, updated from the staging and read-ahead code."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.read_bytes = 0
+        self.read_seconds = 0.0
+        self.slow_reads = 0
+        self.max_read_ms = 0.0
+
+    def record(self, nbytes, seconds):
+        with self._lock:
+            self.read_bytes += nbytes
+            self.read_seconds += seconds
+            self.max_read_ms = max(self.max_read_ms, round(seconds * 1000, 1))
+            if seconds > SLOW_READ:
+                self.slow_reads += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'read_bytes': self.read_bytes,
+                'read_mb_s': round(self.read_bytes / self.read_seconds / 1024 ** 2, 1) if self.read_seconds else None,
+                'slow_reads': self.slow_reads,
+                'max_read_ms': self.max_read_ms,
+            }
+
+
+class InputCache:
+    """Local copies of remote inputs, bounded by size with LRU eviction."""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Copies this process is pushing from; never evicted by it
+        self._in_use = {}
+
+    def _path(self, source):
+        st = os.stat(source)
+        key = hashlib.sha1(f"{os.path.realpath(source)}|{st.st_size}|{st.st_mtime_ns}".encode()).hexdigest()[:20]
+        return os.path.join(self.directory, key + os.path.splitext(source)[1].lower())
+
+    def entries(self):
+        """[(path, size, last_used)] of the cached copies, least recently used first."""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            if name.startswith('.'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, st.st_size, st.st_mtime))
+        return sorted(entries, key=lambda e: e[2])
+
+    def fits(self, size):
+        return size <= self.max_bytes
+
+    def lookup(self, source):
+        """Path of source's cached copy (marked as just used), or None."""
+        path = self._path(source)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def evict(self, needed=0):
+        """Remove least recently used copies until needed more bytes fit; returns bytes freed."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for path, size, _ in entries:
+            if total + needed <= self.max_bytes:
+                break
+            with self._lock:
+                if self._in_use.get(path):
+                    continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            freed += size
+        return freed
+
+    def stage(self, source, stats=None):
+        """Copy source into the cache and return the copy's path."""
+        path = self._path(source)
+        size = os.path.getsize(source)
+        os.makedirs(self.directory, exist_ok=True)
+        self.evict(needed=size)
+        tmp = os.path.join(self.directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+        try:
+            with open(source, 'rb') as src, open(tmp, 'wb') as dst:
+                buf = bytearray(CHUNK_SIZE)
+                view = memoryview(buf)
+                while True:
+                    started = time.monotonic()
+                    n = src.readinto(buf)
+                    if stats:
+                        stats.record(n, time.monotonic() - started)
+                    if not n:
+                        break
+                    dst.write(view[:n])
+            shutil.copystat(source, tmp)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        os.utime(path)
+        return path
+
+    def pin(self, path):
+        with self._lock:
+            self._in_use[path] = self._in_use.get(path, 0) + 1
+
+    def unpin(self, path):
+        with self._lock:
+            count = self._in_use.get(path, 0) - 1
+            if count > 0:
+                self._in_use[path] = count
+            else:
+                self._in_use.pop(path, None)
+
+
+class ReadAhead:
+    """Keeps the window of bytes after a reader's position in the page cache."""
+
+    def __init__(self, path, window=READAHEAD_BYTES, loop=True, stats=None):
+        self.path = os.path.realpath(path)
+        self.window = window
+        self.loop = loop
+        self.stats = stats or FeedStats()
+        self.underruns = 0
+        self.lead_bytes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, pid):
+        """Follow process pid's reads of the file, instead of any earlier reader's."""
+        self.stop()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(pid,), name="readahead", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=2)
+
+    def _run(self, pid):
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except OSError as e:
+            print(f"Warning: read-ahead disabled, cannot open {self.path}: {e}")
+            return
+        try:
+            size = os.fstat(fd).st_size
+            if size and hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            if size:
+                self._follow(fd, pid, size)
+        except OSError as e:
+            print(f"Warning: read-ahead stopped: {e}")
+        finally:
+            os.close(fd)
+
+    def _distance(self, start, end, size):
+        """Bytes from start forward to end, wrapping around a looped file."""
+        return (end - start) % size if self.loop else end - start
+
+    def _follow(self, fd, pid, size):
+        buf = bytearray(CHUNK_SIZE)
+        # A looped file is read circularly; a window as large as the file
+        # stops just short of the reader instead of overlapping it
+        window = min(self.window, size - 1) if self.loop else self.window
+        pos = frontier = 0
+        tracked = False
+        started = time.monotonic()
+        while not self._stop.is_set():
+            current = _read_position(pid, self.path)
+            if current is not None:
+                tracked, pos = True, current
+            elif tracked:
+                # ffmpeg closed the file or exited
+                return
+            elif time.monotonic() - started > TRACK_TIMEOUT:
+                # ffmpeg's position can't be seen here; the first window is all we do
+                return
+
+            ahead = self._distance(pos, frontier, size)
+            if not 0 <= ahead <= window:
+                # Reading just past the frontier means ffmpeg waited on the
+                # storage itself; anything further away is a seek
+                if 0 < self._distance(frontier, pos, size) <= window:
+                    self.underruns += 1
+                frontier, ahead = pos, 0
+            self.lead_bytes = ahead
+            if ahead >= window or frontier >= size:
+                self._stop.wait(POLL_INTERVAL)
+                continue
+
+            length = min(CHUNK_SIZE, window - ahead, size - frontier)
+            read_started = time.monotonic()
+            if hasattr(os, 'preadv'):
+                n = os.preadv(fd, [memoryview(buf)[:length]], frontier)
+            else:
+                n = len(os.pread(fd, length, frontier))
+            self.stats.record(n, time.monotonic() - read_started)
+            if not n:
+                return
+            frontier += n
+            if self.loop:
+                frontier %= size
+            self.lead_bytes = ahead + n
+
+
+class InputFeeder:
+    """Decides how ffmpeg reads one input and keeps the metrics of it."""
+
+    def __init__(self, source, mode='auto', cache=None, window=READAHEAD_BYTES, loop=True):
+        if mode not in MODES:
+            raise ValueError(f"Unknown input feed mode '{mode}', expected one of {', '.join(MODES)}")
+        self.source = source
+        self.requested = mode
+        self.cache = cache or input_cache
+        self.window = window
+        self.loop = loop
+        self.mode = 'direct'
+        self.path = source
+        self.filesystem = None
+        self.stage_ms = None
+        self.stats = FeedStats()
+        self._readahead = None
+        self._pinned = None
+
+    def prepare(self):
+        """Stage the input or set up read-ahead; returns the path ffmpeg should read."""
+        if self.requested == 'off' or not os.path.isfile(self.source):
+            return self.path
+        self.filesystem = filesystem_type(self.source)
+        remote = self.filesystem in NETWORK_FILESYSTEMS
+        if self.requested == 'auto' and not remote:
+            return self.path
+
+        size = os.path.getsize(self.source)
+        if self.requested == 'stage' or (self.requested == 'auto' and self.loop):
+            cached = self.cache.lookup(self.source)
+            if cached:
+                self.mode, self.path = 'cached', cached
+            elif self.cache.fits(size):
+                print(f"Staging {self.source} ({size / 1024 ** 2:.0f} MB) to {self.cache.directory}...")
+                started = time.monotonic()
+                try:
+                    self.path = self.cache.stage(self.source, self.stats)
+                    self.mode = 'staged'
+                except OSError as e:
+                    print(f"Warning: staging failed ({e}), reading ahead instead")
+                self.stage_ms = round((time.monotonic() - started) * 1000, 1)
+            else:
+                print(f"Warning: {self.source} is larger than the input cache, reading ahead instead")
+            if self.mode in ('cached', 'staged'):
+                self.cache.pin(self.path)
+                self._pinned = self.path
+                return self.path
+
+        self.mode = 'readahead'
+        self._readahead = ReadAhead(self.source, self.window, self.loop, self.stats)
+        return self.path
+
+    def attach(self, pid):
+        """Start reading ahead of process pid (no-op unless in readahead mode)."""
+        if self._readahead is not None:
+            self._readahead.start(pid)
+
+    def metrics(self):
+        metrics = {
+            'mode': self.mode,
+            'filesystem': self.filesystem,
+            'stage_ms': self.stage_ms,
+        }
+        metrics.update(self.stats.snapshot())
+        if self._readahead is not None:
+            metrics.update(
+                window_bytes=self.window,
+                lead_bytes=self._readahead.lead_bytes,
+                underruns=self._readahead.underruns,
+            )
+        return metrics
+
+    def close(self):
+        if self._readahead is not None:
+            self._readahead.stop()
+        if self._pinned:
+            self.cache.unpin(self._pinned)
+            self._pinned = None
+
+
+# Process-wide instance
+input_cache = InputCache()
@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+"""Append-only JSONL journal of account operations.
+
+Every room create/end, thumbnail upload and account validation appends one
+entry with its inputs (secrets redacted), outcome, duration, upstream
+latency and error class:
+
+    {"ts": 1760000000.12, "op": "create_stream", "ok": false,
+     "duration_ms": 812.4, "upstream_ms": 640.2, "host": "webcast...",
+     "account": "alice", "error_class": "rejected", "error": "...",
+     "inputs": {"title": "...", "device_id": "***"}, "pid": 1234}
+
+Entries are buffered in memory and written in batches, with one fsync per
+batch, by a background thread (at most FLUSH_INTERVAL later, or as soon as
+BATCH_SIZE entries are waiting). Several processes (CLI, daemon, web app)
+can append to the same journal; each batch is written under a file lock.
+
+The journal lives in journal/ as segments named after their start time
+(ops-<ms>.jsonl). A segment is closed once it exceeds SEGMENT_MAX_BYTES or
+SEGMENT_MAX_AGE, gzip-compressed, and only the newest KEEP_SEGMENTS are
+kept. Each segment has a sidecar ops-<ms>.idx.json with its time span,
+entry count and a sparse index (timestamp, entry number, byte offset) for
+every INDEX_EVERY-th entry. Queries use it to skip whole segments and to
+seek close to the first entry they need:
+
+    python3 journal.py tail -n 20 --op create_stream
+    python3 journal.py query --since -6h --failed
+    python3 journal.py stats --since -24h
+"""
+import argparse
+import atexit
+import functools
+import glob
+import gzip
+import inspect
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import storage
+
+JOURNAL_DIR = "journal"
+SEGMENT_MAX_BYTES = 8 * 1024 * 1024
+SEGMENT_MAX_AGE = 24 * 3600
+KEEP_SEGMENTS = 60
+FLUSH_INTERVAL = 1.0
+BATCH_SIZE = 64
+INDEX_EVERY = 64
+# Entries from different processes may be written up to a flush interval
+# or so out of order; time-range queries widen their window by this much
+CLOCK_SLACK = 5.0
+MAX_VALUE_LENGTH = 300
+
+REDACTED = "***"
+SECRET_KEYS = re.compile(
+    r"cookie|token|secret|passw|session|key|sign|auth|openudid|device_id|^iid$|install_id",
+    re.IGNORECASE
+)
+
+
+def redact(value, key=None):
+    """Copy value with secret-looking fields masked and long strings cut."""
+    if key is not None and SECRET_KEYS.search(str(key)):
+        return REDACTED if value not in (None, "") else value
+    if isinstance(value, dict):
+        return {k: redact(v, k) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    if isinstance(value, str):
+        return value if len(value) <= MAX_VALUE_LENGTH else value[:MAX_VALUE_LENGTH] + "..."
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    return redact(repr(value))
+
+
+def _segment_start(path):
+    name = os.path.basename(path)
+    return int(name[len("ops-"):].split(".", 1)[0])
+
+
+def _index_path(path):
+    return os.path.join(os.path.dirname(path), f"ops-{_segment_start(path)}.idx.json")
+
+
+def segments(directory=JOURNAL_DIR):
+    """Return the segment paths, oldest first."""
+    paths = glob.glob(os.path.join(directory, "ops-*.jsonl")) + glob.glob(os.path.join(directory, "ops-*.jsonl.gz"))
+    return sorted(paths, key=_segment_start)
+
+
+def _open(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def _empty_index():
+    return {"first_ts": None, "last_ts": None, "count": 0, "size": 0, "sparse": []}
+
+
+def _scan(path):
+    """Rebuild a segment's index by reading it."""
+    index = _empty_index()
+    offset = 0
+    with _open(path) as f:
+        for line in f:
+            try:
+                ts = json.loads(line)["ts"]
+            except (ValueError, KeyError, TypeError):
+                offset += len(line)
+                continue
+            _index_entry(index, ts, offset)
+            offset += len(line)
+    index["size"] = offset
+    return index
+
+
+def _index_entry(index, ts, offset):
+    if index["count"] % INDEX_EVERY == 0:
+        index["sparse"].append([ts, index["count"], offset])
+    index["count"] += 1
+    index["first_ts"] = ts if index["first_ts"] is None else min(index["first_ts"], ts)
+    index["last_ts"] = ts if index["last_ts"] is None else max(index["last_ts"], ts)
+
+
+def load_index(path):
+    """Return a segment's index, rebuilding it if it is missing or behind."""
+    try:
+        index = storage.read_json(_index_path(path))
+    except (FileNotFoundError, ValueError):
+        index = None
+    if index is None or (not path.endswith(".gz") and index.get("size") != os.path.getsize(path)):
+        index = _scan(path)
+    return index
+
+
+class JournalWriter:
+    """Buffers entries and appends them to the active segment in batches."""
+
+    def __init__(self, directory=JOURNAL_DIR, flush_interval=FLUSH_INTERVAL, batch_size=BATCH_SIZE,
+                 max_bytes=SEGMENT_MAX_BYTES, max_age=SEGMENT_MAX_AGE, keep=KEEP_SEGMENTS):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.keep = keep
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffer = []
+        self._wake = threading.Event()
+        self._thread = None
+
+    def append(self, entry):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._buffer.append(entry)
+            waiting = len(self._buffer)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+        if waiting >= self.batch_size:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Journal write failed: {e}")
+
+    def flush(self):
+        """Write out everything buffered so far."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            with storage.file_lock(os.path.join(self.directory, "journal")):
+                path = self._active_segment(batch[0]["ts"])
+                index = load_index(path) if os.path.exists(path) else _empty_index()
+                with open(path, "ab") as f:
+                    offset = f.tell()
+                    for entry in batch:
+                        line = (json.dumps(entry, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+                        _index_entry(index, entry["ts"], offset)
+                        f.write(line)
+                        offset += len(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+                index["size"] = offset
+                storage.atomic_write(_index_path(path), json.dumps(index))
+
+    def _active_segment(self, now):
+        """The segment to append to, closing the current one if it is full or old."""
+        open_segments = [p for p in segments(self.directory) if not p.endswith(".gz")]
+        for path in open_segments[:-1]:
+            # Left open by a crash during rotation
+            self._close_segment(path)
+        if open_segments:
+            path = open_segments[-1]
+            age = now - _segment_start(path) / 1000
+            if os.path.getsize(path) < self.max_bytes and age < self.max_age:
+                return path
+            self._close_segment(path)
+        return os.path.join(self.directory, f"ops-{int(now * 1000)}.jsonl")
+
+    def _close_segment(self, path):
+        index = load_index(path)
+        with open(path, "rb") as src, gzip.open(path + ".gz.tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(path + ".gz.tmp", path + ".gz")
+        storage.atomic_write(_index_path(path), json.dumps(index))
+        os.remove(path)
+        closed = [p for p in segments(self.directory) if p.endswith(".gz")]
+        for old in closed[:max(0, len(closed) - self.keep)]:
+            for stale in (old, _index_path(old)):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+
+writer = JournalWriter()
+
+
+def record(op, ok, inputs=None, started=None, error=None, error_class=None, **fields):
+    """Append one operation to the journal.
+
+    started is the time.monotonic() at which the operation began; fields
+    are extra top-level values such as account, upstream_ms or stream_id.
+    """
+    entry = {"ts": round(time.time(), 3), "op": op, "ok": bool(ok)}
+    if started is not None:
+        entry["duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+    for key, value in fields.items():
+        if value is not None:
+            entry[key] = redact(value, key)
+    if not ok:
+        entry["error_class"] = error_class or "rejected"
+        if error:
+            entry["error"] = redact(str(error))
+    if inputs:
+        entry["inputs"] = redact(inputs)
+    entry["pid"] = os.getpid()
+    try:
+        writer.append(entry)
+    except Exception as e:
+        print(f"Journal write failed: {e}")
+
+
+def journaled(op, context=None, ok=bool):
+    """Decorator journaling every call of a method.
+
+    The call's arguments become the entry's inputs; context(self, ok) adds
+    fields after the call (account, upstream latency, ...). ok(result)
+    decides success; exceptions are recorded with their class and re-raised.
+    Coroutine methods are journaled when they finish.
+    """
+    def decorate(func):
+        signature = inspect.signature(func)
+
+        def inputs_of(self, args, kwargs):
+            try:
+                bound = signature.bind(self, *args, **kwargs)
+                bound.apply_defaults()
+                return {k: v for k, v in list(bound.arguments.items())[1:]}
+            except TypeError:
+                return None
+
+        def failed(self, inputs, started, e):
+            fields = dict(context(self, False)) if context else {}
+            fields.update(error=e, error_class=type(e).__name__)
+            record(op, False, inputs, started, **fields)
+
+        def finished(self, inputs, started, result):
+            succeeded = ok(result)
+            record(op, succeeded, inputs, started, **(context(self, succeeded) if context else {}))
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                inputs = inputs_of(self, args, kwargs)
+                started = time.monotonic()
+                try:
+                    result = await func(self, *args, **kwargs)
+                except Exception as e:
+                    failed(self, inputs, started, e)
+                    raise
+                finished(self, inputs, started, result)
+                return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            inputs = inputs_of(self, args, kwargs)
+            started = time.monotonic()
+            try:
+                result = func(self, *args, **kwargs)
+            except Exception as e:
+                failed(self, inputs, started, e)
+                raise
+            finished(self, inputs, started, result)
+            return result
+        return wrapper
+    return decorate
+
+
+def _matches(entry, op, failed):
+    if op and entry.get("op") != op:
+        return False
+    if failed is not None and entry.get("ok") == failed:
+        return False
+    return True
+
+
+def _read_from(path, offset):
+    """Yield the entries of a segment from a byte offset on."""
+    with _open(path) as f:
+        if offset:
+            f.seek(offset)
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def query(since=None, until=None, op=None, failed=None, limit=None, directory=JOURNAL_DIR):
+    """Return entries with since <= ts <= until, oldest first.
+
+    failed=True keeps failures only, failed=False successes only.
+    """
+    results = []
+    for path in segments(directory):
+        index = load_index(path)
+        if index["count"] == 0:
+            continue
+        if since is not None and index["last_ts"] < since:
+            continue
+        if until is not None and index["first_ts"] > until:
+            break
+        offset = 0
+        if since is not None:
+            for ts, _, point in index["sparse"]:
+                if ts > since - CLOCK_SLACK:
+                    break
+                offset = point
+        for entry in _read_from(path, offset):
+            ts = entry.get("ts", 0)
+            if until is not None and ts > until + CLOCK_SLACK:
+                break
+            if (since is None or ts >= since) and (until is None or ts <= until) and _matches(entry, op, failed):
+                results.append(entry)
+                if limit and len(results) >= limit:
+                    return results
+    results.sort(key=lambda e: e.get("ts", 0))
+    return results
+
+
+def tail(n=50, op=None, failed=None, directory=JOURNAL_DIR):
+    """Return the last n matching entries, oldest first."""
+    if n <= 0:
+        return []
+    collected = []
+    for path in reversed(segments(directory)):
+        index = load_index(path)
+        offset = 0
+        if op is None and failed is None:
+            # Unfiltered: seek to the sparse point just before the last n entries
+            first_needed = index["count"] - (n - len(collected))
+            for _, number, point in index["sparse"]:
+                if number > first_needed:
+                    break
+                offset = point
+        entries = [e for e in _read_from(path, offset) if _matches(e, op, failed)]
+        collected = entries[-(n - len(collected)):] + collected
+        if len(collected) >= n:
+            break
+    collected.sort(key=lambda e: e.get("ts", 0))
+    return collected[-n:]
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(fraction * len(values)))], 1)
+
+
+def summarize(entries):
+    """Per-operation count, failures and latency percentiles."""
+    by_op = {}
+    for entry in entries:
+        by_op.setdefault(entry.get("op", "?"), []).append(entry)
+    summary = {}
+    for op, items in sorted(by_op.items()):
+        upstream = [e["upstream_ms"] for e in items if isinstance(e.get("upstream_ms"), (int, float))]
+        durations = [e["duration_ms"] for e in items if isinstance(e.get("duration_ms"), (int, float))]
+        errors = {}
+        for e in items:
+            if not e.get("ok"):
+                errors[e.get("error_class", "?")] = errors.get(e.get("error_class", "?"), 0) + 1
+        summary[op] = {
+            "count": len(items),
+            "failures": sum(1 for e in items if not e.get("ok")),
+            "errors": errors,
+            "upstream_p50_ms": _percentile(upstream, 0.5),
+            "upstream_p95_ms": _percentile(upstream, 0.95),
+            "duration_p50_ms": _percentile(durations, 0.5),
+            "duration_p95_ms": _percentile(durations, 0.95),
+        }
+    return summary
+
+
+_RELATIVE = re.compile(r"^-(\d+(?:\.\d+)?)([smhd])$")
+
+
+def parse_time(value):
+    """Parse '-30m' / '-6h' / '-2d' (relative to now) or an ISO 8601 time to epoch seconds."""
+    if value is None:
+        return None
+    match = _RELATIVE.match(value.strip())
+    if match:
+        return time.time() - float(match.group(1)) * {"s": 1, "m": 60, "h": 3600, "d": 86400}[match.group(2)]
+    return datetime.fromisoformat(value.strip()).timestamp()
+
+
+def format_entry(entry):
+    when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry.get("ts", 0)))
+    status = "ok  " if entry.get("ok") else "FAIL"
+    parts = [when, status, f"{entry.get('op', '?'):16}"]
+    if entry.get("account"):
+        parts.append(entry["account"])
+    if entry.get("upstream_ms") is not None:
+        parts.append(f"upstream {entry['upstream_ms']}ms")
+    if entry.get("duration_ms") is not None:
+        parts.append(f"total {entry['duration_ms']}ms")
+    if not entry.get("ok"):
+        parts.append(f"[{entry.get('error_class', '?')}] {entry.get('error', '')}".rstrip())
+    return "  ".join(parts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the operations journal")
+    parser.add_argument("--dir", default=JOURNAL_DIR, help=f"Journal directory (default: {JOURNAL_DIR})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("tail", "Show the most recent entries"),
+                            ("query", "Show entries in a time range"),
+                            ("stats", "Summarise failures and latency per operation")):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument("--op", help="Only this operation (e.g. create_stream, end_stream)")
+        sub.add_argument("--failed", action="store_true", help="Only failed operations")
+        if name == "tail":
+            sub.add_argument("-n", type=int, default=20, help="Number of entries (default: 20)")
+        else:
+            sub.add_argument("--since", help="Start time, ISO 8601 or relative like -6h")
+            sub.add_argument("--until", help="End time, ISO 8601 or relative like -1h")
+        if name != "stats":
+            sub.add_argument("--json", action="store_true", help="Print raw JSON lines")
+    args = parser.parse_args(argv)
+
+    failed = True if args.failed else None
+    try:
+        if args.command == "tail":
+            entries = tail(args.n, args.op, failed, args.dir)
+        else:
+            entries = query(parse_time(args.since), parse_time(args.until), args.op, failed, directory=args.dir)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 2
+
+    if args.command == "stats":
+        for op, stats in summarize(entries).items():
+            errors = ", ".join(f"{k} x{v}" for k, v in stats["errors"].items()) or "none"
+            print(f"{op}: {stats['count']} calls, {stats['failures']} failed ({errors}); "
+                  f"upstream p50 {stats['upstream_p50_ms']}ms p95 {stats['upstream_p95_ms']}ms; "
+                  f"total p50 {stats['duration_p50_ms']}ms p95 {stats['duration_p95_ms']}ms")
+        if not entries:
+            print("No journal entries in that range.")
+        return 0
+    for entry in entries:
+        print(json.dumps(entry, ensure_ascii=False) if args.json else format_entry(entry))
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""Encoder-exit watchdog.
+
+Every push is linked to its stream record. When a push's encoder exits or
+stops reporting progress, and hasn't recovered within a grace period, the
+watchdog ends the TikTok room for that record's account and releases the
+push's resources.
+
+Pushes are discovered from two places:
+  - pipelines running in this process, registered with watch()
+  - ffmpeg.py processes started with --stream-id, through the telemetry
+    files they keep updated (see telemetry.FileTelemetryWriter)
+
+A room that can't be ended is retried up to END_ATTEMPTS times with
+exponential backoff; after that the record is marked end_failed and the
+push is released anyway.
+"""
+import os
+import signal
+import threading
+import time
+
+from telemetry import TELEMETRY_DIR
+import storage
+
+CHECK_INTERVAL = 5
+# A push with no progress for this long counts as stalled
+STALL_AFTER = 20
+# How long a push may stay down before its room is ended
+GRACE_PERIOD = 30
+# Attempts at ending a room, END_RETRY_BACKOFF seconds apart, doubling
+END_ATTEMPTS = 5
+END_RETRY_BACKOFF = 30
+
+
+def pid_alive(pid):
+    if not pid:
+        return None
+    if os.name == 'nt':
+        # os.kill(pid, 0) would terminate the process on Windows
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _Watched:
+    def __init__(self, stream_id, is_alive, last_progress, release):
+        self.stream_id = stream_id
+        self.is_alive = is_alive
+        self.last_progress = last_progress
+        self.release = release
+
+
+class PushWatchdog:
+    """Ends rooms whose push exited or stalled past the grace period."""
+
+    def __init__(self, grace=GRACE_PERIOD, stall_after=STALL_AFTER,
+                 interval=CHECK_INTERVAL, telemetry_dir=TELEMETRY_DIR):
+        self.grace = grace
+        self.stall_after = stall_after
+        self.interval = interval
+        self.telemetry_dir = telemetry_dir
+        self.end_stream = None
+        self.end_failed = None
+        self._lock = threading.Lock()
+        self._watched = {}
+        self._down_since = {}
+        # stream_id: (failed attempts, time of the next attempt)
+        self._end_attempts = {}
+        # stream_id: stop() of a push whose telemetry file this process writes
+        self._local_stops = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def watch(self, stream_id, is_alive, last_progress=None, release=None):
+        """Watch an in-process push.
+
+        is_alive() reports whether the encoder still runs, last_progress()
+        returns the epoch time of its last progress report (or None) and
+        release() frees its resources once the room is ended.
+        """
+        with self._lock:
+            self._watched[stream_id] = _Watched(stream_id, is_alive, last_progress, release)
+
+    def register_stop(self, stream_id, stop):
+        """Stop a stalled push of this process (reporting through a telemetry
+        file) with stop() instead of signalling our own pid."""
+        with self._lock:
+            self._local_stops[stream_id] = stop
+
+    def unwatch(self, stream_id):
+        with self._lock:
+            self._watched.pop(stream_id, None)
+            self._down_since.pop(stream_id, None)
+            self._end_attempts.pop(stream_id, None)
+            self._local_stops.pop(stream_id, None)
+
+    def busy(self):
+        with self._lock:
+            return bool(self._watched or self._down_since)
+
+    def _in_process_health(self, now):
+        with self._lock:
+            watched = list(self._watched.values())
+        health = {}
+        for w in watched:
+            if not w.is_alive():
+                health[w.stream_id] = ('exited', w.release, None)
+                continue
+            last = w.last_progress() if w.last_progress else None
+            if last is not None and now - last > self.stall_after:
+                health[w.stream_id] = ('stalled', w.release, None)
+            else:
+                health[w.stream_id] = (None, w.release, None)
+        return health
+
+    def _file_health(self, now):
+        health = {}
+        try:
+            names = os.listdir(self.telemetry_dir)
+        except FileNotFoundError:
+            return health
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.telemetry_dir, name)
+            try:
+                state = storage.read_json(path)
+            except (OSError, ValueError):
+                continue
+            stream_id = state.get('stream_id')
+            if not stream_id:
+                # Unlinked push: nothing to end, just tidy up after it
+                if state.get('ended') or pid_alive(state.get('pid')) is False:
+                    _remove(path)
+                continue
+            if state.get('ended'):
+                problem = 'exited'
+            elif pid_alive(state.get('pid')) is False:
+                problem = 'crashed'
+            elif now - state.get('updated_at', 0) > self.stall_after:
+                problem = 'stalled'
+            else:
+                problem = None
+            release = None
+            if problem == 'stalled':
+                release = lambda stream_id=stream_id, pid=state.get('pid'): self._stop_push(stream_id, pid)
+            health[stream_id] = (problem, release, path)
+        return health
+
+    def _stop_push(self, stream_id, pid):
+        if pid == os.getpid():
+            with self._lock:
+                stop = self._local_stops.get(stream_id)
+            if stop:
+                stop()
+        else:
+            _terminate(pid)
+
+    def check_once(self):
+        now = time.time()
+        health = self._file_health(now)
+        # In-process state is authoritative for the pushes we own
+        health.update(self._in_process_health(now))
+
+        to_end = []
+        with self._lock:
+            for stream_id in list(self._down_since):
+                if stream_id not in health:
+                    del self._down_since[stream_id]
+                    self._end_attempts.pop(stream_id, None)
+            for stream_id, (problem, release, path) in health.items():
+                if problem is None:
+                    self._down_since.pop(stream_id, None)
+                    self._end_attempts.pop(stream_id, None)
+                    continue
+                since = self._down_since.setdefault(stream_id, now)
+                _, retry_at = self._end_attempts.get(stream_id, (0, 0))
+                if now - since >= self.grace and now >= retry_at:
+                    to_end.append((stream_id, problem, release, path))
+
+        for stream_id, problem, release, path in to_end:
+            print(f"Watchdog: push for stream {stream_id} {problem}, ending its room")
+            try:
+                if self.end_stream:
+                    self.end_stream(stream_id, problem)
+            except Exception as e:
+                with self._lock:
+                    attempts = self._end_attempts.get(stream_id, (0, 0))[0] + 1
+                    self._end_attempts[stream_id] = (attempts, now + END_RETRY_BACKOFF * 2 ** (attempts - 1))
+                if attempts < END_ATTEMPTS:
+                    # Keep the push marked down and retry after the backoff
+                    print(f"Watchdog: failed to end stream {stream_id} (attempt {attempts}/{END_ATTEMPTS}): {e}")
+                    continue
+                print(f"Watchdog: giving up ending stream {stream_id} after {attempts} attempts: {e}")
+                if self.end_failed:
+                    try:
+                        self.end_failed(stream_id, problem, e)
+                    except Exception as mark_error:
+                        print(f"Watchdog: failed to mark stream {stream_id}: {mark_error}")
+            if release:
+                try:
+                    release()
+                except Exception as e:
+                    print(f"Watchdog: failed to release stream {stream_id}: {e}")
+            if path:
+                _remove(path)
+            self.unwatch(stream_id)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check_once()
+            except Exception as e:
+                print(f"Watchdog check failed: {e}")
+
+    def start(self, end_stream, end_failed=None):
+        """Start checking in the background.
+
+        end_stream(stream_id, reason) ends a room; end_failed(stream_id,
+        reason, error) records one that couldn't be ended.
+        """
+        self.end_stream = end_stream
+        self.end_failed = end_failed
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="push-watchdog", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def _terminate(pid):
+    if pid and pid != os.getpid() and pid_alive(pid):
+        os.kill(pid, signal.SIGTERM)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# Process-wide watchdog used by the web app and the daemon
+monitor = PushWatchdog()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Client-side pacing of upstream calls, per account and endpoint class.
+
+Every limited call first takes a token from the bucket of its (endpoint,
+account) pair; generate_device isn't tied to an account and has a single
+bucket. Buckets are configured in config.json, per endpoint class:
+
+    "rate_limits": {
+        "create_stream":   {"per_minute": 6,  "burst": 2, "queue": 4, "max_wait": 20},
+        "end_stream":      {"per_minute": 12, "burst": 3, "queue": 8, "max_wait": 20},
+        "generate_device": {"per_minute": 4,  "burst": 1, "queue": 4, "max_wait": 30}
+    }
+
+A call that finds no token waits its turn. Turns are handed out first come,
+first served (each waiter reserves the next free slot of the bucket), so a
+busy script can't starve a person clicking in the panel for the same
+account, and other accounts have buckets of their own. Admission is
+decided up front: if the queue for the bucket already holds `queue`
+callers, or the caller's slot is further away than `max_wait` (or the
+caller's own deadline), it isn't queued at all and gets RateLimited with
+the number of seconds after which a retry would be admitted.
+
+limiter.metrics() reports queue depth, admissions, rejections and wait
+times per endpoint class; the web app serves it at /api/v1/limits.
+"""
+import threading
+import time
+from collections import deque
+
+import storage
+
+DEFAULT_LIMITS = {
+    "create_stream": {"per_minute": 6, "burst": 2, "queue": 4, "max_wait": 20},
+    "end_stream": {"per_minute": 12, "burst": 3, "queue": 8, "max_wait": 20},
+    "generate_device": {"per_minute": 4, "burst": 1, "queue": 4, "max_wait": 30},
+}
+# Wait times kept per endpoint class for the percentiles
+WAIT_SAMPLES = 200
+
+
+class RateLimited(Exception):
+    """A call was not admitted; retry_after is in seconds."""
+
+    def __init__(self, endpoint, retry_after):
+        self.endpoint = endpoint
+        self.retry_after = max(1, int(retry_after + 0.999))
+        super().__init__(f"Too many {endpoint.replace('_', ' ')} requests, retry after {self.retry_after}s")
+
+
+def load_limits(config_file="config.json"):
+    """Return {endpoint: settings}, config.json values over the defaults."""
+    try:
+        configured = storage.read_json(config_file).get("rate_limits")
+    except (FileNotFoundError, ValueError, AttributeError):
+        configured = None
+    limits = {name: dict(settings) for name, settings in DEFAULT_LIMITS.items()}
+    if isinstance(configured, dict):
+        for name, settings in configured.items():
+            if isinstance(settings, dict):
+                limits.setdefault(name, {}).update(settings)
+    return limits
+
+
+class _Bucket:
+    """Token bucket kept as the time its next token is free (GCRA)."""
+
+    def __init__(self):
+        self.next_free = 0.0
+        self.waiting = 0
+
+    def slot(self, now, interval, burst):
+        """Monotonic time at which the next caller may go."""
+        return max(now, self.next_free - (burst - 1) * interval)
+
+    def reserve(self, now, interval):
+        self.next_free = max(self.next_free, now) + interval
+
+
+class _Stats:
+    def __init__(self):
+        self.admitted = 0
+        self.rejected = 0
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(fraction * len(values)))] * 1000, 1)
+
+
+class RateLimiter:
+    """Token buckets per (endpoint, account) with a bounded FIFO wait."""
+
+    def __init__(self, config_file="config.json"):
+        self.config_file = config_file
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._stats = {}
+
+    def acquire(self, endpoint, account=None, deadline=None):
+        """Wait for a turn to call endpoint for account; returns the seconds waited.
+
+        deadline is a time.monotonic() after which waiting is pointless.
+        Raises RateLimited instead of queueing a call that couldn't go in time.
+        """
+        settings = load_limits(self.config_file).get(endpoint)
+        if not settings or not settings.get("per_minute"):
+            return 0.0
+        interval = 60.0 / float(settings["per_minute"])
+        burst = max(1, int(settings.get("burst", 1)))
+        max_queue = max(0, int(settings.get("queue", 0)))
+        max_wait = float(settings.get("max_wait", 0))
+
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.setdefault((endpoint, account), _Bucket())
+            stats = self._stats.setdefault(endpoint, _Stats())
+            go_at = bucket.slot(now, interval, burst)
+            wait = go_at - now
+            allowed = max_wait if deadline is None else min(max_wait, deadline - now)
+            if wait > 0 and (bucket.waiting >= max_queue or wait > allowed):
+                stats.rejected += 1
+                raise RateLimited(endpoint, wait)
+            bucket.reserve(now, interval)
+            stats.admitted += 1
+            if wait > 0:
+                bucket.waiting += 1
+
+        if wait > 0:
+            try:
+                time.sleep(wait)
+            finally:
+                with self._lock:
+                    bucket.waiting -= 1
+        with self._lock:
+            stats.waits.append(max(0.0, wait))
+        return max(0.0, wait)
+
+    def metrics(self):
+        """{endpoint: queued, admitted, rejected and wait percentiles in ms}."""
+        with self._lock:
+            queued = {}
+            for (endpoint, _), bucket in self._buckets.items():
+                queued[endpoint] = queued.get(endpoint, 0) + bucket.waiting
+            return {
+                endpoint: {
+                    "queued": queued.get(endpoint, 0),
+                    "admitted": stats.admitted,
+                    "rejected": stats.rejected,
+                    "wait_p50_ms": _percentile(list(stats.waits), 0.5),
+                    "wait_p95_ms": _percentile(list(stats.waits), 0.95),
+                    "wait_max_ms": _percentile(list(stats.waits), 1.0),
+                }
+                for endpoint, stats in sorted(self._stats.items())
+            }
+
+
+# Process-wide instance
+limiter = RateLimiter()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Background room-status poller.
+
+Every stream record keeps the room_id (and upstream_stream_id) TikTok gave
+its room. One poller per process asks TikTok which of the active rooms are
+still alive, many rooms per request, over a single pooled session, and
+writes the answer back into the records:
+
+    room_state       'live' or 'offline'
+    room_checked_at  when the state last changed (or was first seen)
+
+A room that went from live to offline has been closed upstream (by TikTok,
+the app or another client), so its record is marked ended with
+ended_reason 'room_closed'.
+
+Intervals adapt per room: a room is checked every FAST_INTERVAL for
+FAST_PERIOD after it is created, then each check that finds the same state
+doubles its interval up to MAX_INTERVAL; a change drops it back to
+FAST_INTERVAL. Requests per pass are capped at MAX_REQUESTS_PER_PASS, so
+upstream volume stays bounded however many records there are; rooms that
+don't fit are simply checked on a later pass.
+"""
+import threading
+import time
+
+from cache import session_pool
+
+STATUS_URL = "https://webcast.tiktok.com/webcast/room/check_alive/"
+STATUS_PARAMS = {"aid": "1988", "app_language": "en", "device_platform": "web_pc"}
+STATUS_TIMEOUT = (5, 10)
+# Pool key of the poller's session; it isn't tied to an account
+SESSION_KEY = ".room-status"
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+)
+
+BATCH_SIZE = 50
+MAX_REQUESTS_PER_PASS = 4
+FAST_INTERVAL = 10
+FAST_PERIOD = 120
+MAX_INTERVAL = 300
+# Longest the poller sleeps, so new records are picked up reasonably soon
+IDLE_WAIT = 30
+
+LIVE, OFFLINE = "live", "offline"
+
+
+def check_alive(session, room_ids):
+    """Return {room_id: True/False} for the room_ids TikTok answered for.
+
+    Raises on transport errors; rooms missing from the answer are left out.
+    """
+    response = session.get(
+        STATUS_URL,
+        params=dict(STATUS_PARAMS, room_ids=",".join(room_ids)),
+        headers={"user-agent": USER_AGENT},
+        timeout=STATUS_TIMEOUT
+    )
+    response.raise_for_status()
+    data = response.json().get("data")
+    alive = {}
+    if isinstance(data, list):
+        for item in data:
+            if not isinstance(item, dict):
+                continue
+            room_id = str(item.get("room_id_str") or item.get("room_id") or "")
+            if room_id:
+                alive[room_id] = bool(item.get("alive"))
+    return alive
+
+
+class _Room:
+    def __init__(self, created_at, state):
+        self.created_at = created_at
+        self.state = state
+        self.interval = FAST_INTERVAL
+        self.due_at = 0.0
+
+
+class RoomPoller:
+    """Keeps room_state of active stream records in step with TikTok."""
+
+    def __init__(self, batch_size=BATCH_SIZE, max_requests=MAX_REQUESTS_PER_PASS,
+                 fast_interval=FAST_INTERVAL, fast_period=FAST_PERIOD,
+                 max_interval=MAX_INTERVAL, idle_wait=IDLE_WAIT):
+        self.batch_size = batch_size
+        self.max_requests = max_requests
+        self.fast_interval = fast_interval
+        self.fast_period = fast_period
+        self.max_interval = max_interval
+        self.idle_wait = idle_wait
+        self._lock = threading.Lock()
+        self._rooms = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.requests_sent = 0
+
+    def _sync(self, records):
+        """Track the active records' rooms; returns {room_id: record}."""
+        active = {}
+        for record in records:
+            room_id = record.get("room_id")
+            if room_id and record.get("status") != "ended":
+                active[str(room_id)] = record
+        with self._lock:
+            for room_id in list(self._rooms):
+                if room_id not in active:
+                    del self._rooms[room_id]
+            for room_id, record in active.items():
+                if room_id not in self._rooms:
+                    self._rooms[room_id] = _Room(record.get("created_at", time.time()), record.get("room_state"))
+        return active
+
+    def _next_interval(self, room, changed, now):
+        if changed or now - room.created_at < self.fast_period:
+            return self.fast_interval
+        return min(room.interval * 2, self.max_interval)
+
+    def poll(self, records, update_record, session=None):
+        """Run one pass over records; returns seconds until the next room is due.
+
+        update_record(stream_id, **changes) persists a state change.
+        """
+        active = self._sync(records)
+        now = time.time()
+        with self._lock:
+            due = sorted((room.due_at, room_id) for room_id, room in self._rooms.items() if room.due_at <= now)
+        due_ids = [room_id for _, room_id in due][:self.batch_size * self.max_requests]
+
+        if due_ids:
+            pooled = None
+            if session is None:
+                session, pooled = session_pool.acquire(SESSION_KEY)
+            try:
+                for start in range(0, len(due_ids), self.batch_size):
+                    batch = due_ids[start:start + self.batch_size]
+                    try:
+                        alive = check_alive(session, batch)
+                    except Exception as e:
+                        print(f"Room status check failed: {e}")
+                        self._postpone(batch, time.time())
+                        continue
+                    finally:
+                        self.requests_sent += 1
+                    self._apply(batch, alive, active, update_record)
+            finally:
+                if pooled is not None:
+                    session_pool.release(session, pooled)
+
+        with self._lock:
+            if not self._rooms:
+                return self.idle_wait
+            next_due = min(room.due_at for room in self._rooms.values())
+        return max(0.0, min(next_due - time.time(), self.idle_wait))
+
+    def _postpone(self, room_ids, now):
+        with self._lock:
+            for room_id in room_ids:
+                room = self._rooms.get(room_id)
+                if room is not None:
+                    room.interval = min(room.interval * 2, self.max_interval)
+                    room.due_at = now + room.interval
+
+    def _apply(self, batch, alive, active, update_record):
+        now = time.time()
+        for room_id in batch:
+            with self._lock:
+                room = self._rooms.get(room_id)
+            if room is None:
+                continue
+            if room_id not in alive:
+                # TikTok didn't answer for it; try again later
+                self._postpone([room_id], now)
+                continue
+            state = LIVE if alive[room_id] else OFFLINE
+            changed = state != room.state
+            record = active[room_id]
+            if changed:
+                changes = {"room_state": state, "room_checked_at": now}
+                if room.state == LIVE and state == OFFLINE:
+                    changes.update(status="ended", ended_at=now, ended_reason="room_closed",
+                                   duration=round(now - record.get("created_at", now), 1))
+                try:
+                    update_record(record["id"], **changes)
+                except OSError as e:
+                    print(f"Warning: could not update stream record {record['id']}: {e}")
+            with self._lock:
+                room.state = state
+                room.interval = self._next_interval(room, changed, now)
+                room.due_at = now + room.interval
+
+    def watch(self):
+        """Wake the poller so a newly created room is checked right away."""
+        self._wake.set()
+
+    def _run(self, list_records, update_record):
+        while True:
+            try:
+                wait = self.poll(list_records(), update_record)
+            except Exception as e:
+                print(f"Room status poll failed: {e}")
+                wait = self.idle_wait
+            self._wake.wait(wait)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+
+    def start(self, list_records, update_record):
+        """Poll the rooms of list_records() in the background."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(list_records, update_record),
+                                            name="room-status", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+
+# Process-wide instance
+poller = RoomPoller()
@@ -0,0 +1,603 @@
+#!/usr/bin/env python3
+"""Minimal RTMP: a local ingest sink and a pre-flight ingest probe.
+
+Implements just enough of RTMP for ffmpeg to publish: the plain
+(unencrypted) handshake, chunk stream reassembly, and the AMF0 command
+exchange for connect / createStream / publish.
+
+RTMPSink is the server side, used as a stand-in ingest for benchmarks and
+tests. Media messages are counted and, optionally, written out as an FLV
+file. Nothing is played back.
+
+    sink = RTMPSink()
+    sink.start()
+    url = sink.url("live/bench")   # rtmp://127.0.0.1:<port>/live/bench
+    ...
+    sink.stop()
+
+probe_ingest() is the client side: it walks a push URL through DNS, TCP
+connect, handshake, connect and (optionally) publish without sending any
+media, so a bad URL is reported before an encoder is started.
+"""
+import os
+import socket
+import socketserver
+import ssl
+import struct
+import threading
+import time
+from urllib.parse import urlsplit
+
+HANDSHAKE_SIZE = 1536
+PROBE_TIMEOUT = 5
+DEFAULT_CHUNK_SIZE = 128
+OUT_CHUNK_SIZE = 4096
+WINDOW_ACK_SIZE = 2500000
+
+MSG_SET_CHUNK_SIZE = 1
+MSG_ACK = 3
+MSG_USER_CONTROL = 4
+MSG_WINDOW_ACK_SIZE = 5
+MSG_SET_PEER_BANDWIDTH = 6
+MSG_AUDIO = 8
+MSG_VIDEO = 9
+MSG_DATA_AMF0 = 18
+MSG_COMMAND_AMF0 = 20
+
+MEDIA_TYPES = (MSG_AUDIO, MSG_VIDEO, MSG_DATA_AMF0)
+
+
+class RTMPError(Exception):
+    pass
+
+
+# AMF0
+
+def amf0_encode(value):
+    if value is None:
+        return b'\x05'
+    if isinstance(value, bool):
+        return b'\x01' + (b'\x01' if value else b'\x00')
+    if isinstance(value, (int, float)):
+        return b'\x00' + struct.pack('>d', value)
+    if isinstance(value, str):
+        data = value.encode('utf-8')
+        return b'\x02' + struct.pack('>H', len(data)) + data
+    if isinstance(value, dict):
+        out = b'\x03'
+        for key, item in value.items():
+            name = key.encode('utf-8')
+            out += struct.pack('>H', len(name)) + name + amf0_encode(item)
+        return out + b'\x00\x00\x09'
+    raise TypeError(f"Cannot AMF0-encode {type(value).__name__}")
+
+
+def _amf0_string(data, pos):
+    size = struct.unpack_from('>H', data, pos)[0]
+    pos += 2
+    return data[pos:pos + size].decode('utf-8', 'replace'), pos + size
+
+
+def _amf0_object(data, pos):
+    obj = {}
+    while pos + 3 <= len(data):
+        if data[pos:pos + 3] == b'\x00\x00\x09':
+            return obj, pos + 3
+        key, pos = _amf0_string(data, pos)
+        obj[key], pos = _amf0_value(data, pos)
+    return obj, pos
+
+
+def _amf0_value(data, pos):
+    marker = data[pos]
+    pos += 1
+    if marker == 0x00:
+        return struct.unpack_from('>d', data, pos)[0], pos + 8
+    if marker == 0x01:
+        return data[pos] != 0, pos + 1
+    if marker == 0x02:
+        return _amf0_string(data, pos)
+    if marker == 0x03:
+        return _amf0_object(data, pos)
+    if marker in (0x05, 0x06):
+        return None, pos
+    if marker == 0x08:
+        # ECMA array: a count followed by an object body
+        return _amf0_object(data, pos + 4)
+    if marker == 0x0A:
+        count = struct.unpack_from('>I', data, pos)[0]
+        pos += 4
+        items = []
+        for _ in range(count):
+            item, pos = _amf0_value(data, pos)
+            items.append(item)
+        return items, pos
+    raise RTMPError(f"Unsupported AMF0 marker 0x{marker:02x}")
+
+
+def amf0_decode(data):
+    """Decode all AMF0 values in data."""
+    values = []
+    pos = 0
+    while pos < len(data):
+        value, pos = _amf0_value(data, pos)
+        values.append(value)
+    return values
+
+
+# Chunk streams
+
+class _ChunkStream:
+    def __init__(self):
+        self.timestamp = 0
+        self.delta = 0
+        self.length = 0
+        self.type_id = 0
+        self.stream_id = 0
+        self.extended = False
+        self.buffer = b''
+
+
+class ChunkReader:
+    """Reassembles RTMP messages from chunks; read(size) supplies the bytes."""
+
+    def __init__(self, read):
+        self.read = read
+        self.chunk_size = DEFAULT_CHUNK_SIZE
+        self.streams = {}
+
+    def read_message(self):
+        """Read one chunk; return (type_id, stream_id, timestamp, payload) when a message completes."""
+        read = self.read
+        first = read(1)[0]
+        fmt = first >> 6
+        csid = first & 0x3F
+        if csid == 0:
+            csid = 64 + read(1)[0]
+        elif csid == 1:
+            low, high = read(2)
+            csid = 64 + low + high * 256
+        cs = self.streams.setdefault(csid, _ChunkStream())
+
+        if fmt < 3:
+            header = read((11, 7, 3)[fmt])
+            timestamp = int.from_bytes(header[0:3], 'big')
+            if fmt < 2:
+                cs.length = int.from_bytes(header[3:6], 'big')
+                cs.type_id = header[6]
+            if fmt == 0:
+                cs.stream_id = struct.unpack('<I', header[7:11])[0]
+            cs.extended = timestamp == 0xFFFFFF
+            if cs.extended:
+                timestamp = struct.unpack('>I', read(4))[0]
+            if not cs.buffer:
+                if fmt == 0:
+                    cs.timestamp, cs.delta = timestamp, 0
+                else:
+                    cs.timestamp, cs.delta = cs.timestamp + timestamp, timestamp
+        else:
+            if cs.extended:
+                read(4)
+            if not cs.buffer:
+                cs.timestamp += cs.delta
+
+        size = min(self.chunk_size, cs.length - len(cs.buffer))
+        cs.buffer += read(size)
+        if len(cs.buffer) < cs.length:
+            return None
+        payload, cs.buffer = cs.buffer, b''
+        if cs.type_id == MSG_SET_CHUNK_SIZE:
+            self.chunk_size = struct.unpack('>I', payload[:4])[0] & 0x7FFFFFFF
+        return cs.type_id, cs.stream_id, cs.timestamp, payload
+
+
+def encode_message(csid, type_id, payload, stream_id=0, timestamp=0, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Encode one message as a type 0 chunk followed by type 3 continuations."""
+    header = bytes([csid]) + timestamp.to_bytes(3, 'big') + len(payload).to_bytes(3, 'big')
+    header += bytes([type_id]) + struct.pack('<I', stream_id)
+    chunks = [header + payload[:chunk_size]]
+    for pos in range(chunk_size, len(payload), chunk_size):
+        chunks.append(bytes([0xC0 | csid]) + payload[pos:pos + chunk_size])
+    return b''.join(chunks)
+
+
+def encode_command(*values, stream_id=0, chunk_size=DEFAULT_CHUNK_SIZE):
+    payload = b''.join(amf0_encode(v) for v in values)
+    return encode_message(3, MSG_COMMAND_AMF0, payload, stream_id, chunk_size=chunk_size)
+
+
+# Server side
+
+class _Connection(socketserver.BaseRequestHandler):
+    def setup(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.request.makefile('rb')
+        self.chunks = ChunkReader(self._read)
+        self.publishing = None
+
+    def _read(self, size):
+        sink = self.server.sink
+        data = self.reader.read(size)
+        if len(data) < size:
+            raise EOFError
+        sink.bytes_received += size
+        if sink.max_rate:
+            # Emulate a slow ingest by pacing our reads
+            time.sleep(size / sink.max_rate)
+        return data
+
+    def handle(self):
+        try:
+            self._handshake()
+            while True:
+                message = self.chunks.read_message()
+                if message is not None:
+                    self._on_message(*message)
+        except (EOFError, ConnectionError, OSError):
+            pass
+        except RTMPError as e:
+            print(f"RTMP sink: {e}")
+
+    def _handshake(self):
+        c0 = self._read(1)
+        if c0 != b'\x03':
+            raise RTMPError(f"Unsupported RTMP version {c0[0]}")
+        c1 = self._read(HANDSHAKE_SIZE)
+        s1 = struct.pack('>II', int(time.time()) & 0xFFFFFFFF, 0) + bytes(HANDSHAKE_SIZE - 8)
+        self.request.sendall(b'\x03' + s1 + c1)
+        self._read(HANDSHAKE_SIZE)
+
+    def _send(self, csid, type_id, payload, stream_id=0):
+        self.request.sendall(encode_message(csid, type_id, payload, stream_id))
+
+    def _send_command(self, *values, stream_id=0):
+        self.request.sendall(encode_command(*values, stream_id=stream_id, chunk_size=OUT_CHUNK_SIZE))
+
+    def _on_message(self, type_id, stream_id, timestamp, payload):
+        if type_id in MEDIA_TYPES:
+            self.server.sink._on_media(self, type_id, timestamp, payload)
+        elif type_id == MSG_COMMAND_AMF0:
+            self._on_command(stream_id, amf0_decode(payload))
+
+    def _on_command(self, stream_id, values):
+        if not values:
+            return
+        name = values[0]
+        transaction = values[1] if len(values) > 1 else 0
+        if name == 'connect':
+            self._send(2, MSG_WINDOW_ACK_SIZE, struct.pack('>I', WINDOW_ACK_SIZE))
+            self._send(2, MSG_SET_PEER_BANDWIDTH, struct.pack('>IB', WINDOW_ACK_SIZE, 2))
+            self._send(2, MSG_SET_CHUNK_SIZE, struct.pack('>I', OUT_CHUNK_SIZE))
+            self._send_command(
+                '_result', transaction,
+                {'fmsVer': 'FMS/3,0,1,123', 'capabilities': 31},
+                {'level': 'status', 'code': 'NetConnection.Connect.Success',
+                 'description': 'Connection succeeded.', 'objectEncoding': 0}
+            )
+        elif name == 'createStream':
+            self._send_command('_result', transaction, None, 1)
+        elif name in ('releaseStream', 'FCPublish'):
+            self._send_command('_result', transaction, None, None)
+        elif name == 'publish':
+            name = values[3] if len(values) > 3 else ''
+            if not self.server.sink._on_publish(self, name):
+                self._send_command(
+                    'onStatus', 0, None,
+                    {'level': 'error', 'code': 'NetStream.Publish.BadName',
+                     'description': f'{name} is not accepted.'},
+                    stream_id=stream_id or 1
+                )
+                return
+            self.publishing = name
+            self._send_command(
+                'onStatus', 0, None,
+                {'level': 'status', 'code': 'NetStream.Publish.Start',
+                 'description': f'{name} is now published.'},
+                stream_id=stream_id or 1
+            )
+
+
+# Client side
+
+PROBE_STAGES = ('dns', 'tcp', 'handshake', 'connect', 'publish')
+
+
+def _await_command(chunks, names, transaction=None):
+    """Read messages until a command named in names (and transaction) arrives."""
+    while True:
+        message = chunks.read_message()
+        if message is None or message[0] != MSG_COMMAND_AMF0:
+            continue
+        values = amf0_decode(message[3])
+        if values and values[0] in names and (transaction is None or values[1:2] == [transaction]):
+            return values
+
+
+def _status(values):
+    """Return (code, description) from a command's info object."""
+    info = next((v for v in reversed(values) if isinstance(v, dict)), {})
+    return info.get('code', ''), info.get('description', '')
+
+
+def _client_handshake(sock, read):
+    c1 = struct.pack('>II', 0, 0) + os.urandom(HANDSHAKE_SIZE - 8)
+    sock.sendall(b'\x03' + c1)
+    s0 = read(1)
+    if s0 != b'\x03':
+        raise RTMPError(f"unsupported RTMP version {s0[0]}")
+    s1 = read(HANDSHAKE_SIZE)
+    sock.sendall(s1)
+    read(HANDSHAKE_SIZE)
+
+
+def _client_connect(sock, chunks, tc_url):
+    sock.sendall(encode_command('connect', 1, {
+        'app': urlsplit(tc_url).path.strip('/'),
+        'type': 'nonprivate',
+        'flashVer': 'FMLE/3.0 (compatible; FMSc/1.0)',
+        'tcUrl': tc_url,
+    }))
+    values = _await_command(chunks, ('_result', '_error'), 1)
+    if values[0] == '_error':
+        code, description = _status(values)
+        raise RTMPError(f"{code}: {description}" if code else "connect rejected")
+
+
+def _reader(sock, deadline=None):
+    reader = sock.makefile('rb')
+
+    def read(size):
+        if deadline is not None:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise socket.timeout("timed out")
+            sock.settimeout(left)
+        data = reader.read(size)
+        if len(data) < size:
+            raise ConnectionError("ingest closed the connection")
+        return data
+    return read
+
+
+def connect_ingest(tc_url, timeout=PROBE_TIMEOUT):
+    """Return a socket to tc_url's ingest after the handshake and connect."""
+    parts = urlsplit(tc_url)
+    secure = parts.scheme == 'rtmps'
+    if parts.scheme not in ('rtmp', 'rtmps') or not parts.hostname:
+        raise RTMPError(f"Not an RTMP URL: {tc_url}")
+    sock = socket.create_connection((parts.hostname, parts.port or (443 if secure else 1935)), timeout=timeout)
+    try:
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parts.hostname)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        read = _reader(sock, time.monotonic() + timeout)
+        _client_handshake(sock, read)
+        _client_connect(sock, ChunkReader(read), tc_url)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+def probe_ingest(tc_url, stream_name, timeout=PROBE_TIMEOUT, publish=True):
+    """Check that an RTMP ingest accepts tc_url and, optionally, a publish of stream_name.
+
+    Returns a dict with 'ok', the failed 'stage' and 'error' (if any), and
+    the time spent in each stage ('dns_ms', 'tcp_ms', 'handshake_ms',
+    'connect_ms', 'publish_ms'). 'rtt_ms' is the TCP connect time, a
+    one-round-trip measurement of ingest latency.
+    """
+    parts = urlsplit(tc_url)
+    secure = parts.scheme == 'rtmps'
+    host = parts.hostname
+    port = parts.port or (443 if secure else 1935)
+    result = {'ok': False, 'stage': None, 'error': None, 'host': host, 'port': port, 'rtt_ms': None}
+    if parts.scheme not in ('rtmp', 'rtmps') or not host:
+        result.update(stage='dns', error=f"Not an RTMP URL: {tc_url}")
+        return result
+
+    deadline = time.monotonic() + timeout
+    sock = None
+    stage = 'dns'
+    mark = time.monotonic()
+
+    def lap(name):
+        nonlocal mark
+        now = time.monotonic()
+        result[f"{name}_ms"] = round((now - mark) * 1000, 1)
+        mark = now
+
+    def remaining():
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise socket.timeout("timed out")
+        return left
+    try:
+        address = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)[0]
+        result['address'] = address[4][0]
+        lap('dns')
+
+        stage = 'tcp'
+        sock = socket.socket(address[0], socket.SOCK_STREAM)
+        sock.settimeout(remaining())
+        sock.connect(address[4])
+        lap('tcp')
+        result['rtt_ms'] = result['tcp_ms']
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+            lap('tls')
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        read = _reader(sock, deadline)
+
+        stage = 'handshake'
+        _client_handshake(sock, read)
+        lap('handshake')
+
+        stage = 'connect'
+        chunks = ChunkReader(read)
+        _client_connect(sock, chunks, tc_url)
+        lap('connect')
+
+        if publish:
+            stage = 'publish'
+            sock.sendall(encode_command('releaseStream', 2, None, stream_name))
+            sock.sendall(encode_command('FCPublish', 3, None, stream_name))
+            sock.sendall(encode_command('createStream', 4, None))
+            values = _await_command(chunks, ('_result', '_error'), 4)
+            if values[0] == '_error' or not isinstance(values[-1], float):
+                code, description = _status(values)
+                raise RTMPError(f"createStream failed: {code or description or 'rejected'}")
+            stream_id = int(values[-1])
+            sock.sendall(encode_command('publish', 5, None, stream_name, 'live', stream_id=stream_id))
+            code, description = _status(_await_command(chunks, ('onStatus', '_error')))
+            if code != 'NetStream.Publish.Start':
+                raise RTMPError(f"{code}: {description}" if code else "publish rejected")
+            lap('publish')
+            # Release the stream key before the real push claims it
+            sock.sendall(encode_command('FCUnpublish', 6, None, stream_name))
+            sock.sendall(encode_command('deleteStream', 7, None, stream_id))
+
+        result['ok'] = True
+    except socket.gaierror as e:
+        result.update(stage=stage, error=f"cannot resolve {host}: {e.strerror or e}")
+    except socket.timeout:
+        result.update(stage=stage, error=f"timed out after {timeout}s")
+    except (OSError, EOFError, RTMPError, ValueError, IndexError, struct.error) as e:
+        result.update(stage=stage, error=str(e) or type(e).__name__)
+    finally:
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+    return result
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    receive_buffer = None
+
+    def server_bind(self):
+        if self.receive_buffer:
+            # Set before listen() so accepted sockets advertise a small window
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer)
+        super().server_bind()
+
+
+class RTMPSink:
+    """A local RTMP server that accepts publishes and discards (or records) them.
+
+    max_rate limits how fast the sink reads, in bytes per second, to emulate
+    a slow ingest. record_path, if set, receives the published stream as FLV.
+    accept(name), if given, decides whether a publish of stream name is
+    allowed; rejected publishes get NetStream.Publish.BadName.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, max_rate=None, record_path=None, accept=None):
+        self.host = host
+        self.port = port
+        self.max_rate = max_rate
+        self.record_path = record_path
+        self.accept = accept
+        self.bytes_received = 0
+        self.media_bytes = 0
+        self.messages = 0
+        self.publishes = []
+        self.connections = 0
+        self._server = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._record = None
+
+    def start(self):
+        self._server = _Server((self.host, self.port), _Connection, bind_and_activate=False)
+        if self.max_rate:
+            # Keep kernel buffering small next to the emulated link rate
+            self._server.receive_buffer = max(4096, self.max_rate // 10)
+        try:
+            self._server.server_bind()
+            self._server.server_activate()
+        except OSError:
+            self._server.server_close()
+            raise
+        self._server.sink = self
+        self.port = self._server.server_address[1]
+        if self.record_path:
+            self._record = open(self.record_path, 'wb')
+            self._record.write(b'FLV\x01\x05\x00\x00\x00\x09\x00\x00\x00\x00')
+        self._thread = threading.Thread(target=self._server.serve_forever, name="rtmp-sink", daemon=True)
+        self._thread.start()
+        return self
+
+    def url(self, path='live/sink'):
+        return f"rtmp://{self.host}:{self.port}/{path}"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        with self._lock:
+            if self._record is not None:
+                self._record.close()
+                self._record = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _on_publish(self, connection, name):
+        if self.accept is not None and not self.accept(name):
+            return False
+        with self._lock:
+            self.connections += 1
+            self.publishes.append(name)
+        return True
+
+    def _on_media(self, connection, type_id, timestamp, payload):
+        with self._lock:
+            self.messages += 1
+            self.media_bytes += len(payload)
+            if self._record is not None:
+                tag = bytes([type_id]) + len(payload).to_bytes(3, 'big')
+                tag += (timestamp & 0xFFFFFF).to_bytes(3, 'big') + bytes([(timestamp >> 24) & 0xFF])
+                tag += b'\x00\x00\x00' + payload
+                self._record.write(tag + struct.pack('>I', len(tag)))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'bytes_received': self.bytes_received,
+                'media_bytes': self.media_bytes,
+                'messages': self.messages,
+                'publishes': list(self.publishes),
+            }
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Local RTMP sink that accepts and discards publishes")
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=1935, help='Port to listen on (default: 1935)')
+    parser.add_argument('--max-rate', type=int, help='Read at most this many bytes per second')
+    parser.add_argument('--record', help='Write the published stream to this FLV file')
+    args = parser.parse_args()
+
+    sink = RTMPSink(args.host, args.port, args.max_rate, args.record).start()
+    print(f"RTMP sink listening on {sink.url('live/<key>')}")
+    try:
+        while True:
+            time.sleep(5)
+            stats = sink.stats()
+            print(f"received {stats['bytes_received']} bytes, {stats['messages']} media messages")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""Scheduled go-live with a warm-up phase ahead of the start time.
+
+Jobs live in schedule.json and survive restarts. The scheduler runs inside
+the daemon and the web app (see app.start_background_services). Each job
+goes through:
+
+    pending -> warming -> running -> done
+                                  -> failed
+    pending -> cancelled / missed
+
+`lead` seconds before run_at (DEFAULT_LEAD unless the job says otherwise)
+the job is claimed and warmed up by the warm callback: the account is
+checked, the session's connections are opened, the Live Studio version
+and webcast hosts are looked up, the thumbnail is uploaded into the
+upload cache, and the input is staged (see inputfeed.py) and probed. The
+encoder is primed last, at PRIME_LEAD seconds before run_at, because a
+file input is consumed while the encoder runs.
+
+At run_at only the fire callback's room-create call and push start are
+left. A job is claimed under the schedule file's lock, so a daemon and a
+web app sharing the directory never run the same job twice. A job whose
+start time passed more than MISFIRE_GRACE ago while nothing was running is
+marked missed instead of starting late.
+
+    python3 app.py --title "Friday show" --topic Gaming --game Minecraft \\
+        --go-live show.mp4 --schedule 2025-01-31T20:00 --lead 300
+    python3 app.py --list-schedule
+    python3 app.py --cancel-schedule 3f2a9c1b
+"""
+import os
+import re
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+
+import storage
+
+SCHEDULE_FILE = "schedule.json"
+DEFAULT_LEAD = 120
+# The encoder starts this long before run_at (at most `lead`)
+PRIME_LEAD = 10
+# A job this late is started anyway; later than that it is missed
+MISFIRE_GRACE = 60
+# How often other processes' changes to schedule.json are picked up
+POLL_INTERVAL = 5
+
+PENDING, WARMING, RUNNING = "pending", "warming", "running"
+DONE, FAILED, CANCELLED, MISSED = "done", "failed", "cancelled", "missed"
+ACTIVE = (PENDING, WARMING, RUNNING)
+
+_RELATIVE = re.compile(r"^\+(\d+(?:\.\d+)?)([smhd])$")
+_CLOCK = re.compile(r"^(\d{1,2}):(\d{2})$")
+
+
+def parse_when(value, now=None):
+    """Parse '+10m' / '+2h', 'HH:MM' (next occurrence) or ISO 8601 to epoch seconds."""
+    value = value.strip()
+    now = time.time() if now is None else now
+    match = _RELATIVE.match(value)
+    if match:
+        return now + float(match.group(1)) * {"s": 1, "m": 60, "h": 3600, "d": 86400}[match.group(2)]
+    match = _CLOCK.match(value)
+    if match:
+        today = datetime.fromtimestamp(now)
+        at = today.replace(hour=int(match.group(1)), minute=int(match.group(2)), second=0, microsecond=0)
+        if at.timestamp() <= now:
+            at += timedelta(days=1)
+        return at.timestamp()
+    return datetime.fromisoformat(value).timestamp()
+
+
+def _pid_alive(pid):
+    from push_watchdog import pid_alive
+    return pid_alive(pid)
+
+
+class Scheduler:
+    """Persistent schedule of go-live jobs, warmed up ahead of time."""
+
+    def __init__(self, path=SCHEDULE_FILE, default_lead=DEFAULT_LEAD, prime_lead=PRIME_LEAD,
+                 misfire_grace=MISFIRE_GRACE, poll_interval=POLL_INTERVAL):
+        self.path = path
+        self.default_lead = default_lead
+        self.prime_lead = prime_lead
+        self.misfire_grace = misfire_grace
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._running = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._callbacks = None
+
+    # Store
+
+    def _load(self):
+        try:
+            data = storage.read_json(self.path)
+        except (FileNotFoundError, ValueError):
+            return {}
+        jobs = data.get("jobs") if isinstance(data, dict) else None
+        return jobs if isinstance(jobs, dict) else {}
+
+    def _modify(self, func):
+        """Apply func(jobs) under the file lock; returns what func returns."""
+        result = {}
+
+        def apply(data):
+            if not isinstance(data, dict) or not isinstance(data.get("jobs"), dict):
+                data = {"jobs": {}}
+            result["value"] = func(data["jobs"])
+            return data
+
+        storage.update_json(self.path, apply, default={"jobs": {}})
+        return result.get("value")
+
+    def _update(self, job_id, **changes):
+        def apply(jobs):
+            if job_id in jobs:
+                jobs[job_id].update(changes)
+                return dict(jobs[job_id])
+        return self._modify(apply)
+
+    def jobs(self):
+        """All jobs, soonest first."""
+        return sorted(self._load().values(), key=lambda j: j.get("run_at", 0))
+
+    def get(self, job_id):
+        return self._load().get(job_id)
+
+    def add(self, run_at, account, options, input_source=None, lead=None, ffmpeg_path=None):
+        """Schedule a go-live at run_at (epoch seconds); returns the job."""
+        if run_at <= time.time():
+            raise ValueError("The start time is in the past")
+        job = {
+            "id": secrets.token_hex(4),
+            "run_at": run_at,
+            "lead": float(self.default_lead if lead is None else lead),
+            "account": account,
+            "options": dict(options),
+            "input_source": input_source or None,
+            "ffmpeg_path": ffmpeg_path or None,
+            "status": PENDING,
+            "created_at": time.time(),
+        }
+
+        def apply(jobs):
+            jobs[job["id"]] = job
+        self._modify(apply)
+        self._wake.set()
+        return job
+
+    def cancel(self, job_id):
+        """Cancel a job that hasn't started; returns it, or None if it can't be."""
+        def apply(jobs):
+            job = jobs.get(job_id)
+            if job is None or job["status"] not in (PENDING, WARMING):
+                return None
+            job.update(status=CANCELLED, cancelled_at=time.time())
+            return dict(job)
+        job = self._modify(apply)
+        if job is not None:
+            self._wake.set()
+        return job
+
+    def busy(self):
+        """True while a job is pending or in progress (keeps the daemon up)."""
+        return any(job.get("status") in ACTIVE for job in self._load().values())
+
+    # Execution
+
+    def _claim(self, job_id):
+        """Move a pending job to warming for this process; False if taken."""
+        def apply(jobs):
+            job = jobs.get(job_id)
+            if job is None or job["status"] != PENDING:
+                return False
+            job.update(status=WARMING, owner_pid=os.getpid(), warm_started_at=time.time())
+            return True
+        return self._modify(apply)
+
+    def _recover(self):
+        """Release jobs held by processes that died; mark overdue ones missed."""
+        now = time.time()
+
+        def apply(jobs):
+            for job in jobs.values():
+                if job["status"] in (WARMING, RUNNING) and job.get("owner_pid") != os.getpid() \
+                        and _pid_alive(job.get("owner_pid")) is False:
+                    if job["status"] == WARMING:
+                        job["status"] = PENDING
+                    else:
+                        job.update(status=FAILED, error="The process running this job exited")
+                if job["status"] == PENDING and job["run_at"] < now - self.misfire_grace:
+                    job.update(status=MISSED, missed_at=now)
+        self._modify(apply)
+
+    def wait_until(self, deadline):
+        """Sleep until deadline (epoch); returns False if the scheduler stopped."""
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return True
+            # Coarse waits first, then short ones to land on the second
+            if self._stop.wait(remaining - 0.05 if remaining > 0.1 else remaining):
+                return False
+
+    def _execute(self, job):
+        warm, fire, release = self._callbacks
+        job_id = job["id"]
+        state = None
+        try:
+            started = time.monotonic()
+            prime_at = job["run_at"] - min(self.prime_lead, job["lead"])
+            state, metrics = warm(job, prime_at)
+            self._update(job_id, warm_ms=round((time.monotonic() - started) * 1000, 1),
+                         warm_metrics=metrics, warmed_at=time.time())
+
+            if not self.wait_until(job["run_at"]):
+                release(state)
+                self._update(job_id, status=PENDING)
+                return
+            current = self.get(job_id)
+            if current is None or current["status"] != WARMING:
+                release(state)
+                return
+
+            fired_at = time.time()
+            self._update(job_id, status=RUNNING, started_at=fired_at,
+                         late_ms=round((fired_at - job["run_at"]) * 1000, 1))
+            stream_data = fire(job, state)
+            self._update(job_id, status=DONE, stream_id=stream_data.get("id"),
+                         live_ms=round((time.time() - fired_at) * 1000, 1))
+        except Exception as e:
+            print(f"Scheduled job {job_id} failed: {e}")
+            if state is not None:
+                try:
+                    release(state)
+                except Exception:
+                    pass
+            self._update(job_id, status=FAILED, error=str(e), failed_at=time.time())
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+            self._wake.set()
+
+    def poll(self):
+        """Start warming the jobs that are due; returns seconds until the next one."""
+        now = time.time()
+        next_at = now + self.poll_interval
+        for job in self._load().values():
+            if job.get("status") != PENDING:
+                continue
+            warm_at = job["run_at"] - job.get("lead", self.default_lead)
+            if warm_at > now:
+                next_at = min(next_at, warm_at)
+                continue
+            if job["run_at"] < now - self.misfire_grace:
+                self._update(job["id"], status=MISSED, missed_at=now)
+                continue
+            with self._lock:
+                if job["id"] in self._running:
+                    continue
+            if not self._claim(job["id"]):
+                continue
+            thread = threading.Thread(target=self._execute, args=(job,), name=f"schedule-{job['id']}", daemon=True)
+            with self._lock:
+                self._running[job["id"]] = thread
+            thread.start()
+        return max(0.0, next_at - time.time())
+
+    def _run(self):
+        try:
+            self._recover()
+        except Exception as e:
+            print(f"Schedule recovery failed: {e}")
+        while not self._stop.is_set():
+            try:
+                wait = self.poll()
+            except Exception as e:
+                print(f"Schedule check failed: {e}")
+                wait = self.poll_interval
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def start(self, warm, fire, release):
+        """Run due jobs in the background.
+
+        warm(job, prime_at) -> (state, metrics) does the warm-up and primes
+        the encoder at prime_at; fire(job, state) -> stream record creates
+        the room and starts the push; release(state) undoes a warm-up that
+        won't be used.
+        """
+        if self._thread is None:
+            self._callbacks = (warm, fire, release)
+            self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+
+# Process-wide instance
+scheduler = Scheduler()
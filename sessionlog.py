@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""Bounded per-session capture of ffmpeg's log output.
+
+Each push session keeps its most recent log lines in a fixed-size ring
+buffer and appends them to logs/<session>.log. When that file exceeds a size
+cap it is rotated into gzip-compressed backups (<session>.log.1.gz, ...), of
+which only a fixed number are kept, so memory and disk use stay flat however
+long a push runs.
+
+ffmpeg's per-frame status lines ("frame=  123 fps= 30 ...") are recognised
+with a cheap prefix test and only the latest one is kept; they never reach
+the ring buffer or the disk unless the session logs at debug level.
+"""
+import gzip
+import os
+import shutil
+import threading
+import time
+from collections import deque
+
+LOG_DIR = "logs"
+RING_LINES = 500
+MAX_BYTES = 5 * 1024 * 1024
+BACKUPS = 5
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+LEVEL_NAMES = {value: name for name, value in LEVELS.items()}
+
+_ERROR_MARKERS = ("error", "failed", "invalid", "could not", "cannot", "unable to", "broken pipe")
+_WARNING_MARKERS = ("warning", "deprecated", "past duration", "non-monotonous", "discarding")
+
+
+def classify(line):
+    """Return the level of one ffmpeg log line."""
+    if line.startswith(("frame=", "size=")) or (line.startswith("video:") and "audio:" in line):
+        return DEBUG
+    lowered = line.lower()
+    if any(marker in lowered for marker in _ERROR_MARKERS):
+        return ERROR
+    if any(marker in lowered for marker in _WARNING_MARKERS):
+        return WARNING
+    return INFO
+
+
+class SessionLog:
+    """Ring buffer plus rotated on-disk log for one push session.
+
+    directory=None keeps the log in memory only.
+    """
+
+    def __init__(self, session_id, directory=LOG_DIR, level="info",
+                 ring_lines=RING_LINES, max_bytes=MAX_BYTES, backups=BACKUPS):
+        self.session_id = session_id
+        self.level = LEVELS[level] if isinstance(level, str) else level
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.last_status = None
+        self.dropped = 0
+        self._ring = deque(maxlen=ring_lines)
+        self._lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self.path = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.path = os.path.join(directory, f"{session_id}.log")
+            self._open()
+
+    def _open(self):
+        self._file = open(self.path, "a", encoding="utf-8", errors="replace")
+        self._size = self._file.tell()
+
+    def write(self, line, level=None):
+        """Record one line; returns its level so callers can filter echoing."""
+        if level is None:
+            level = classify(line)
+        if level < self.level:
+            if level == DEBUG:
+                self.last_status = line
+            self.dropped += 1
+            return level
+        now = time.time()
+        with self._lock:
+            self._ring.append((now, level, line))
+            if self._file is not None:
+                entry = f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now))} {LEVEL_NAMES[level].upper():7} {line}\n"
+                self._file.write(entry)
+                self._size += len(entry)
+                if level >= WARNING:
+                    self._file.flush()
+                if self._size >= self.max_bytes:
+                    self._rotate()
+        return level
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{i}.gz"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}.gz")
+        if self.backups > 0:
+            with open(self.path, "rb") as src, gzip.open(f"{self.path}.1.gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+        os.remove(self.path)
+        self._open()
+
+    def tail(self, lines=50):
+        """Return the last lines (newest last) held in memory."""
+        with self._lock:
+            recent = list(self._ring)[-lines:] if lines > 0 else []
+        return [line for _, _, line in recent]
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# Sessions logging in this process, by session id
+_active = {}
+_active_lock = threading.Lock()
+
+
+def open_session(session_id, directory=LOG_DIR, **options):
+    """Create a SessionLog and make it visible to tail()."""
+    log = SessionLog(session_id, directory, **options)
+    with _active_lock:
+        previous = _active.pop(session_id, None)
+        _active[session_id] = log
+    if previous is not None:
+        previous.close()
+    return log
+
+
+def close_session(session_id):
+    with _active_lock:
+        log = _active.pop(session_id, None)
+    if log is not None:
+        log.close()
+
+
+def _read_last_lines(path, lines, block_size=8192):
+    """Read the last lines of a text file without loading all of it."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b""
+        while position > 0 and data.count(b"\n") <= lines:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    return data.decode("utf-8", "replace").splitlines()[-lines:]
+
+
+def tail(session_id, lines=50, directory=LOG_DIR):
+    """Return the last lines of a session's log, from memory or from disk.
+
+    Lines read from disk carry their timestamp and level prefix. Returns
+    None when the session is unknown.
+    """
+    if not session_id.replace("-", "").replace("_", "").isalnum():
+        return None
+    with _active_lock:
+        log = _active.get(session_id)
+    if log is not None:
+        return log.tail(lines)
+    path = os.path.join(directory, f"{session_id}.log")
+    try:
+        return _read_last_lines(path, lines) if lines > 0 else []
+    except FileNotFoundError:
+        return None
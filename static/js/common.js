@@ -0,0 +1,77 @@
+// Helpers shared by every page: toast notifications, clipboard copy and
+// the dark mode toggle. Loaded before the page's own script.
+
+// Toast notification function
+function showToast(message, type = 'success') {
+    const toast = document.getElementById('toast');
+    const toastMessage = document.getElementById('toastMessage');
+    const toastIcon = document.getElementById('toastIcon');
+
+    toastMessage.textContent = message;
+
+    // Update icon based on type
+    toastIcon.className = type === 'success'
+        ? 'fas fa-check-circle text-green-400 text-xl'
+        : 'fas fa-exclamation-circle text-red-400 text-xl';
+
+    // Show toast
+    toast.classList.remove('translate-y-full');
+
+    // Hide after 3 seconds
+    setTimeout(() => {
+        toast.classList.add('translate-y-full');
+    }, 3000);
+}
+
+// Copy text to the clipboard and report it with a toast
+function copyText(text, type) {
+    // Modern browsers
+    if (navigator.clipboard) {
+        navigator.clipboard.writeText(text).then(() => {
+            showToast(`${type} copied to clipboard!`, 'success');
+        }).catch(err => {
+            console.error('Failed to copy: ', err);
+            // Fallback
+            fallbackCopyTextToClipboard(text, type);
+        });
+    } else {
+        // Fallback for older browsers
+        fallbackCopyTextToClipboard(text, type);
+    }
+}
+
+// Fallback copy method
+function fallbackCopyTextToClipboard(text, type) {
+    const textArea = document.createElement("textarea");
+    textArea.value = text;
+    textArea.style.position = "fixed";
+    textArea.style.left = "-999999px";
+    textArea.style.top = "-999999px";
+    document.body.appendChild(textArea);
+    textArea.focus();
+    textArea.select();
+
+    try {
+        const successful = document.execCommand('copy');
+        if (successful) {
+            showToast(`${type} copied to clipboard!`, 'success');
+        } else {
+            showToast('Failed to copy', 'error');
+        }
+    } catch (err) {
+        console.error('Fallback: Oops, unable to copy', err);
+        showToast('Failed to copy', 'error');
+    }
+
+    document.body.removeChild(textArea);
+}
+
+// Dark mode toggle (for future implementation)
+function bindDarkModeToggle() {
+    const darkModeToggle = document.getElementById('darkModeToggle');
+    if (darkModeToggle) {
+        darkModeToggle.addEventListener('click', function() {
+            document.documentElement.classList.toggle('dark');
+        });
+    }
+}
@@ -0,0 +1,129 @@
+// Dark mode functionality with localStorage persistence
+const darkModeToggle = document.getElementById('darkModeToggle');
+const darkModeIcon = document.getElementById('darkModeIcon');
+const htmlElement = document.documentElement;
+
+// Check for saved user preference or default to dark mode
+const currentMode = localStorage.getItem('darkMode') || 'dark';
+if (currentMode === 'dark') {
+    htmlElement.classList.add('dark');
+    htmlElement.classList.remove('light');
+    darkModeIcon.classList.remove('fa-sun');
+    darkModeIcon.classList.add('fa-moon');
+} else {
+    htmlElement.classList.remove('dark');
+    htmlElement.classList.add('light');
+    darkModeIcon.classList.remove('fa-moon');
+    darkModeIcon.classList.add('fa-sun');
+}
+
+// Toggle dark mode
+darkModeToggle.addEventListener('click', function() {
+    if (htmlElement.classList.contains('dark')) {
+        htmlElement.classList.remove('dark');
+        htmlElement.classList.add('light');
+        darkModeIcon.classList.remove('fa-moon');
+        darkModeIcon.classList.add('fa-sun');
+        localStorage.setItem('darkMode', 'light');
+    } else {
+        htmlElement.classList.remove('light');
+        htmlElement.classList.add('dark');
+        darkModeIcon.classList.remove('fa-sun');
+        darkModeIcon.classList.add('fa-moon');
+        localStorage.setItem('darkMode', 'dark');
+    }
+});
+
+// One idempotency key per page view, made here so the page itself stays cacheable.
+// A fresh key on every pageshow, so a form restored by Back or the bfcache
+// never reuses the key of a request that already went through; double-clicks
+// before the response arrives still share one key.
+const idempotencyKeyInput = document.getElementById('idempotencyKey');
+
+function newIdempotencyKey() {
+    const bytes = crypto.getRandomValues(new Uint8Array(16));
+    idempotencyKeyInput.value = Array.from(bytes, b => b.toString(16).padStart(2, '0')).join('');
+}
+
+newIdempotencyKey();
+window.addEventListener('pageshow', newIdempotencyKey);
+// The page is only hidden once the submit's response has loaded
+window.addEventListener('pagehide', newIdempotencyKey);
+
+// Show/hide game tag based on topic selection
+const topicSelect = document.getElementById('topic');
+const gameTagContainer = document.getElementById('gameTagContainer');
+
+topicSelect.addEventListener('change', function() {
+    if (this.value === '5') { // Gaming topic
+        gameTagContainer.classList.remove('hidden');
+        gameTagContainer.classList.add('fade-in');
+    } else {
+        gameTagContainer.classList.add('hidden');
+    }
+});
+
+// Show/hide spoofing parameters based on platform selection
+const spoofPlatRadios = document.querySelectorAll('input[name="spoof_plat"]');
+const spoofParamsContainer = document.getElementById('spoofParamsContainer');
+
+spoofPlatRadios.forEach(radio => {
+    radio.addEventListener('change', function() {
+        if (this.value === '1' || this.value === '2') {
+            spoofParamsContainer.classList.remove('hidden');
+            spoofParamsContainer.classList.add('fade-in');
+        } else {
+            spoofParamsContainer.classList.add('hidden');
+        }
+    });
+});
+
+// Generate random title
+const randomTitleLink = document.getElementById('randomTitleLink');
+const titleInput = document.getElementById('title');
+
+randomTitleLink.addEventListener('click', function(e) {
+    e.preventDefault();
+
+    fetch('/random_title')
+        .then(response => response.json())
+        .then(data => {
+            if (data.title) {
+                titleInput.value = data.title;
+                showToast('Random title generated!', 'success');
+            } else {
+                showToast('Failed to generate title: ' + (data.error || 'Unknown error'), 'error');
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            showToast('Failed to generate title', 'error');
+        });
+});
+
+// Generate device info
+const generateDeviceLink = document.getElementById('generateDeviceLink');
+const openudidInput = document.getElementById('openudid');
+const deviceIdInput = document.getElementById('device_id');
+const iidInput = document.getElementById('iid');
+
+generateDeviceLink.addEventListener('click', function(e) {
+    e.preventDefault();
+
+    fetch('/generate_device')
+        .then(response => response.json())
+        .then(data => {
+            if (data.openudid) {
+                openudidInput.value = data.openudid;
+                deviceIdInput.value = data.device_id;
+                iidInput.value = data.iid;
+                showToast('Device info generated!', 'success');
+            } else {
+                showToast('Failed to generate device info: ' + (data.error || 'Unknown error'), 'error');
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            showToast('Failed to generate device info', 'error');
+        });
+});
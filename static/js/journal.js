@@ -0,0 +1,2 @@
+// Operations journal page
+bindDarkModeToggle();
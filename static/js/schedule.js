@@ -0,0 +1,18 @@
+// Scheduled streams page
+bindDarkModeToggle();
+
+// Game tag is only needed for the Gaming topic
+const topicSelect = document.getElementById('topic');
+const gameTagContainer = document.getElementById('gameTagContainer');
+topicSelect.addEventListener('change', function() {
+    gameTagContainer.classList.toggle('hidden', this.value !== '5');
+});
+
+// Cancel confirmation
+document.querySelectorAll('form[data-cancel]').forEach(form => {
+    form.addEventListener('submit', event => {
+        if (!confirm('Cancel this scheduled stream?')) {
+            event.preventDefault();
+        }
+    });
+});
@@ -0,0 +1,6 @@
+// Copy the value of an input to the clipboard
+function copyToClipboard(elementId, type) {
+    copyText(document.getElementById(elementId).value, type);
+}
+
+bindDarkModeToggle();
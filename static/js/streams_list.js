@@ -0,0 +1,150 @@
+// Copy to clipboard functionality
+function copyToClipboard(text, type) {
+    copyText(text, type);
+}
+
+// Delete functionality
+let streamToDelete = null;
+
+function confirmDelete(streamId) {
+    streamToDelete = streamId;
+    document.getElementById('deleteModal').classList.remove('hidden');
+    document.getElementById('deleteModal').classList.add('flex');
+}
+
+function closeDeleteModal() {
+    document.getElementById('deleteModal').classList.add('hidden');
+    document.getElementById('deleteModal').classList.remove('flex');
+    streamToDelete = null;
+}
+
+function deleteStream() {
+    if (streamToDelete) {
+        fetch(`/delete_stream/${streamToDelete}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            }
+        })
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                // Remove the row from table
+                const row = document.querySelector(`tr[data-stream-id="${streamToDelete}"]`);
+                if (row) {
+                    row.style.transform = 'translateX(-100%)';
+                    row.style.opacity = '0';
+                    setTimeout(() => {
+                        row.remove();
+
+                        // Check if table is empty
+                        const tbody = document.getElementById('streamsTableBody');
+                        if (tbody && tbody.children.length === 0) {
+                            // Reload page to show empty state
+                            window.location.reload();
+                        }
+                    }, 300);
+                }
+
+                showToast('Stream deleted successfully!', 'success');
+            } else {
+                showToast('Failed to delete stream: ' + (data.error || 'Unknown error'), 'error');
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            showToast('Failed to delete stream', 'error');
+        });
+
+        closeDeleteModal();
+    }
+}
+
+// Search functionality
+const searchInput = document.getElementById('searchInput');
+searchInput.addEventListener('keyup', function() {
+    const searchTerm = this.value.toLowerCase();
+    const rows = document.querySelectorAll('#streamsTableBody tr');
+
+    rows.forEach(row => {
+        const title = row.querySelector('.font-semibold').textContent.toLowerCase();
+        if (title.includes(searchTerm)) {
+            row.style.display = '';
+        } else {
+            row.style.display = 'none';
+        }
+    });
+});
+
+// Sort functionality
+const sortSelect = document.getElementById('sortSelect');
+sortSelect.addEventListener('change', function() {
+    const sortBy = this.value;
+    const tbody = document.getElementById('streamsTableBody');
+    const rows = Array.from(tbody.querySelectorAll('tr'));
+
+    rows.sort((a, b) => {
+        if (sortBy === 'newest') {
+            const dateA = new Date(a.querySelector('.text-gray-400').textContent);
+            const dateB = new Date(b.querySelector('.text-gray-400').textContent);
+            return dateB - dateA;
+        } else if (sortBy === 'oldest') {
+            const dateA = new Date(a.querySelector('.text-gray-400').textContent);
+            const dateB = new Date(b.querySelector('.text-gray-400').textContent);
+            return dateA - dateB;
+        } else if (sortBy === 'title') {
+            const titleA = a.querySelector('.font-semibold').textContent;
+            const titleB = b.querySelector('.font-semibold').textContent;
+            return titleA.localeCompare(titleB);
+        }
+        return 0;
+    });
+
+    // Re-append sorted rows
+    rows.forEach(row => tbody.appendChild(row));
+});
+
+bindDarkModeToggle();
+
+// Live encoder telemetry, pushed by the server over one SSE connection
+function formatUptime(seconds) {
+    const s = Math.floor(seconds || 0);
+    const pad = n => String(n).padStart(2, '0');
+    return `${pad(Math.floor(s / 3600))}:${pad(Math.floor(s / 60) % 60)}:${pad(s % 60)}`;
+}
+
+function renderLive(cell, session) {
+    if (!session) {
+        cell.className = 'text-xs text-gray-500 whitespace-nowrap';
+        cell.innerHTML = '<i class="fas fa-circle mr-1"></i>Not pushing';
+        return;
+    }
+    const stalled = session.state === 'stalled';
+    cell.className = 'text-xs whitespace-nowrap ' + (stalled ? 'text-yellow-400' : 'text-green-400');
+    const fps = session.fps != null ? session.fps.toFixed(1) : '-';
+    const bitrate = session.bitrate_kbps != null ? Math.round(session.bitrate_kbps) : '-';
+    const speed = session.speed != null ? session.speed.toFixed(2) : '-';
+    cell.innerHTML = `<div><i class="fas fa-circle mr-1"></i>${stalled ? 'STALLED' : 'LIVE'} · up ${formatUptime(session.uptime)}</div>`
+        + `<div class="text-gray-300">${fps} fps · ${bitrate} kb/s · ${speed}x</div>`
+        + `<div class="text-gray-400">${session.dropped_frames || 0} dropped · ${session.reconnects || 0} reconnects</div>`;
+}
+
+if (window.EventSource) {
+    const liveEvents = new EventSource('/streams/events');
+    liveEvents.onmessage = function(e) {
+        const sessions = JSON.parse(e.data);
+        document.querySelectorAll('#streamsTableBody tr').forEach(row => {
+            const cell = row.querySelector('[data-live]');
+            if (cell) {
+                renderLive(cell, sessions[row.dataset.streamId]);
+            }
+        });
+    };
+}
+
+// Close modal when clicking outside
+document.getElementById('deleteModal').addEventListener('click', function(e) {
+    if (e.target === this) {
+        closeDeleteModal();
+    }
+});
@@ -0,0 +1,33 @@
+// Tailwind configuration shared by all pages.
+//
+// `python3 assets.py build` hands this file to the Tailwind CLI, which
+// compiles only the classes used in templates/ and static/js/. Without a
+// build the pages fall back to the in-browser compiler, which picks the
+// same object up from `tailwind.config`.
+const config = {
+    content: ['./templates/**/*.html', './static/js/**/*.js'],
+    darkMode: 'class',
+    theme: {
+        extend: {
+            colors: {
+                'tiktok': '#FE2C55',
+                'dark-blue': '#0a0e27',
+                'medium-blue': '#1a237e',
+                'light-blue': '#3b82f6',
+                'deep-blue': '#0d47a1',
+                'navy-blue': '#000051',
+                'black': '#000000',
+                'charcoal': '#121212',
+                // Palette of the cookies and streams list pages
+                'slate-navy': '#0c1445',
+                'slate-blue': '#1e3a8a',
+            }
+        }
+    }
+};
+
+if (typeof module !== 'undefined') {
+    module.exports = config;
+} else {
+    tailwind.config = config;
+}
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""Crash-safe file persistence shared by app.py and ffmpeg.py.
+
+Writes go to a temporary file in the target directory, are fsynced and then
+renamed over the target, so readers only ever see the old or the new
+content. The replacement keeps the permissions of the file it replaces (new
+files get the umask default, as open() would give them). Writers to the same path are serialised with an advisory lock
+(.locks/<name>.lock next to the file). Reads are cached in memory and
+re-parsed only when the file's mtime or size changes.
+"""
+import copy
+import json
+import os
+import stat
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_DIR = ".locks"
+
+_cache_lock = threading.Lock()
+_read_cache = {}
+
+# os.umask() can only be read by setting it, so read it once at import
+_umask = os.umask(0)
+os.umask(_umask)
+
+
+def _lock_path(path):
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, LOCK_DIR, name + ".lock")
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive advisory lock for path (not the file itself)."""
+    lock_path = _lock_path(path)
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, "a+b") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _fsync_dir(directory):
+    if fcntl is None:
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _file_mode(path):
+    """Mode for a new version of path: the current one's, or open()'s default."""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_umask
+
+
+def atomic_write(path, data):
+    """Replace path with data (str or bytes) via write-temp-fsync-rename.
+
+    Callers that may race with other writers should hold file_lock(path).
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        # mkstemp creates the file 0600
+        os.chmod(tmp_path, _file_mode(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data.encode("utf-8") if isinstance(data, str) else data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_dir(directory)
+    _invalidate(path)
+
+
+def write_text(path, text):
+    with file_lock(path):
+        atomic_write(path, text)
+
+
+def write_json(path, data, **dump_kwargs):
+    text = json.dumps(data, **dump_kwargs)
+    with file_lock(path):
+        atomic_write(path, text)
+
+
+def update_json(path, func, default=None):
+    """Atomically read-modify-write a JSON file.
+
+    func receives the current content (or a copy of default when the file
+    doesn't exist) and returns the new content, which is also returned.
+    If func returns None the file is left as it is.
+    """
+    with file_lock(path):
+        try:
+            current = read_json(path)
+        except FileNotFoundError:
+            current = copy.deepcopy(default)
+        updated = func(current)
+        if updated is not None:
+            atomic_write(path, json.dumps(updated))
+        return updated
+
+
+def _invalidate(path):
+    with _cache_lock:
+        _read_cache.pop(os.path.abspath(path), None)
+
+
+def _cached_read(path, parse):
+    key = os.path.abspath(path)
+    stat = os.stat(key)
+    signature = (stat.st_mtime_ns, stat.st_size, parse)
+    with _cache_lock:
+        entry = _read_cache.get(key)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+    with open(key, "r", encoding="utf-8") as f:
+        value = parse(f.read())
+    with _cache_lock:
+        _read_cache[key] = (signature, value)
+    return value
+
+
+def read_json(path):
+    """Load JSON from path, re-parsing only when the file changed.
+
+    Raises FileNotFoundError and ValueError like json.load. A private copy
+    is returned so callers may mutate it.
+    """
+    return copy.deepcopy(_cached_read(path, json.loads))
+
+
+def read_text(path):
+    return _cached_read(path, str)
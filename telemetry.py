@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Live encoder telemetry for active pushes.
+
+TikTokStreamer reports ffmpeg's progress output (fps, bitrate, speed,
+dropped frames) through a callback. Pushes running inside the web process
+publish straight into the TelemetryHub; pushes started with ffmpeg.py in a
+separate process write a small JSON state file per session which the hub
+picks up. The /streams/events endpoint multiplexes the hub's state for all
+sessions over one Server-Sent Events connection.
+"""
+import os
+import threading
+import time
+
+import storage
+
+TELEMETRY_DIR = "telemetry"
+# Sessions that stop reporting are dropped after this long
+STALE_AFTER = 30
+# Minimum interval between state file writes per session
+FILE_WRITE_INTERVAL = 1.0
+
+
+class TelemetryHub:
+    """Latest telemetry per push session, with change notification."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._sessions = {}
+        self.version = 0
+
+    def update(self, session_id, stats):
+        with self._cond:
+            state = dict(self._sessions.get(session_id, {}))
+            state.update(stats)
+            state["session_id"] = session_id
+            state["updated_at"] = stats.get("updated_at") or time.time()
+            self._sessions[session_id] = state
+            self.version += 1
+            self._cond.notify_all()
+
+    def remove(self, session_id):
+        with self._cond:
+            if self._sessions.pop(session_id, None) is not None:
+                self.version += 1
+                self._cond.notify_all()
+
+    def snapshot(self):
+        now = time.time()
+        with self._cond:
+            stale = [sid for sid, state in self._sessions.items() if now - state["updated_at"] > STALE_AFTER]
+            for sid in stale:
+                del self._sessions[sid]
+            if stale:
+                self.version += 1
+            return self.version, {sid: dict(state) for sid, state in self._sessions.items()}
+
+    def wait_for_change(self, version, timeout):
+        """Block until the hub version differs from version or timeout passes."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def scan_directory(self, directory=TELEMETRY_DIR):
+        """Merge state files written by out-of-process streamers."""
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return
+        now = time.time()
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                state = storage.read_json(path)
+            except (OSError, ValueError):
+                continue
+            session_id = state.get("session_id") or name[:-len(".json")]
+            if state.get("ended") or now - state.get("updated_at", 0) > STALE_AFTER:
+                self.remove(session_id)
+                continue
+            with self._cond:
+                current = self._sessions.get(session_id)
+                if current is not None and current.get("updated_at", 0) >= state.get("updated_at", 0):
+                    continue
+            self.update(session_id, state)
+
+
+class FileTelemetryWriter:
+    """Progress callback that persists a session's telemetry for the hub.
+
+    The file also links the push to its stream record and process, which is
+    what the push watchdog uses to end rooms whose encoder went away.
+    """
+
+    def __init__(self, session_id, directory=TELEMETRY_DIR, stream_id=None):
+        self.session_id = session_id
+        self.stream_id = stream_id
+        self.path = os.path.join(directory, f"{session_id}.json")
+        self._last_write = 0.0
+        self._last_stats = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, stats, force=False):
+        now = time.time()
+        if not force and now - self._last_write < FILE_WRITE_INTERVAL:
+            return
+        self._last_write = now
+        self._last_stats = stats
+        state = dict(stats)
+        state["session_id"] = self.session_id
+        state["stream_id"] = self.stream_id
+        state["pid"] = os.getpid()
+        state["updated_at"] = now
+        try:
+            storage.write_json(self.path, state)
+        except OSError:
+            pass
+
+    def close(self, exit_code=None):
+        """Mark the session ended; the watchdog or hub removes the file."""
+        stats = dict(self._last_stats, state="ended", ended=True, exit_code=exit_code)
+        self(stats, force=True)
+
+
+# Process-wide hub used by the web app
+hub = TelemetryHub()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Thumbnail pipeline for stream covers.
+
+Images are normalised to the cover size and format (JPEG, under a target
+byte size) on a small worker pool, hashed, and the upload URI TikTok returns
+is cached per account and content hash. A repeat go-live with the same cover
+skips the upload entirely.
+
+Pillow is optional; without it the original file is uploaded unchanged but
+still benefits from the URI cache.
+"""
+import hashlib
+import io
+import mimetypes
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import storage
+
+COVER_SIZE = (720, 1280)
+TARGET_BYTES = 200 * 1024
+JPEG_QUALITIES = (90, 80, 70, 60, 50)
+URI_TTL = 24 * 3600
+CACHE_FILE = ".thumbnail_cache.json"
+# Prepared images kept in memory; upload_cache holds URIs for the rest
+MAX_PREPARED = 4
+
+
+class PreparedThumbnail:
+    def __init__(self, data, filename, content_type):
+        self.data = data
+        self.filename = filename
+        self.content_type = content_type
+        self.digest = hashlib.sha256(data).hexdigest()
+
+
+def normalise(file_path):
+    """Return a PreparedThumbnail for file_path, downscaled when Pillow is available."""
+    with open(file_path, "rb") as f:
+        raw = f.read()
+
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        content_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        return PreparedThumbnail(raw, os.path.basename(file_path), content_type)
+
+    with Image.open(io.BytesIO(raw)) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        image = ImageOps.fit(image, COVER_SIZE, Image.LANCZOS)
+
+    data = raw
+    for quality in JPEG_QUALITIES:
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=quality, optimize=True, progressive=True)
+        data = buffer.getvalue()
+        if len(data) <= TARGET_BYTES:
+            break
+    return PreparedThumbnail(data, "cover.jpg", "image/jpeg")
+
+
+class ThumbnailPipeline:
+    """Normalise thumbnails off the calling thread, memoised per file version.
+
+    Only the max_prepared most recently used versions are kept, and a new
+    version of a file replaces the old one, so a long-running daemon or web
+    app doesn't hold every image it ever prepared.
+    """
+
+    def __init__(self, max_workers=2, max_prepared=MAX_PREPARED):
+        self._executor = None
+        self._max_workers = max_workers
+        self._max_prepared = max_prepared
+        self._lock = threading.Lock()
+        self._futures = OrderedDict()
+
+    def prepare(self, file_path):
+        """Return a Future resolving to a PreparedThumbnail for file_path."""
+        stat = os.stat(file_path)
+        key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            future = self._futures.get(key)
+            if future is None or (future.done() and future.exception() is not None):
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self._max_workers,
+                        thread_name_prefix="thumbnail"
+                    )
+                for stale in [k for k in self._futures if k[0] == key[0] and k != key]:
+                    del self._futures[stale]
+                future = self._futures[key] = self._executor.submit(normalise, file_path)
+            self._futures.move_to_end(key)
+            while len(self._futures) > self._max_prepared:
+                self._futures.popitem(last=False)
+        return future
+
+
+class UploadCache:
+    """Account-scoped content hash -> uploaded cover URI, with expiry."""
+
+    def __init__(self, path=CACHE_FILE, ttl=URI_TTL):
+        self.path = path
+        self.ttl = ttl
+
+    def get(self, account, digest):
+        try:
+            entry = storage.read_json(self.path).get(account, {}).get(digest)
+        except (FileNotFoundError, ValueError):
+            return None
+        if entry and entry.get("expires_at", 0) > time.time():
+            return entry.get("uri")
+        return None
+
+    def put(self, account, digest, uri):
+        now = time.time()
+
+        def apply(cache):
+            if not isinstance(cache, dict):
+                cache = {}
+            entries = cache.setdefault(account, {})
+            for key in [k for k, v in entries.items() if v.get("expires_at", 0) <= now]:
+                del entries[key]
+            entries[digest] = {"uri": uri, "expires_at": now + self.ttl}
+            return cache
+
+        storage.update_json(self.path, apply, default={})
+
+
+# Process-wide instances
+pipeline = ThumbnailPipeline()
+upload_cache = UploadCache()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""Random stream titles from line-per-title files.
+
+A title file is memory-mapped and indexed once: the byte offset of every
+non-blank line goes into .title_index/<pool>.idx, which is rebuilt only when
+the title file's mtime or size changes. The index is memory-mapped as well,
+so a pick reads one offset and one line whatever the size of the corpus.
+
+Picks are either independent (random) or, with no_repeat, walk a random
+permutation of all lines so no title comes up twice before every other one
+has. The permutation is a Fisher-Yates shuffle of the line numbers, stored
+next to the index in .title_index/<pool>.order and reshuffled once it has
+been walked through; it and the position in it survive restarts.
+
+Only pools named in config.json can be read from the web UI:
+
+    "title_pools": {"default": "tittle.txt", "gaming": "titles/gaming.txt"},
+    "title_no_repeat": true
+"""
+import hashlib
+import mmap
+import os
+import random
+import struct
+import threading
+
+import storage
+
+DEFAULT_POOLS = {"default": "tittle.txt"}
+INDEX_DIR = ".title_index"
+INDEX_MAGIC = b"TIDX1\0\0\0"
+# magic, title file mtime_ns, title file size, line count
+INDEX_HEADER = struct.Struct("<8sQQQ")
+OFFSET = struct.Struct("<Q")
+ORDER_MAGIC = b"TORD1\0\0\0"
+# magic, line count
+ORDER_HEADER = struct.Struct("<8sQ")
+
+
+def load_pools(config_file="config.json"):
+    """Return the whitelisted pools as {name: path}."""
+    try:
+        config = storage.read_json(config_file)
+    except (FileNotFoundError, ValueError):
+        config = {}
+    pools = config.get("title_pools")
+    if not isinstance(pools, dict) or not pools:
+        return dict(DEFAULT_POOLS)
+    return {str(name): str(path) for name, path in pools.items()}
+
+
+def no_repeat_enabled(config_file="config.json"):
+    try:
+        return bool(storage.read_json(config_file).get("title_no_repeat", False))
+    except (FileNotFoundError, ValueError, AttributeError):
+        return False
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def build_index(data):
+    """Return the offsets of the non-blank lines in data (a bytes-like object)."""
+    offsets = bytearray()
+    start = 0
+    end = len(data)
+    while start < end:
+        newline = data.find(b"\n", start)
+        if newline == -1:
+            newline = end
+        if data[start:newline].strip():
+            offsets += OFFSET.pack(start)
+        start = newline + 1
+    return bytes(offsets)
+
+
+class TitlePool:
+    """One title file with its persisted line index and no-repeat cursor."""
+
+    def __init__(self, name, path, index_dir=INDEX_DIR):
+        self.name = name
+        self.path = path
+        self.index_path = os.path.join(index_dir, f"{name}.idx")
+        self.cursor_path = os.path.join(index_dir, f"{name}.cursor.json")
+        self.order_path = os.path.join(index_dir, f"{name}.order")
+        self._lock = threading.Lock()
+        self._signature = None
+        self._data = None
+        self._index = None
+        self.count = 0
+
+    def _close(self):
+        for mapped in (self._data, self._index):
+            if mapped is not None:
+                mapped.close()
+        self._data = self._index = None
+        self.count = 0
+
+    def _load_index(self, signature):
+        """Map the index file if it matches signature; returns True on success."""
+        try:
+            with open(self.index_path, "rb") as f:
+                index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+        if len(index) >= INDEX_HEADER.size:
+            magic, mtime_ns, size, count = INDEX_HEADER.unpack_from(index, 0)
+            if (magic == INDEX_MAGIC and (mtime_ns, size) == signature
+                    and len(index) == INDEX_HEADER.size + count * OFFSET.size):
+                self._index, self.count = index, count
+                return True
+        index.close()
+        return False
+
+    def _refresh(self):
+        """Make sure the mapped file and index match the title file on disk."""
+        signature = _signature(self.path)
+        if signature == self._signature:
+            return
+        self._close()
+        if signature[1] == 0:
+            self._signature = signature
+            return
+        with open(self.path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if not self._load_index(signature):
+            offsets = build_index(self._data)
+            header = INDEX_HEADER.pack(INDEX_MAGIC, signature[0], signature[1], len(offsets) // OFFSET.size)
+            os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+            with storage.file_lock(self.index_path):
+                storage.atomic_write(self.index_path, header + offsets)
+            if not self._load_index(signature):
+                raise OSError(f"could not read back title index {self.index_path}")
+        self._signature = signature
+
+    def title(self, i):
+        """Return the i-th non-blank line."""
+        start = OFFSET.unpack_from(self._index, INDEX_HEADER.size + i * OFFSET.size)[0]
+        end = self._data.find(b"\n", start)
+        if end == -1:
+            end = len(self._data)
+        return self._data[start:end].decode("utf-8", "replace").strip()
+
+    def _shuffle(self, n):
+        """Write a new random order of the n lines to the order file."""
+        order = list(range(n))
+        random.shuffle(order)
+        data = bytearray(ORDER_HEADER.pack(ORDER_MAGIC, n))
+        data += struct.pack(f"<{n}Q", *order)
+        storage.atomic_write(self.order_path, bytes(data))
+
+    def _order_entry(self, n, position):
+        """Line at position of the order file, or None if it isn't an order of n lines."""
+        try:
+            with open(self.order_path, "rb") as f:
+                header = f.read(ORDER_HEADER.size)
+                if len(header) != ORDER_HEADER.size or ORDER_HEADER.unpack(header) != (ORDER_MAGIC, n):
+                    return None
+                f.seek(ORDER_HEADER.size + position * OFFSET.size)
+                entry = f.read(OFFSET.size)
+        except OSError:
+            return None
+        return OFFSET.unpack(entry)[0] if len(entry) == OFFSET.size else None
+
+    def _next_position(self):
+        """Advance the persisted no-repeat cursor and return the line to use."""
+        n = self.count
+
+        # The order file is only written and read under the cursor's lock
+        def advance(cursor):
+            if not isinstance(cursor, dict) or cursor.get("count") != n or cursor.get("position", n) >= n:
+                cursor = None
+            line = self._order_entry(n, cursor["position"]) if cursor else None
+            if line is None:
+                self._shuffle(n)
+                cursor = {"count": n, "position": 0}
+                line = self._order_entry(n, 0)
+            cursor.update(position=cursor["position"] + 1, line=line)
+            return cursor
+
+        os.makedirs(os.path.dirname(self.cursor_path) or ".", exist_ok=True)
+        return storage.update_json(self.cursor_path, advance, default={})["line"]
+
+    def pick(self, no_repeat=False):
+        """Return a random title, or None when the file has none."""
+        with self._lock:
+            self._refresh()
+            if self.count == 0:
+                return None
+            i = self._next_position() if no_repeat else random.randrange(self.count)
+            return self.title(i)
+
+
+class TitlePools:
+    """Process-wide TitlePool instances, one per title file."""
+
+    def __init__(self, index_dir=INDEX_DIR):
+        self.index_dir = index_dir
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    def get(self, name, path):
+        with self._lock:
+            pool = self._pools.get(name)
+            if pool is None or pool.path != path:
+                pool = self._pools[name] = TitlePool(name, path, self.index_dir)
+            return pool
+
+    def for_path(self, path):
+        """Pool for an arbitrary file, for the CLI; named after the file."""
+        name = os.path.splitext(os.path.basename(path))[0] or "titles"
+        digest = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:8]
+        return self.get(f"{name}-{digest}", path)
+
+
+pools = TitlePools()
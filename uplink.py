@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""Uplink capacity probe and bitrate ladder selection.
+
+Before a push, probe() opens an RTMP connection to the ingest (handshake and
+connect, no publish) and streams padding commands for a few seconds, which
+RTMP servers ignore. Throughput is taken from what the peer acknowledged
+(TCP_INFO bytes_acked on Linux, otherwise bytes sent minus the unsent send
+queue), ignoring the slow-start phase; RTT and its variance come from the
+kernel's TCP_INFO samples.
+
+select_rung() then picks the highest rung of the bitrate ladder that fits
+in the measured throughput with headroom. Results are stored per ingest host
+in .uplink_cache.json with a TTL, so later pushes reuse them.
+
+The ladder, headroom and TTL can be overridden in config.json:
+
+    "uplink_ladder": [{"name": "720p", "resolution": "720x1280",
+                       "maxrate": "3000k", "bufsize": "6000k", "audio_bitrate": "128k"}, ...],
+    "uplink_headroom": 0.7,
+    "uplink_ttl": 3600
+"""
+import math
+import socket
+import struct
+import time
+from urllib.parse import urlsplit
+
+import rtmp
+import storage
+
+CACHE_FILE = ".uplink_cache.json"
+PROBE_DURATION = 3.0
+PROBE_MAX_BYTES = 16 * 1024 * 1024
+PADDING_SIZE = 60 * 1024
+SAMPLE_INTERVAL = 0.05
+# Share of the measured throughput a push may use
+DEFAULT_HEADROOM = 0.7
+# Extra safety factor when the RTT jitters by more than half its mean
+JITTER_FACTOR = 0.8
+DEFAULT_TTL = 3600
+
+DEFAULT_LADDER = [
+    {"name": "1080p", "resolution": "1080x1920", "maxrate": "6000k", "bufsize": "12000k", "audio_bitrate": "160k"},
+    {"name": "720p-high", "resolution": "720x1280", "maxrate": "4500k", "bufsize": "9000k", "audio_bitrate": "128k"},
+    {"name": "720p", "resolution": "720x1280", "maxrate": "3000k", "bufsize": "6000k", "audio_bitrate": "128k"},
+    {"name": "540p", "resolution": "540x960", "maxrate": "1800k", "bufsize": "3600k", "audio_bitrate": "96k"},
+    {"name": "360p", "resolution": "360x640", "maxrate": "800k", "bufsize": "1600k", "audio_bitrate": "64k"},
+]
+
+
+def kbps(value):
+    """Parse an ffmpeg rate such as '3000k' or '6M' into kbit/s."""
+    value = str(value).strip().lower()
+    scale = {'k': 1, 'm': 1000}.get(value[-1:], None)
+    if scale is None:
+        return float(value) / 1000
+    return float(value[:-1]) * scale
+
+
+def load_settings(config_file="config.json"):
+    try:
+        config = storage.read_json(config_file)
+    except (FileNotFoundError, ValueError):
+        config = {}
+    return {
+        "ladder": config.get("uplink_ladder") or DEFAULT_LADDER,
+        "headroom": float(config.get("uplink_headroom", DEFAULT_HEADROOM)),
+        "ttl": float(config.get("uplink_ttl", DEFAULT_TTL)),
+    }
+
+
+def _tcp_info(sock):
+    """Return (rtt_ms, rttvar_ms, bytes_acked) from TCP_INFO, or None."""
+    if not hasattr(socket, "TCP_INFO"):
+        return None
+    try:
+        info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, 256)
+    except OSError:
+        return None
+    if len(info) < 128:
+        return None
+    rtt, rttvar = struct.unpack_from("=II", info, 68)
+    bytes_acked = struct.unpack_from("=Q", info, 120)[0]
+    return rtt / 1000, rttvar / 1000, bytes_acked
+
+
+def _unsent(sock):
+    """Bytes still queued in the socket's send buffer, or 0 if unknown."""
+    try:
+        import fcntl
+        import termios
+        return struct.unpack("I", fcntl.ioctl(sock.fileno(), termios.TIOCOUTQ, b"\0" * 4))[0]
+    except (ImportError, OSError, AttributeError):
+        return 0
+
+
+def probe(rtmp_url, duration=PROBE_DURATION, max_bytes=PROBE_MAX_BYTES, timeout=rtmp.PROBE_TIMEOUT):
+    """Measure sustained upload throughput and RTT toward rtmp_url's ingest.
+
+    Returns a dict with throughput_kbps, rtt_ms, rtt_jitter_ms and
+    bytes_sent, or raises OSError / rtmp.RTMPError if the ingest can't be
+    reached.
+    """
+    server_url = rtmp_url[:rtmp_url.rfind('/')]
+    sock = rtmp.connect_ingest(server_url, timeout=timeout)
+    try:
+        sock.settimeout(max(duration, 1.0))
+        sock.sendall(rtmp.encode_message(2, rtmp.MSG_SET_CHUNK_SIZE, struct.pack('>I', rtmp.OUT_CHUNK_SIZE)))
+        padding = rtmp.encode_command("uplinkProbe", 0, None, "\0" * PADDING_SIZE,
+                                      chunk_size=rtmp.OUT_CHUNK_SIZE)
+        samples = []
+        sent = 0
+        started = time.monotonic()
+        next_sample = started
+
+        def sample(now):
+            info = _tcp_info(sock)
+            delivered = info[2] if info else sent - _unsent(sock)
+            samples.append((now, delivered, info[0] if info else None))
+
+        while True:
+            now = time.monotonic()
+            if now >= next_sample:
+                sample(now)
+                next_sample = now + SAMPLE_INTERVAL
+            if now - started >= duration or sent >= max_bytes:
+                break
+            try:
+                sent += sock.send(padding)
+            except socket.timeout:
+                break
+        sample(time.monotonic())
+    finally:
+        sock.close()
+
+    # Skip the first quarter (slow start, buffers filling)
+    elapsed = samples[-1][0] - started
+    steady = [s for s in samples if s[0] - started >= elapsed / 4]
+    if len(steady) < 2:
+        steady = samples
+    first, last = steady[0], steady[-1]
+    elapsed = last[0] - first[0]
+    throughput = (last[1] - first[1]) * 8 / 1000 / elapsed if elapsed > 0 else 0.0
+    rtts = [s[2] for s in samples if s[2]]
+    rtt = sum(rtts) / len(rtts) if rtts else None
+    jitter = math.sqrt(sum((r - rtt) ** 2 for r in rtts) / len(rtts)) if rtts else None
+    return {
+        "throughput_kbps": round(throughput, 1),
+        "rtt_ms": round(rtt, 2) if rtt is not None else None,
+        "rtt_jitter_ms": round(jitter, 2) if jitter is not None else None,
+        "bytes_sent": sent,
+        "duration": round(time.monotonic() - started, 2),
+    }
+
+
+def select_rung(measurement, ladder=None, headroom=DEFAULT_HEADROOM):
+    """Return the highest ladder rung fitting the measured throughput.
+
+    Falls back to the lowest rung when nothing fits.
+    """
+    ladder = ladder or DEFAULT_LADDER
+    budget = measurement["throughput_kbps"] * headroom
+    rtt, jitter = measurement.get("rtt_ms"), measurement.get("rtt_jitter_ms")
+    if rtt and jitter and jitter > rtt / 2:
+        budget *= JITTER_FACTOR
+    rungs = sorted(ladder, key=lambda r: kbps(r["maxrate"]) + kbps(r.get("audio_bitrate", "128k")), reverse=True)
+    for rung in rungs:
+        if kbps(rung["maxrate"]) + kbps(rung.get("audio_bitrate", "128k")) <= budget:
+            return rung
+    return rungs[-1]
+
+
+def cached(host):
+    try:
+        entry = storage.read_json(CACHE_FILE).get(host)
+    except (FileNotFoundError, ValueError):
+        return None
+    if entry and entry.get("expires_at", 0) > time.time():
+        return entry
+    return None
+
+
+def store(host, measurement, ttl):
+    now = time.time()
+
+    def apply(cache):
+        if not isinstance(cache, dict):
+            cache = {}
+        for key in [k for k, v in cache.items() if v.get("expires_at", 0) <= now]:
+            del cache[key]
+        cache[host] = dict(measurement, measured_at=now, expires_at=now + ttl)
+        return cache
+
+    storage.update_json(CACHE_FILE, apply, default={})
+
+
+def choose_profile(rtmp_url, config_file="config.json", refresh=False):
+    """Return (rung, measurement) for rtmp_url, measuring only when the cache is stale."""
+    settings = load_settings(config_file)
+    host = urlsplit(rtmp_url).hostname or rtmp_url
+    measurement = None if refresh else cached(host)
+    if measurement is None:
+        measurement = probe(rtmp_url)
+        store(host, measurement, settings["ttl"])
+    return select_rung(measurement, settings["ladder"], settings["headroom"]), measurement
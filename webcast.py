@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""Request builders and response parsers for the TikTok webcast API.
+
+Everything here is plain data in, plain data out: no sessions and no I/O.
+The blocking Stream client in app.py and the asyncio AsyncStream client in
+asyncstream.py both build their requests and read the answers through these
+functions, so the two can't drift apart.
+"""
+
+VERSION_URL = "https://tron-sg.bytelemon.com/api/sdk/check_update"
+VERSION_PARAMS = {
+    "pid": "7393277106664249610",
+    "uid": "7464643088460875280",
+    "branch": "studio/release/stable",
+    "buildId": "0"
+}
+# Used when the version lookup fails
+DEFAULT_VERSION = "0.99.0"
+
+HOSTS_URL = (
+    "https://tnc16-platform-useast1a.tiktokv.com/get_domains/v4/?"
+    "aid=8311&ttwebview_version=1130022001&device_platform=win"
+)
+GAME_TAGS_URL = (
+    "https://webcast16-normal-c-useast2a.tiktokv.com/webcast/"
+    "room/hashtag/list/"
+)
+
+CREATE_PATH = "webcast/room/create/"
+END_PATH = "webcast/room/finish_abnormal/"
+UPLOAD_IMAGE_PATH = "webcast/room/upload/image/"
+
+# Gateway errors worth retrying on another webcast host
+FAILOVER_STATUSES = (502, 503, 504)
+
+
+def parse_version(info):
+    """Live Studio version from a check_update answer."""
+    return info["data"]["manifest"]["win32"]["version"]
+
+
+def parse_game_tags(info):
+    """{id: name} from a hashtag/list answer."""
+    return {game["id"]: game["show_name"] for game in info["data"]["game_tag_list"]}
+
+
+def create_request(
+    title,
+    hashtag_id,
+    game_tag_id="0",
+    gen_replay=False,
+    close_room_when_close_stream=True,
+    age_restricted=False,
+    priority_region="",
+    spoof_plat=0,
+    openudid="",
+    device_id="",
+    iid="",
+    version=DEFAULT_VERSION
+):
+    """Return (headers, params, data) for room/create.
+
+    version is the Live Studio version and only matters for spoof_plat 0.
+    The thumbnail's cover_uri is added to data by the caller.
+    """
+    if spoof_plat == 1:
+        headers = {
+            "user-agent": "com.zhiliaoapp.musically/2023508030 (Linux; U; Android 14; en_US_#u-mu-celsius; M2102J20SG; Build/AP2A.240905.003; Cronet/TTNetVersion:f58efab5 2024-06-13 QuicVersion:5d23606e 2024-05-23)",
+        }
+        params = {
+            # App ID for Tiktok Mobile App
+            "aid": "1233",
+            # App name for Tiktok Mobile App
+            "app_name": "musical_ly",
+            # Channel for Tiktok Mobile App
+            "channel": "googleplay",
+            "device_platform": "android",
+            "iid": iid,
+            "device_id": device_id,
+            "openudid": openudid,
+            "os": "android",
+            "ssmix": "a",
+            "_rticket": "1730304478660",
+            "cdid": "1fb4eb4c-99f5-4534-a637-e3ac7d52fddb",
+            "version_code": "370104",
+            "version_name": "37.1.4",
+            "manifest_version_code": "2024701040",
+            "update_version_code": "2024701040",
+            "ab_version": "37.1.4",
+            "resolution": "1080*2309",
+            "dpi": "410",
+            "device_type": "M2102J20SG",
+            "device_brand": "POCO",
+            "language": "en",
+            "os_api": "34",
+            "os_version": "14",
+            "ac": "wifi",
+            "is_pad": "0",
+            "current_region": "TN",
+            "app_type": "normal",
+            "sys_region": "US",
+            "last_install_time": "1717207722",
+            "mcc_mnc": "60501",
+            "timezone_name": "Africa/Tunis",
+            "carrier_region_v2": "605",
+            "residence": "TN",
+            "app_language": "en",
+            "carrier_region": "TN",
+            "ac2": "wifi5g",
+            "uoo": "0",
+            "op_region": "TN",
+            "timezone_offset": "3600",
+            "build_number": "37.1.4",
+            "host_abi": "arm64-v8a",
+            "locale": "en",
+            "region": "US",
+            "ts": "1730304477",
+            "webcast_sdk_version": "3590",
+            "webcast_language": "en",
+            "webcast_locale": "en_US_#u-mu-celsius",
+            "es_version": "2",
+            "effect_sdk_version": "17.0.0",
+            "current_network_quality_info": '{"tcp_rtt":64,"quic_rtt":64,"http_rtt":198,"downstream_throughput_kbps":31920,"quic_send_loss_rate":-1,"quic_receive_loss_rate":-1,"net_effective_connection_type":4,"video_download_speed":787}'
+        }
+        data = {
+            "hashtag_id": hashtag_id,
+            "hold_living_room": "1",
+            "chat_sub_only_auth": "2",
+            "community_flagged_chat_auth": "2",
+            "ecom_bc_toggle": "3",
+            "live_sub_only": "0",
+            "overwrite_push_base_parameter": "false",
+            "chat_l_2": "1",
+            "caption": "0",
+            "overwrite_push_base_min_bit_rate": "-1",
+            "title": title,
+            "live_sub_only_use_music": "0",
+            "mobile_binded": "0",
+            "create_source": "0",
+            "spam_comments": "1",
+            "commercial_content_promote_third_party": "false",
+            "grant_level": "0",
+            "screenshot_cover_status": "0",
+            "overwrite_push_base_max_bit_rate": "-1",
+            "enable_http_dns": "0",
+            "mobile_validated": "0",
+            "live_agreement": "0",
+            "commercial_content_promote_myself": "false",
+            "allow_preview_duration_exp": "0",
+            "is_user_select": "0",
+            "transaction_history": "1",
+            "probe_recommend_resolution": "1",
+            "chat_auth": "1",
+            "disable_preview_sub_only": "0",
+            "comment_tray_switch": "1",
+            "overwrite_push_base_default_bit_rate": "-1",
+            "overwrite_push_base_resolution": "1",
+            "grant_group": "1",
+            "gift_auth": "1",
+            "star_comment_switch": "true",
+            "has_commerce_goods": "false",
+            "open_commercial_content_toggle": "false",
+            "event_id": "-1",
+            "star_comment_qualification": "false",
+            "game_tag_id": game_tag_id,
+            "community_flagged_chat_review_auth": "2",
+            "age_restricted": "0",
+            "group_chat_id": "0",
+            "optout_gift_gallery": "false",
+            "gen_replay": str(gen_replay).lower(),
+            "shopping_ranking": "0"
+        }
+
+    elif spoof_plat == 2:
+        headers = {
+            "user-agent": "com.zhiliaoapp.musically/2023508030 (Linux; U; Android 14; en_US_#u-mu-celsius; M2102J20SG; Build/AP2A.240905.003; Cronet/TTNetVersion:f58efab5 2024-06-13 QuicVersion:5d23606e 2024-05-23)",
+        }
+        params = {
+            # App ID for Tiktok Mobile App
+            "aid": "1233",
+            # App name for Tiktok Mobile App
+            "app_name": "musical_ly",
+            # Channel for Tiktok Mobile App
+            "channel": "googleplay",
+            "device_platform": "android",
+            "iid": iid,
+            "device_id": device_id,
+            "openudid": openudid,
+            "screen_shot": "1",
+            "ac": "wifi",
+            "version_code": "370104",
+            "version_name": "37.1.4",
+            "os": "android",
+            "ab_version": "37.1.4",
+            "ssmix": "a",
+            "device_type": "M2102J20SG",
+            "device_brand": "POCO",
+            "language": "en",
+            "os_api": "34",
+            "os_version": "14",
+            "manifest_version_code": "2023701040",
+            "resolution": "1080*2309",
+            "dpi": "410",
+            "update_version_code": "2023701040",
+            "_rticket": "1730306440278",
+            "is_pad": "0",
+            "current_region": "TN",
+            "app_type": "normal",
+            "sys_region": "US",
+            "last_install_time": "1730305998",
+            "mcc_mnc": "60501",
+            "timezone_name": "Africa/Tunis",
+            "carrier_region_v2": "605",
+            "residence": "TN",
+            "app_language": "en",
+            "carrier_region": "TN",
+            "ac2": "wifi5g",
+            "uoo": "0",
+            "op_region": "TN",
+            "timezone_offset": "3600",
+            "build_number": "37.1.4",
+            "host_abi": "arm64-v8a",
+            "locale": "en",
+            "region": "US",
+            "ts": "1730306440",
+            "cdid": "bfe31618-558b-4e0d-a4e5-c4221be305a1",
+            "webcast_sdk_version": "3490",
+            "webcast_language": "en",
+            "webcast_locale": "en_US_#u-mu-celsius",
+            "es_version": "2",
+            "effect_sdk_version": "17.0.0",
+            "current_network_quality_info": '{"tcp_rtt":99,"quic_rtt":99,"http_rtt":203,"downstream_throughput_kbps":2734,"quic_send_loss_rate":-1,"quic_receive_loss_rate":-1,"net_effective_connection_type":4,"video_download_speed":7}'
+        }
+        data = {
+            "hashtag_id": hashtag_id,
+            "hold_living_room": "1",
+            "chat_sub_only_auth": "2",
+            "screen_shot": "1",
+            "mute_duration": "1",
+            "community_flagged_chat_auth": "2",
+            "ecom_bc_toggle": "3",
+            "live_sub_only": "0",
+            "chat_l_2": "1",
+            "caption": "0",
+            "live_sub_only_use_music": "0",
+            "mobile_binded": "0",
+            "create_source": "0",
+            "spam_comments": "1",
+            "commercial_content_promote_third_party": "false",
+            "grant_level": "0",
+            "screenshot_cover_status": "1",
+            "enable_http_dns": "0",
+            "mobile_validated": "0",
+            "live_agreement": "0",
+            "orientation": "2",
+            "commercial_content_promote_myself": "false",
+            "allow_preview_duration_exp": "0",
+            "transaction_history": "1",
+            "chat_auth": "1",
+            "disable_preview_sub_only": "0",
+            "comment_tray_switch": "1",
+            "grant_group": "1",
+            "gift_auth": "1",
+            "star_comment_switch": "true",
+            "has_commerce_goods": "false",
+            "open_commercial_content_toggle": "false",
+            "event_id": "-1",
+            "star_comment_qualification": "true",
+            "game_tag_id": game_tag_id,
+            "community_flagged_chat_review_auth": "2",
+            "age_restricted": "0",
+            "sdk_key": "hd",
+            "live_room_mode": "4",
+            "gen_replay": str(gen_replay).lower(),
+            "shopping_ranking": "0"
+        }
+    else:
+        headers = {
+            "user-agent": f"Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) TikTokLIVEStudio/{version} Chrome/108.0.5359.215 Electron/22.3.18-tt.8.release.main.44 TTElectron/22.3.18-tt.8.release.main.44 Safari/537.36",
+        }
+        params = {
+            # App ID for TikTok Live Studio
+            "aid": "8311",
+            # App name for TikTok Live Studio
+            "app_name": "tiktok_live_studio",
+            # Channel for TikTok Live Studio
+            "channel": "studio",
+            "device_platform": "windows",
+            # Priority region for the stream
+            "priority_region": priority_region,
+            "live_mode": "6",
+            "version_code": version,
+            "webcast_sdk_version": version.replace(".", "").replace("0", ""),
+            "webcast_language": "en",
+            "app_language": "en",
+            "language": "en",
+            "browser_version": "5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) TikTokLIVEStudio/0.69.2 Chrome/108.0.5359.215 Electron/22.3.18-tt.8.release.main.44 TTElectron/22.3.18-tt.8.release.main.44 Safari/537.36",
+            "browser_name": "Mozilla",
+            "browser_platform": "Win32",
+            "browser_language": "en-US",
+            "screen_height": "1080",
+            "screen_width": "1920",
+            "timezone_name": "Africa/Lagos",
+            "device_id": "7378193331631310352",
+            "install_id": "7378196538524927745"
+        }
+        data = {
+            "title": title,
+            "live_studio": "1",
+            "gen_replay": str(gen_replay).lower(),
+            "chat_auth": "1",
+            "cover_uri": "",
+            "close_room_when_close_stream": str(close_room_when_close_stream).lower(),
+            "hashtag_id": str(hashtag_id),
+            "game_tag_id": str(game_tag_id),
+            "screenshot_cover_status": "1",
+            "live_sub_only": "0",
+            "chat_sub_only_auth": "2",
+            "multi_stream_scene": "0",
+            "gift_auth": "1",
+            "chat_l2": "1",
+            "star_comment_switch": "true",
+            "multi_stream_source": "1"
+        }
+
+    if age_restricted:
+        data["age_restricted"] = "4"
+    return headers, params, data
+
+
+def end_params():
+    """Query parameters for room/finish_abnormal."""
+    return {
+        # App ID for TikTok Live Studio
+        "aid": "8311",
+        # App name for TikTok Live Studio
+        "app_name": "tiktok_live_studio",
+        # Channel for TikTok Live Studio
+        "channel": "studio",
+        "device_platform": "windows",
+        "live_mode": "6",
+    }
+
+
+def parse_create(info):
+    """Read a room/create answer.
+
+    Returns (room, None) on success, where room has stream_url,
+    base_stream_url, stream_key, share_url, room_id and upstream_stream_id;
+    otherwise (None, error prompt).
+    """
+    try:
+        data = info["data"]
+        stream_url = data["stream_url"]
+        push_url = stream_url["rtmp_push_url"]
+        share_url = data["share_url"]
+    except (KeyError, TypeError):
+        data = info.get("data") if isinstance(info, dict) else None
+        return None, (data.get("prompts") if isinstance(data, dict) else None) or "Unknown error"
+    split_index = push_url.rfind("/")
+    return {
+        "stream_url": push_url,
+        "base_stream_url": push_url[:split_index],
+        "stream_key": push_url[split_index + 1:],
+        "share_url": share_url,
+        # Kept so the room's status can be polled later (see rooms.py)
+        "room_id": str(data.get("id_str") or data.get("id") or "") or None,
+        "upstream_stream_id": str(stream_url.get("id_str") or stream_url.get("id") or "") or None,
+    }, None
+
+
+def parse_end(info):
+    """Error prompt of a room/finish_abnormal answer, or None if it worked."""
+    if "data" in info and "prompts" in info["data"]:
+        return info["data"]["prompts"]
+    return None
+
+
+def parse_upload(info):
+    """Image URI from an upload/image answer ('' if there is none)."""
+    return info.get("data", {}).get("uri", "")